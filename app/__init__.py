@@ -9,7 +9,9 @@ from flask_limiter.util import get_remote_address
 from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
-db = SQLAlchemy()
+from .utils.replica import RoutingSession, replica_binds
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 migrate = Migrate()
@@ -39,29 +41,56 @@ def create_app():
 
 
     app.config.setdefault("SECRET_KEY", os.getenv("SECRET_KEY", os.urandom(32)))
+    app.config.setdefault("SSN_LOOKUP_KEY", os.getenv("SSN_LOOKUP_KEY") or app.config["SECRET_KEY"])
+    # Bearer tokens accepted by the bulk dose-log ingestion API (comma-separated)
+    app.config.setdefault(
+        "INGEST_API_TOKENS", [t.strip() for t in os.getenv("INGEST_API_TOKENS", "").split(",") if t.strip()]
+    )
+
+    # Where reminders go: log:// (default), file:///path.jsonl or module:factory
+    app.config.setdefault("REMINDER_TRANSPORT", os.getenv("REMINDER_TRANSPORT", "log://"))
 
     app.config.setdefault("SQLALCHEMY_DATABASE_URI", _resolve_database_uri(app))
     app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
 
-    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {"pool_pre_ping": True})
+    # Opt-in: "performance" switches file databases to WAL for good (see utils/sqlite_profile.py)
+    app.config.setdefault("SQLITE_PROFILE", os.getenv("SQLITE_PROFILE", "off"))
+    from .utils.sqlite_profile import sqlite_engine_options, init_sqlite_profile
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", sqlite_engine_options(app) or {"pool_pre_ping": True})
+    # Optional read replica (DATABASE_REPLICA_URL); see app/utils/replica.py
+    app.config.setdefault("SQLALCHEMY_BINDS", replica_binds())
+    app.config.setdefault("REPLICA_STICKY_SECONDS", float(os.getenv("REPLICA_STICKY_SECONDS", 5)))
 
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1)
 
     db.init_app(app)
+    init_sqlite_profile(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
     migrate.init_app(app, db)
 
+    # Counters shared by all workers on the host; memory:// counts per worker
+    from .utils import ratelimit_storage  # noqa: F401  (registers sqlite://)
     limiter = Limiter(
         key_func=get_remote_address,
-        storage_uri=os.getenv("RATE_LIMIT_STORAGE", "memory://"),
+        storage_uri=os.getenv("RATE_LIMIT_STORAGE")
+        or f"sqlite:///{os.path.join(app.instance_path, 'ratelimit.db')}",
         default_limits=[os.getenv("DEFAULT_RATE_LIMIT", "200/hour")],
     )
     limiter.init_app(app)
 
+    # Before the blueprint, so the trace starts ahead of the auth hook's queries
+    from .utils.sqltrace import init_sql_trace
+    init_sql_trace(app, db)
+
     from .routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # Importing these services registers their mapper/metadata listeners
+    from .services import rollup, search, projections  # noqa: F401
+    from .cli import register_cli
+    register_cli(app)
+
     login_manager.login_view = "main.login"
 
     @app.get("/healthz")
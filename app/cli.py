@@ -0,0 +1,141 @@
+# app/cli.py
+import click
+from flask.cli import AppGroup
+
+rollup_cli = AppGroup("rollup", help="Maintain the daily dose-log rollup.")
+
+
+@rollup_cli.command("rebuild")
+@click.option("--prescription-id", "prescription_ids", type=int, multiple=True,
+              help="Limit the rebuild to these prescriptions (repeatable).")
+@click.option("--patient-id", "patient_ids", type=int, multiple=True,
+              help="Limit the rebuild to these patients' prescriptions, e.g. after a time zone change.")
+def rollup_rebuild(prescription_ids, patient_ids):
+    """Recompute dose_daily_rollup from dose_log."""
+    from app import db
+    from app.models import Prescription
+    from app.services.rollup import rebuild_daily_rollup
+
+    prescription_ids = list(prescription_ids)
+    if patient_ids:
+        prescription_ids += db.session.scalars(
+            db.select(Prescription.id).where(Prescription.patient_id.in_(patient_ids))).all()
+        if not prescription_ids:
+            click.echo("No prescriptions for those patients.")
+            return
+    written = rebuild_daily_rollup(list(prescription_ids) or None)
+    click.echo(f"Rebuilt {written} rollup rows.")
+
+
+search_cli = AppGroup("search", help="Maintain the patient/medication/dose-log search index.")
+
+
+@search_cli.command("rebuild")
+def search_rebuild():
+    """Create (if needed) and repopulate the search index."""
+    from app.services.search import rebuild_search_index
+
+    indexed = rebuild_search_index()
+    click.echo(f"Indexed {indexed} documents.")
+
+
+projection_cli = AppGroup("projection", help="Maintain the 30-day adherence projection.")
+
+
+@projection_cli.command("refresh")
+def projection_refresh():
+    """Recompute patient_adherence_window, expiring logs older than 30 days (run periodically)."""
+    from app.services.projections import refresh_adherence_projection
+
+    written = refresh_adherence_projection()
+    click.echo(f"Refreshed {written} patients.")
+
+
+reminders_cli = AppGroup("reminders", help="Send medication reminders.")
+
+
+@reminders_cli.command("dispatch")
+@click.option("--batch-size", default=1000, show_default=True, help="Prescriptions claimed per batch.")
+@click.option("--workers", default=16, show_default=True, help="Concurrent sends.")
+def reminders_dispatch(batch_size, workers):
+    """Send today's reminders for enabled, active prescriptions (safe to run on several nodes)."""
+    from app.services.reminders import dispatch_due_reminders
+
+    stats = dispatch_due_reminders(batch_size=batch_size, max_workers=workers)
+    click.echo(f"Claimed {stats['claimed']}, sent {stats['sent']}, failed {stats['failed']}.")
+
+
+archive_cli = AppGroup("archive", help="Partition and archive cold dose-log history.")
+
+
+@archive_cli.command("run")
+@click.option("--hot-months", type=int, default=None,
+              help="Whole months kept in dose_log (default DOSE_LOG_HOT_MONTHS, 3).")
+def archive_run(hot_months):
+    """Move closed months older than the hot window into compressed archive files."""
+    from app.services.archive import archive_closed_months, ensure_partitions
+    from app import db
+
+    created = ensure_partitions()
+    db.session.commit()
+    for month, rows in archive_closed_months(hot_months=hot_months).items():
+        click.echo(f"Archived {rows} dose logs from {month}.")
+    if created:
+        click.echo(f"Ensured partitions: {', '.join(created)}.")
+
+
+@archive_cli.command("partitions")
+@click.option("--ahead", default=2, show_default=True, help="Months of partitions to create ahead.")
+def archive_partitions(ahead):
+    """Create upcoming monthly dose_log partitions (Postgres; run monthly)."""
+    from app.services.archive import ensure_partitions
+    from app import db
+
+    created = ensure_partitions(ahead=ahead)
+    db.session.commit()
+    click.echo(f"Ensured {len(created)} partitions." if created else "dose_log is not partitioned.")
+
+
+@archive_cli.command("list")
+def archive_list():
+    """List archived months."""
+    from app.services.archive import archived_months, archive_path
+
+    for month in archived_months():
+        click.echo(f"{month:%Y-%m}  {archive_path(month)}")
+
+
+analytics_cli = AppGroup("analytics", help="Adherence analytics (PDC / MPR).")
+
+
+@analytics_cli.command("nightly")
+@click.option("--as-of", "as_of", default=None, help="Last day covered, YYYY-MM-DD (default: yesterday, clinic zone).")
+@click.option("--batch-size", default=2000, show_default=True, help="Prescriptions per grouped query.")
+def analytics_nightly(as_of, batch_size):
+    """Recompute the per-prescription PDC/MPR snapshot for the whole population."""
+    from datetime import date
+    from app.services.analytics import nightly_snapshot
+
+    written = nightly_snapshot(date.fromisoformat(as_of) if as_of else None, batch_size=batch_size)
+    click.echo(f"Wrote {written} prescription metrics.")
+
+
+cohorts_cli = AppGroup("cohorts", help="Adherence by medication and start-quarter cohort.")
+
+
+@cohorts_cli.command("rebuild")
+def cohorts_rebuild():
+    """Recompute the cohort totals and histograms from the current snapshot."""
+    from app.services.cohorts import rebuild_cohorts
+
+    click.echo(f"Rebuilt {rebuild_cohorts()} cohorts.")
+
+
+def register_cli(app):
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(projection_cli)
+    app.cli.add_command(reminders_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(cohorts_cli)
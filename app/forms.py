@@ -1,7 +1,8 @@
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, IntegerField, TextAreaField, DateField, SelectField
-from wtforms.validators import DataRequired, Email, Length, Optional, NumberRange, Length, Regexp
+from wtforms.validators import DataRequired, Email, Length, Optional, NumberRange, Length, Regexp, ValidationError
+from .utils.timeutils import is_valid_zone
 
 class LoginForm(FlaskForm):
     username = StringField("Username", validators=[DataRequired(), Length(max=80)])
@@ -26,8 +27,14 @@ class PatientForm(FlaskForm):
             Regexp(r"^\d{9}$|^\d{3}-\d{2}-\d{4}$", message="Enter SSN as 9 digits or ###-##-####"),
         ],
     )
+    timezone = StringField("Time Zone", validators=[Optional(), Length(max=64)],
+                           filters=[lambda v: (v or "").strip() or None])
     submit = SubmitField("Save Patient")
 
+    def validate_timezone(self, field):
+        if field.data and not is_valid_zone(field.data):
+            raise ValidationError("Enter an IANA time zone such as America/Chicago.")
+
 class MedicationForm(FlaskForm):
     name = StringField("Medication Name", validators=[DataRequired(), Length(max=150)])
     strength = StringField("Strength", validators=[Optional(), Length(max=80)])
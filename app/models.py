@@ -1,8 +1,15 @@
 
 from datetime import datetime, timedelta
+import hashlib
+import hmac
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db, login_manager
+from .utils.cache import TTLCache
+from .utils.timeutils import patient_today
 from datetime import datetime, timedelta
 
 class User(UserMixin, db.Model):
@@ -18,9 +25,43 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Identity cache for the objects every request looks up again: the
+# flask-login user and the session's active patient. Entries hold column
+# values only and are re-attached with merge(load=False), so a hit costs no
+# query. Each worker has its own copy; writes evict locally and the TTL
+# bounds how long another worker can serve a stale row.
+_identity_cache = TTLCache(ttl=60.0, maxsize=4096)
+
+def cached_get(model, pk):
+    """Session-attached `model` row for `pk`, served from the identity cache when possible."""
+    if pk is None:
+        return None
+    key = (model.__name__, pk)
+    cols = _identity_cache.get(key)
+    if cols is None:
+        obj = db.session.get(model, pk)
+        if obj is None:
+            return None
+        _identity_cache.set(key, {c.key: getattr(obj, c.key) for c in model.__mapper__.column_attrs},
+                            current_app.config.get("IDENTITY_CACHE_TTL"))
+        return obj
+    obj = db.session.identity_map.get(db.session.identity_key(model, pk))
+    if obj is not None:
+        return obj
+    obj = model(**cols)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+def evict_cached(model, pk=None):
+    """Drop one cached row, or every cached row of `model` when pk is None."""
+    if pk is None:
+        _identity_cache.evict(lambda key: key[0] == model.__name__)
+    else:
+        _identity_cache.delete((model.__name__, pk))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return cached_get(User, int(user_id))
 
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -28,19 +69,44 @@ class Patient(db.Model):
     last_name = db.Column(db.String(100), nullable=False)
     ssn_last4 = db.Column(db.String(4), nullable=True, index=True)
     ssn_full_hash = db.Column(db.String(255), nullable=True)
+    ssn_lookup = db.Column(db.String(64), nullable=True, index=True)  # keyed HMAC of the SSN digits
     dob = db.Column(db.Date, nullable=True)
+    timezone = db.Column(db.String(64), nullable=True)  # IANA name; NULL = UTC (see utils.timeutils)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     prescriptions = db.relationship("Prescription", backref="patient", lazy=True, cascade="all, delete-orphan")
 
+    @staticmethod
+    def ssn_lookup_for(ssn_full: str) -> str:
+        """
+        Deterministic, keyed digest of the SSN digits so login can find the row
+        with one indexed query; the scrypt hash stays the actual credential check.
+        """
+        key = current_app.config["SSN_LOOKUP_KEY"]
+        if isinstance(key, str):
+            key = key.encode()
+        digits = "".join(ch for ch in ssn_full if ch.isdigit())
+        return hmac.new(key, digits.encode(), hashlib.sha256).hexdigest()
+
+    def set_ssn(self, ssn_full: str):
+        digits = "".join(ch for ch in ssn_full if ch.isdigit())
+        self.ssn_last4 = digits[-4:] if len(digits) >= 4 else None
+        self.ssn_full_hash = generate_password_hash(ssn_full, method="scrypt")
+        self.ssn_lookup = Patient.ssn_lookup_for(ssn_full)
+
 class Medication(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     strength = db.Column(db.String(80), nullable=True)
 
 class Prescription(db.Model):
+    __table_args__ = (
+        # Reminder dispatch walks enabled prescriptions in id order
+        db.Index("ix_prescription_reminder_enabled_id", "reminder_enabled", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False)
-    medication_id = db.Column(db.Integer, db.ForeignKey("medication.id"), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False, index=True)
+    medication_id = db.Column(db.Integer, db.ForeignKey("medication.id"), nullable=False, index=True)
     dosage = db.Column(db.String(80), nullable=False) # e.g., "1 tablet"
     frequency_per_day = db.Column(db.Integer, nullable=False) # e.g., 2 times/day
     start_date = db.Column(db.Date, nullable=False)
@@ -52,6 +118,11 @@ class Prescription(db.Model):
 
 
 class DoseLog(db.Model):
+    __table_args__ = (
+        # Covers the per-prescription window lookups (24h guard, today's logs, adherence)
+        db.Index("ix_dose_log_rx_taken_at_was_taken", "prescription_id", "taken_at", "was_taken"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     prescription_id = db.Column(db.Integer, db.ForeignKey("prescription.id"), nullable=False)
     taken_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -60,35 +131,112 @@ class DoseLog(db.Model):
     prescription = db.relationship("Prescription", backref="dose_logs", lazy=True)
 
     @staticmethod
-    def adherence_for_prescription(prescription: "Prescription") -> float:
+    def expected_doses(start_date, end_date, frequency_per_day, today) -> tuple:
+        """
+        Returns (window_end, expected) for a prescription's active window,
+        or (None, 0) when nothing is expected yet.
+        """
         # No start date -> no expectation / no score
-        if not prescription.start_date:
-            return 0.0
+        if not start_date:
+            return None, 0
 
-        # Use today's date, and don't project beyond today
-        today = datetime.utcnow().date()
-        end = prescription.end_date or today
-        end = min(end, today)
+        # Don't project beyond today
+        end = min(end_date or today, today)
 
         # If the prescription ends before it starts (bad data), short-circuit
-        if end < prescription.start_date:
-            return 0.0
+        if end < start_date:
+            return None, 0
 
         # Inclusive day count
-        days = (end - prescription.start_date).days + 1
-        freq = prescription.frequency_per_day or 1
-        expected = max(days * max(freq, 1), 0)
-
-        # Build naive UTC bounds [start_dt, end_dt) — end is exclusive, so add a day
-        start_dt = datetime.combine(prescription.start_date, datetime.min.time())
-        end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
-
-        # Count only taken doses within the active window
-        taken = DoseLog.query.filter(
-            DoseLog.prescription_id == prescription.id,
-            DoseLog.was_taken.is_(True),
-            DoseLog.taken_at >= start_dt,
-            DoseLog.taken_at <  end_dt,
-        ).count()
-
-        return (taken / expected) * 100.0 if expected else 0.0
+        days = (end - start_date).days + 1
+        freq = frequency_per_day or 1
+        return end, max(days * max(freq, 1), 0)
+
+    @staticmethod
+    def adherence_for_prescription(prescription: "Prescription") -> float:
+        today = patient_today(prescription.patient.timezone)
+        end, expected = DoseLog.expected_doses(
+            prescription.start_date, prescription.end_date, prescription.frequency_per_day, today
+        )
+        if not expected:
+            return 0.0
+
+        # Count only taken doses within the active window, summed from the
+        # per-day rollup instead of scanning the raw logs
+        taken = db.session.query(
+            db.func.coalesce(db.func.sum(DoseDailyRollup.taken_count), 0)
+        ).filter(
+            DoseDailyRollup.prescription_id == prescription.id,
+            DoseDailyRollup.day >= prescription.start_date,
+            DoseDailyRollup.day <= end,
+        ).scalar()
+
+        return (taken / expected) * 100.0
+
+class DoseSlot(db.Model):
+    """
+    One patient-recorded dose event (taken or missed) per prescription, per
+    patient-local day and per daily dose (1..frequency_per_day). Claiming the
+    slot is what makes a tap idempotent; it lives outside dose_log because a
+    partitioned table cannot hold a unique key that leaves out taken_at.
+    """
+    prescription_id = db.Column(db.Integer, db.ForeignKey("prescription.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    dose = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+class DoseDailyRollup(db.Model):
+    """Taken/missed counts per prescription per patient-local day, maintained from DoseLog inserts."""
+    prescription_id = db.Column(db.Integer, db.ForeignKey("prescription.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    taken_count = db.Column(db.Integer, nullable=False, default=0)
+    missed_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PatientAdherenceWindow(db.Model):
+    """Rolling 30-day dose counts per patient, projected from DoseLog writes."""
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), primary_key=True)
+    taken_count = db.Column(db.Integer, nullable=False, default=0)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    adherence = db.Column(db.Float, nullable=True, index=True)  # taken / total, NULL when total is 0
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+
+
+class PrescriptionAdherenceMetric(db.Model):
+    """Nightly PDC/MPR snapshot per prescription (percent; NULL when nothing was due in the window)."""
+    prescription_id = db.Column(db.Integer, db.ForeignKey("prescription.id"), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False, index=True)
+    as_of = db.Column(db.Date, nullable=False)
+    pdc_7 = db.Column(db.Float, nullable=True)
+    pdc_30 = db.Column(db.Float, nullable=True)
+    pdc_90 = db.Column(db.Float, nullable=True, index=True)
+    mpr_30 = db.Column(db.Float, nullable=True)
+    mpr_90 = db.Column(db.Float, nullable=True)
+
+
+class CohortAdherence(db.Model):
+    """
+    90-day PDC totals per medication and start-quarter cohort, kept in step
+    with prescription_adherence_metric. Sums are in tenths of a percent (and
+    their squares) so incremental +/- updates stay exact.
+    """
+    medication_id = db.Column(db.Integer, db.ForeignKey("medication.id"), primary_key=True)
+    cohort = db.Column(db.String(7), primary_key=True)  # start quarter, e.g. "2026Q1"
+    prescriptions = db.Column(db.Integer, nullable=False, default=0)
+    pdc_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    pdc_sum_sq = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class CohortAdherenceBucket(db.Model):
+    """Histogram of 90-day PDC per cohort: prescriptions per 5-point bucket (0-19)."""
+    medication_id = db.Column(db.Integer, db.ForeignKey("medication.id"), primary_key=True)
+    cohort = db.Column(db.String(7), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+def _evict_identity(mapper, connection, target):
+    evict_cached(type(target), target.id)
+
+for _model in (User, Patient):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _evict_identity)
@@ -1,21 +1,64 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, jsonify, current_app, Response, stream_with_context, g, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from .forms import LoginForm, PatientForm, MedicationForm, PrescriptionForm, DoseLogForm, PatientLookupForm, PatientLoginForm, UserForm
-from .models import User, Patient, Medication, Prescription, DoseLog
-from . import db
+from .models import User, Patient, Medication, Prescription, DoseLog, cached_get
+from . import db, csrf
+from .services import search
+from .utils.cache import TTLCache
+from .utils.replica import read_replica
+from .utils.timeutils import local_today, local_day_range, patient_today
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, and_, or_
+import base64
+import hmac
+import json
+import re
+from sqlalchemy import select, func, case, and_, or_
+from sqlalchemy.orm import joinedload
 from werkzeug.security import check_password_hash, generate_password_hash
 
 bp = Blueprint("main", __name__)
 
+def active_patient():
+    """The signed-in patient (identity-cached), or None. Memoized on g for the request."""
+    if "active_patient" not in g:
+        pid = session.get("active_patient_id")
+        g.active_patient = cached_get(Patient, pid) if pid else None
+    return g.active_patient
+
+def load_prescription(rx_id: int, patient_id: int | None = None):
+    """
+    The prescription with its medication and patient, from one joined query,
+    or None when it doesn't exist or (given patient_id) isn't that patient's.
+    Memoized on g for the request.
+    """
+    loaded = g.setdefault("prescriptions", {})
+    key = (rx_id, patient_id)
+    if key not in loaded:
+        stmt = (select(Prescription)
+                .options(joinedload(Prescription.medication, innerjoin=True),
+                         joinedload(Prescription.patient, innerjoin=True))
+                .where(Prescription.id == rx_id))
+        if patient_id is not None:
+            stmt = stmt.where(Prescription.patient_id == patient_id)
+        loaded[key] = db.session.scalars(stmt).first()
+    return loaded[key]
+
+def patient_prescription_or_404(rx_id: int):
+    """The signed-in patient's prescription; someone else's is indistinguishable from a missing one."""
+    rx = load_prescription(rx_id, session.get("active_patient_id"))
+    if rx is None:
+        abort(404)
+    return rx
+
 @bp.before_app_request
 def require_auth_or_patient():
-    allowed = {"main.patient_login", "main.clinic_login", "static"}
+    # dose_logs_ingest authenticates API clients itself (bearer token or clinician session)
+    allowed = {"main.patient_login", "main.clinic_login", "main.dose_logs_ingest", "static"}
     if request.endpoint in allowed or request.endpoint is None:
         return
-    if current_user.is_authenticated or session.get("active_patient_id"):
+    if current_user.is_authenticated or active_patient() is not None:
         return
+    session.pop("active_patient_id", None)
     flash("You are signed out. Please Login", "warning")
     return redirect(url_for("main.patient_login"))
 
@@ -29,12 +72,25 @@ def patient_login():
             flash("Please enter a valid SSN.", "warning")
             return render_template("patient_login.html", form=form)
 
+        lookup = Patient.ssn_lookup_for(form.ssn_full.data)
         candidates = Patient.query.filter(
-            Patient.ssn_last4 == last4,
+            Patient.ssn_lookup == lookup,
             Patient.dob == form.dob.data
         ).all()
+        if not candidates:
+            # No lookup yet (patients created before it existed), or one made
+            # under a previous SSN_LOOKUP_KEY: scan last4/DOB over just those
+            # rows, rewrite below
+            candidates = Patient.query.filter(
+                Patient.ssn_last4 == last4,
+                Patient.dob == form.dob.data,
+                or_(Patient.ssn_lookup.is_(None), Patient.ssn_lookup != lookup),
+            ).all()
         valid = [p for p in candidates if p.ssn_full_hash and check_password_hash(p.ssn_full_hash, form.ssn_full.data)]
         if len(valid) == 1:
+            if valid[0].ssn_lookup != lookup:
+                valid[0].ssn_lookup = lookup
+                db.session.commit()
             session["active_patient_id"] = valid[0].id
             return redirect(url_for("main.medications"))
         elif len(valid) > 1:
@@ -56,80 +112,31 @@ def clinic_login():
 
 @bp.route("/clinic_dashboard")
 @login_required
+@read_replica
 def clinic_dashboard():
-    # Stats and lists
-    patient_count = Patient.query.count()
-    med_count = Medication.query.count()
-    rx_count = Prescription.query.count()
-
-    cutoff = datetime.utcnow() - timedelta(days=30)
-    last_logs = (
-        db.session.query(DoseLog, Patient, Medication, Prescription)
-        .join(Prescription, DoseLog.prescription_id == Prescription.id)
-        .join(Patient, Prescription.patient_id == Patient.id)
-        .join(Medication, Prescription.medication_id == Medication.id)
-        .order_by(DoseLog.taken_at.desc())
-        .limit(10)
-        .all()
-    )
+    from app.services.dashboard import dashboard_data
 
-    rows = (
-        db.session.query(
-            Patient.id,
-            Patient.first_name,
-            Patient.last_name,
-            func.avg(db.case((DoseLog.was_taken == True, 1), else_=0)).label("adherence")
-        )
-        .join(Prescription, Prescription.patient_id == Patient.id)
-        .join(DoseLog, DoseLog.prescription_id == Prescription.id)
-        .filter(DoseLog.taken_at >= cutoff)
-        .group_by(Patient.id)
-        .order_by(func.avg(db.case((DoseLog.was_taken == True, 1), else_=0)).asc())
-        .all()
-    )
-
-    recent_rx = (
-        db.session.query(Prescription, Patient, Medication)
-        .join(Patient, Prescription.patient_id == Patient.id)
-        .join(Medication, Prescription.medication_id == Medication.id)
-        .order_by(Prescription.id.desc())
-        .limit(10)
-        .all()
-    )
-
-    today = date.today()
-    due_today = (
-        db.session.query(Prescription, Patient, Medication)
-        .join(Patient, Prescription.patient_id == Patient.id)
-        .join(Medication, Prescription.medication_id == Medication.id)
-        .filter(Prescription.start_date <= today)
-        .filter((Prescription.end_date == None) | (Prescription.end_date >= today))
-        .order_by(Patient.last_name.asc(), Medication.name.asc())
-        .all()
-    )
+    today = local_today()
+    data = dashboard_data(today)
 
     # Forms for modals
     patient_form = PatientForm()
     medication_form = MedicationForm()
     rx_form = PrescriptionForm()
     if hasattr(rx_form, "patient_id"):
-        rx_form.patient_id.choices = [
-            (p.id, f"{p.last_name}, {p.first_name}") for p in Patient.query.order_by(Patient.last_name.asc()).all()
-        ]
+        rx_form.patient_id.choices = data["patient_choices"]
     if hasattr(rx_form, "medication_id"):
-        rx_form.medication_id.choices = [
-            (m.id, f"{m.name} {m.strength or ''}".strip()) for m in Medication.query.order_by(Medication.name.asc()).all()
-        ]
+        rx_form.medication_id.choices = data["medication_choices"]
     user_form = UserForm()
     return render_template(
         "clinic_dashboard.html",
-        patient_count=patient_count,
-        med_count=med_count,
-        rx_count=rx_count,
-        last_logs=last_logs,
-        rows=rows,
-        recent_rx=recent_rx,
-        due_today=due_today,
+        patient_count=data["patient_count"],
+        med_count=data["med_count"],
+        rx_count=data["rx_count"],
+        last_logs=data["last_logs"],
+        rows=data["adherence_rows"],
+        recent_rx=data["recent_rx"],
+        due_today=data["due_today"],
         today=today,
         patient_form=patient_form,
         medication_form=medication_form,
@@ -179,39 +186,52 @@ def medications():
         items = Medication.query.order_by(Medication.name.asc()).all()
         return render_template("medications.html", medications=items, patient=None, items=[], page=1, pages=1, total=0, per_page=5)
 
-    patient = Patient.query.get(active_pid)
+    patient = active_patient()
     page = request.args.get("page", 1, type=int)
     per_page = 5
 
-    q = (db.session.query(Prescription, Medication)
-         .join(Medication, Prescription.medication_id == Medication.id)
-         .filter(Prescription.patient_id == active_pid)
-         .order_by(Medication.name.asc()))
-
-    total = q.count()
-    items = q.limit(per_page).offset((page - 1) * per_page).all()
-
-    now = datetime.utcnow()
-    start_today = datetime(now.year, now.month, now.day)
-    end_today = start_today + timedelta(days=1)
-
-    rx_ids = [rx.id for rx, _ in items]
-    logs_today = (DoseLog.query
-                  .filter(DoseLog.prescription_id.in_(rx_ids),
-                          DoseLog.taken_at >= start_today,
-                          DoseLog.taken_at < end_today)
-                  .all())
-    clicked_today = {}
-    logs_today_sorted = sorted(logs_today, key=lambda l: l.taken_at, reverse=True)
-    for l in logs_today_sorted:
-        if l.prescription_id not in clicked_today:
-            clicked_today[l.prescription_id] = "taken" if l.was_taken else "missed"
-    has_logged_today = {rid: False for rid in rx_ids}
-    for l in logs_today:
-        has_logged_today[l.prescription_id] = True
+    # "Today" is the patient's local calendar day
+    zone_name = patient.timezone if patient else None
+    today = patient_today(zone_name)
+    start_today, end_today = local_day_range(today, zone_name)
+
+    # One query: the page of prescriptions, each with today's latest dose
+    # status and dose count (index seeks on ix_dose_log_rx_taken_at_was_taken,
+    # however many logs there are) and the patient's total as a window count
+    in_today = (DoseLog.prescription_id == Prescription.id,
+                DoseLog.taken_at >= start_today,
+                DoseLog.taken_at < end_today)
+    latest_today = (
+        select(case((DoseLog.was_taken.is_(True), "taken"), else_="missed"))
+        .where(*in_today)
+        .order_by(DoseLog.taken_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    count_today = select(func.count(DoseLog.id)).where(*in_today).scalar_subquery()
+    rows = db.session.execute(
+        select(Prescription, Medication, func.count().over().label("total"),
+               latest_today.label("status"), count_today.label("doses"))
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .where(Prescription.patient_id == active_pid)
+        .order_by(Medication.name.asc(), Prescription.id.asc())
+        .limit(per_page).offset((page - 1) * per_page)
+    ).all()
+    if rows:
+        total = rows[0].total
+    else:
+        # Past the last page the window has no rows to count
+        total = (db.session.scalar(select(func.count(Prescription.id)).where(Prescription.patient_id == active_pid))
+                 if page > 1 else 0)
+
+    items = [(row.Prescription, row.Medication) for row in rows]
+    clicked_today = {row.Prescription.id: row.status for row in rows if row.status}
+    doses_today = {row.Prescription.id: row.doses for row in rows}
+    # Logged means every daily dose has a taken or missed tap
+    has_logged_today = {row.Prescription.id: row.doses >= max(row.Prescription.frequency_per_day or 1, 1)
+                        for row in rows}
 
     active_today = {}
-    today = date.today()
     for rx, _ in items:
         if rx.start_date and rx.end_date:
             active = rx.start_date <= today <= rx.end_date
@@ -226,6 +246,7 @@ def medications():
         items=items,
         page=page, pages=pages, total=total, per_page=per_page,
         has_logged_today=has_logged_today,
+        doses_today=doses_today,
         active_today=active_today,
         today=today,
         clicked_today=clicked_today,
@@ -233,40 +254,27 @@ def medications():
 
 @bp.route("/medications/take/<int:rx_id>", methods=["GET", "POST"])
 def meds_take(rx_id):
-    # Uses calendar-day active window but prevents double log via last 24h
-    from app.services.adherence import was_taken_in_last_24h
+    # One taken/missed log per daily dose per patient-local day (the dose slots)
+    from app.services.doses import log_dose
 
     active_pid = session.get("active_patient_id")
     if not active_pid:
         flash("Please sign in as a patient.", "warning")
         return redirect(url_for("main.patient_login"))
 
-    rx = Prescription.query.get_or_404(rx_id)
-    if rx.patient_id != active_pid:
-        flash("Unauthorized action.", "danger")
-        return redirect(url_for("main.medications"))
-
-    today = date.today()
+    rx = patient_prescription_or_404(rx_id)
+    today = patient_today(rx.patient.timezone)
     is_active = ((rx.start_date is None or rx.start_date <= today) and
                  (rx.end_date is None or rx.end_date >= today))
     if not is_active:
         flash("This prescription is not active today (start/end date window).", "warning")
         return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
-    # NEW: rolling-24h guard
-    if was_taken_in_last_24h(rx_id):
-        flash("Already logged in the last 24 hours.", "warning")
+    if log_dose(rx.id, today, rx.patient.timezone, was_taken=True, notes="Taken today",
+                per_day=rx.frequency_per_day, dose=request.args.get("dose", type=int)) is None:
+        flash("Already logged for today.", "warning")
         return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
-    log = DoseLog(
-        prescription_id=rx_id,
-        taken_at=datetime.utcnow(),
-        was_taken=True,
-        notes="Taken within 24 hours"
-    )
-    db.session.add(log)
-    db.session.commit()
-
     flash("Marked as taken.", "success")
     return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
@@ -284,25 +292,25 @@ def medication_new():
 
 @bp.post("/medications/miss/<int:rx_id>")
 def meds_miss(rx_id):
+    from app.services.doses import log_dose
+
     active_pid = session.get("active_patient_id")
     if not active_pid:
         flash("Please sign in as a patient.", "warning")
         return redirect(url_for("main.patient_login"))
 
-    rx = Prescription.query.get_or_404(rx_id)
-    if rx.patient_id != active_pid:
-        flash("Unauthorized action.", "danger")
-        return redirect(url_for("main.medications"))
-
-    today = date.today()
+    rx = patient_prescription_or_404(rx_id)
+    today = patient_today(rx.patient.timezone)
     is_active = (rx.start_date is None or rx.start_date <= today) and (rx.end_date is None or rx.end_date >= today)
     if not is_active:
         flash("This prescription is not active today (start/end date window).", "warning")
         return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
-    log = DoseLog(prescription_id=rx_id, was_taken=False, notes="Missed today")
-    db.session.add(log)
-    db.session.commit()
+    if log_dose(rx.id, today, rx.patient.timezone, was_taken=False, notes="Missed today",
+                per_day=rx.frequency_per_day, dose=request.args.get("dose", type=int)) is None:
+        flash("Already logged for today.", "warning")
+        return redirect(url_for("main.medications", page=request.args.get("page", 1)))
+
     flash("Marked as missed for today.", "warning")
     return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
@@ -313,33 +321,32 @@ def meds_reminder(rx_id):
         flash("Please sign in as a patient.", "warning")
         return redirect(url_for("main.patient_login"))
 
-    rx = Prescription.query.get_or_404(rx_id)
-    if rx.patient_id != active_pid:
-        flash("Unauthorized action.", "danger")
-        return redirect(url_for("main.medications"))
-
-    today = date.today()
+    rx = patient_prescription_or_404(rx_id)
+    today = patient_today(rx.patient.timezone)
     is_active = (rx.start_date and rx.end_date and rx.start_date <= today <= rx.end_date)
     if not is_active:
         flash("Cannot set a reminder for an inactive prescription.", "warning")
         return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
-    med = Medication.query.get(rx.medication_id)
+    message = f"Reminder set for: {rx.medication.name}"  # read before the commit expires rx
     rx.reminder_enabled = True
     db.session.commit()
 
-    flash(f"Reminder set for: {med.name}", "success")
+    flash(message, "success")
     return redirect(url_for("main.medications", page=request.args.get("page", 1)))
 
 @bp.route("/clinic/reminder/<int:rx_id>", methods=["GET", "POST"])
 @login_required
 def clinic_send_reminder(rx_id):
-    rx = Prescription.query.get_or_404(rx_id)
-    p = Patient.query.get(rx.patient_id)
-    m = Medication.query.get(rx.medication_id)
-    rx.reminder_last_sent_date = date.today()
-    db.session.commit()
-    flash(f"Reminder sent to {p.first_name} {p.last_name} for today's dosage of {m.name}.", "success")
+    from app.services.reminders import send_reminder
+
+    rx = load_prescription(rx_id)
+    if rx is None:
+        abort(404)
+    p, m = rx.patient, rx.medication
+    message = f"Reminder sent to {p.first_name} {p.last_name} for today's dosage of {m.name}."
+    send_reminder(rx)
+    flash(message, "success")
     return redirect(url_for("main.clinic_dashboard"))
 
 @bp.route("/request-callback")
@@ -356,12 +363,19 @@ def dose_history():
     if not active_pid:
         flash("Please sign in as a patient.", "warning")
         return redirect(url_for("main.patient_login"))
-    logs = (DoseLog.query
-        .join(Prescription, DoseLog.prescription_id == Prescription.id)
-        .filter(Prescription.patient_id == active_pid)
-        .order_by(DoseLog.taken_at.desc())
-        .all())
-    return render_template("dose_history.html", logs=logs)
+    from app.services.archive import archive_cutoff
+    from app.services.history import history_page, group_by_month
+
+    cursor = _decode_cursor(request.args.get("cursor") or "")
+    rows, more = history_page(active_pid, cursor)
+    next_cursor = _encode_cursor(rows[-1]) if more else None
+    patient = active_patient()
+    months = group_by_month(active_pid, rows, patient.timezone if patient else None)
+    if request.args.get("partial"):
+        # "Load more" fetches just the next page's month blocks
+        return render_template("_dose_history_page.html", months=months, next_cursor=next_cursor)
+    return render_template("dose_history.html", months=months, next_cursor=next_cursor,
+                           archived_before=archive_cutoff())
 
 # ---------- Patients index (DataTables) ----------
 @bp.route("/patients")
@@ -371,6 +385,7 @@ def patients():
 
 @bp.get("/api/patients")
 @login_required
+@read_replica
 def patients_api():
     draw   = int(request.args.get("draw", 1))
     start  = int(request.args.get("start", 0))
@@ -381,14 +396,7 @@ def patients_api():
     records_total = base.count()
 
     if search_value:
-        like = f"%{search_value}%"
-        base = base.filter(
-            or_(
-                Patient.first_name.ilike(like),
-                Patient.last_name.ilike(like),
-                Patient.ssn_last4.ilike(like),
-            )
-        )
+        base = base.filter(search.patient_filter(search_value))
 
     records_filtered = base.count()
     rows = (base
@@ -418,6 +426,7 @@ def medications_index():
 
 @bp.get("/api/medications")
 @login_required
+@read_replica
 def medications_api():
     draw   = int(request.args.get("draw", 1))
     start  = int(request.args.get("start", 0))
@@ -428,13 +437,7 @@ def medications_api():
     records_total = base.count()
 
     if search_value:
-        like = f"%{search_value}%"
-        base = base.filter(
-            or_(
-                Medication.name.ilike(like),
-                Medication.strength.ilike(like),
-            )
-        )
+        base = base.filter(search.medication_filter(search_value))
 
     records_filtered = base.count()
     items = (base
@@ -451,7 +454,10 @@ def medications_api():
                    .all())
         counts = {mid: cnt for (mid, cnt) in results}
 
-    data = [[m.name, m.strength or "", counts.get(m.id, 0)] for m in items]
+    from app.services.cohorts import mean_pdc_by_medication
+    mean_pdc = mean_pdc_by_medication([m.id for m in items])
+    fmt = lambda v: "" if v is None else f"{v:.1f}%"
+    data = [[m.name, m.strength or "", counts.get(m.id, 0), fmt(mean_pdc.get(m.id))] for m in items]
 
     return jsonify({
         "draw": draw,
@@ -470,9 +476,7 @@ def patient_new():
         form.populate_obj(p)
         # full SSN handling
         if hasattr(form, "ssn_full") and form.ssn_full.data:
-            digits = "".join(ch for ch in form.ssn_full.data if ch.isdigit())
-            p.ssn_last4 = digits[-4:] if len(digits) >= 4 else None
-            p.ssn_full_hash = generate_password_hash(form.ssn_full.data, method="scrypt")
+            p.set_ssn(form.ssn_full.data)
         db.session.add(p)
         db.session.commit()
         flash("Patient added.", "success")
@@ -508,16 +512,48 @@ def prescription_new():
 @bp.route("/dose_logs")
 @login_required
 def dose_logs():
-    return render_template("dose_logs.html")
-
+    from app.services.archive import archive_cutoff
+    return render_template("dose_logs.html", archived_before=archive_cutoff())
+
+
+# recordsTotal / recordsFiltered for DataTables: recounting a four-table join on
+# every draw dominates deep paging, so counts are cached briefly (or estimated)
+_count_cache = TTLCache(ttl=30.0, maxsize=512)
+
+def _estimated_table_count(model) -> int:
+    """Planner estimate on Postgres (pg_class.reltuples); exact COUNT elsewhere."""
+    if db.engine.dialect.name == "postgresql":
+        est = db.session.execute(
+            db.text("SELECT reltuples::bigint FROM pg_class WHERE relname = :t"),
+            {"t": model.__tablename__},
+        ).scalar()
+        if est is not None and est >= 0:
+            return int(est)
+    return db.session.query(func.count(model.id)).scalar()
+
+def _encode_cursor(log) -> str:
+    raw = json.dumps([log.taken_at.isoformat(), log.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        taken_at, log_id = json.loads(raw)
+        return datetime.fromisoformat(taken_at), int(log_id)
+    except (ValueError, TypeError):
+        return None
 
 @bp.get("/api/dose_logs")
 @login_required
+@read_replica
 def dose_logs_api():
+    from app.services.archive import archive_cutoff
+
     draw   = int(request.args.get("draw", 1))
     start  = int(request.args.get("start", 0))
     length = int(request.args.get("length", 10))
     search_value = (request.args.get("search[value]") or "").strip()
+    cursor = _decode_cursor(request.args.get("cursor") or "")
 
     base = (
         db.session.query(DoseLog, Patient, Medication)
@@ -526,27 +562,28 @@ def dose_logs_api():
         .join(Medication, Prescription.medication_id == Medication.id)
     )
 
-    records_total = base.count()
+    records_total = _count_cache.get_or_set(("dose_logs", None), lambda: _estimated_table_count(DoseLog))
 
     if search_value:
-        like = f"%{search_value}%"
-        base = base.filter(
-            db.or_(
-                Patient.first_name.ilike(like),
-                Patient.last_name.ilike(like),
-                Medication.name.ilike(like),
-                DoseLog.notes.ilike(like)
-            )
+        base = base.filter(search.dose_log_filter(search_value))
+        records_filtered = _count_cache.get_or_set(("dose_logs", search_value), base.count)
+    else:
+        records_filtered = records_total
+
+    base = base.order_by(DoseLog.taken_at.desc(), DoseLog.id.desc())
+    if cursor:
+        # Keyset (seek) paging: continue strictly after the last row the client saw
+        taken_at, log_id = cursor
+        rows = (
+            base.filter(or_(
+                DoseLog.taken_at < taken_at,
+                and_(DoseLog.taken_at == taken_at, DoseLog.id < log_id),
+            ))
+            .limit(length)
+            .all()
         )
-
-    records_filtered = base.count()
-
-    rows = (
-        base.order_by(DoseLog.taken_at.desc())
-        .offset(start)
-        .limit(length)
-        .all()
-    )
+    else:
+        rows = base.offset(start).limit(length).all()
 
     data = []
     for log, patient, med in rows:
@@ -563,10 +600,226 @@ def dose_logs_api():
             log.notes or ""
         ])
 
+    cutoff = archive_cutoff()
     return {
         "draw": draw,
         "recordsTotal": records_total,
         "recordsFiltered": records_filtered,
         "data": data,
+        "nextCursor": _encode_cursor(rows[-1][0]) if len(rows) == length else None,
+        # Older logs live only in the archive; they are in ?archived=1 exports
+        "archivedBefore": cutoff.isoformat() if cutoff else None,
     }
 
+
+_EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def _export_response(kind, rows, fields):
+    from app.services.export import stream
+
+    fmt = request.args.get("format", "csv")
+    compress = request.accept_encodings["gzip"] > 0  # honours gzip;q=0 and *
+    body = stream(rows, fmt, fields, compress=compress)
+    filename = f"{kind}-{date.today().isoformat()}.{fmt}"
+    resp = Response(stream_with_context(body), mimetype=_EXPORT_MIMETYPES[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["Vary"] = "Accept-Encoding"
+    if compress:
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+def _export_filters():
+    from app.services.export import parse_date, parse_id
+
+    if request.args.get("format", "csv") not in _EXPORT_MIMETYPES:
+        raise ValueError("format must be csv or ndjson")
+    # A typo must not silently widen the export to every patient
+    return {
+        "patient_id": parse_id("patient_id", request.args.get("patient_id")),
+        "medication_id": parse_id("medication_id", request.args.get("medication_id")),
+        "start": parse_date(request.args.get("from")),
+        "end": parse_date(request.args.get("to")),
+    }
+
+@bp.get("/api/dose_logs/export")
+@login_required
+@read_replica
+def dose_logs_export():
+    """
+    Stream dose logs as CSV (default) or NDJSON (?format=ndjson), filtered by
+    patient_id, medication_id and from/to (YYYY-MM-DD, inclusive, UTC).
+    ?archived=1 includes months moved to cold storage. Gzipped on the fly
+    when the client accepts it.
+    """
+    from app.services.export import dose_log_rows, DOSE_LOG_FIELDS
+
+    try:
+        filters = _export_filters()
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    rows = dose_log_rows(include_archived=bool(request.args.get("archived")), **filters)
+    return _export_response("dose-logs", rows, DOSE_LOG_FIELDS)
+
+@bp.get("/api/adherence/export")
+@login_required
+@read_replica
+def adherence_export():
+    """Per-prescription adherence as CSV/NDJSON; accepts patient_id and medication_id."""
+    from app.services.export import adherence_rows, ADHERENCE_FIELDS
+
+    try:
+        filters = _export_filters()
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    rows = adherence_rows(patient_id=filters["patient_id"], medication_id=filters["medication_id"])
+    return _export_response("adherence", rows, ADHERENCE_FIELDS)
+
+# ---------- Adherence analytics (PDC / MPR) ----------
+@bp.route("/reports")
+@login_required
+def reports():
+    return render_template("reports.html")
+
+def _series_params():
+    from app.services.analytics import default_as_of
+    from app.services.export import parse_date
+
+    days = min(max(request.args.get("days", 90, type=int), 1), 365)
+    as_of = parse_date(request.args.get("as_of")) or default_as_of()
+    return days, as_of
+
+@bp.get("/api/analytics/patients")
+@login_required
+@read_replica
+def analytics_patients_api():
+    """DataTables feed over the nightly snapshot, lowest 90-day PDC first."""
+    from app.services.analytics import patient_summary
+
+    draw   = int(request.args.get("draw", 1))
+    start  = int(request.args.get("start", 0))
+    length = int(request.args.get("length", 10))
+    search_value = (request.args.get("search[value]") or "").strip()
+
+    total, filtered, rows = patient_summary(start, length, search_value)
+    fmt = lambda v: "" if v is None else f"{v:.1f}%"
+    data = [[
+            f"{last}, {first}",
+            n,
+            fmt(pdc_30),
+            fmt(pdc_90),
+            fmt(mpr_90),
+            pid,
+            ] for pid, last, first, n, pdc_30, pdc_90, mpr_90, _ in rows]
+    return jsonify({
+        "draw": draw,
+        "recordsTotal": total,
+        "recordsFiltered": filtered,
+        "data": data,
+        "asOf": rows[0][-1].isoformat() if rows else None,
+    })
+
+@bp.get("/api/analytics/patients/<int:patient_id>")
+@login_required
+@read_replica
+def analytics_patient_api(patient_id):
+    """Rolling 7/30/90-day PDC and MPR series for one patient (?days=, ?as_of=YYYY-MM-DD)."""
+    from app.services.analytics import patient_series
+
+    try:
+        days, as_of = _series_params()
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    return jsonify({"patient_id": patient_id, "as_of": as_of.isoformat(),
+                    **patient_series(patient_id, days=days, as_of=as_of)})
+
+@bp.get("/api/analytics/prescriptions/<int:rx_id>")
+@login_required
+@read_replica
+def analytics_prescription_api(rx_id):
+    """Rolling 7/30/90-day PDC and MPR series for one prescription."""
+    from app.services.analytics import prescription_series
+
+    try:
+        days, as_of = _series_params()
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    day_list, series = prescription_series([rx_id], days=days, as_of=as_of)
+    if rx_id not in series:
+        return {"error": "prescription not found"}, 404
+    return jsonify({"prescription_id": rx_id, "as_of": as_of.isoformat(),
+                    "days": [d.isoformat() for d in day_list], **series[rx_id]})
+
+@bp.get("/api/cohorts/distribution")
+@login_required
+@read_replica
+def cohort_distribution_api():
+    """
+    90-day PDC distribution from the cohort aggregates. Filters (all optional):
+    ?medication_id=, ?name=, ?strength=, ?cohort=YYYYQn.
+    """
+    from app.services.cohorts import cohort_distribution
+
+    cohort = (request.args.get("cohort") or "").strip().upper() or None
+    if cohort and not re.fullmatch(r"\d{4}Q[1-4]", cohort):
+        return {"error": "cohort must look like 2026Q1"}, 400
+    filters = {
+        "medication_id": request.args.get("medication_id", type=int),
+        "name": (request.args.get("name") or "").strip() or None,
+        "strength": (request.args.get("strength") or "").strip() or None,
+        "cohort": cohort,
+    }
+    return jsonify({**filters, **cohort_distribution(**filters)})
+
+@bp.get("/api/cohorts/medications/<int:medication_id>")
+@login_required
+@read_replica
+def medication_cohorts_api(medication_id):
+    """Per start-quarter 90-day PDC summaries for one medication."""
+    from app.services.cohorts import medication_cohorts
+
+    med = db.session.get(Medication, medication_id)
+    if med is None:
+        return {"error": "medication not found"}, 404
+    return jsonify({"medication_id": med.id, "name": med.name, "strength": med.strength,
+                    "cohorts": medication_cohorts(med.id)})
+
+
+def _ingest_client_authorized() -> bool:
+    """
+    A valid bearer token, or a clinician session. Only token requests skip
+    CSRF: a cookie-authenticated POST must carry the CSRF token like any form,
+    or any page a clinician visits could submit dose logs as them.
+    """
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        token = header[len("Bearer "):].strip()
+        if any(hmac.compare_digest(token, t) for t in current_app.config.get("INGEST_API_TOKENS", [])):
+            return True
+    if not current_user.is_authenticated:
+        return False
+    if current_app.config.get("WTF_CSRF_ENABLED", True):
+        csrf.protect()  # 400 CSRFError when missing or wrong
+    return True
+
+@bp.post("/api/dose_logs/bulk")
+@csrf.exempt
+def dose_logs_ingest():
+    """
+    Bulk dose events from devices/pharmacies as NDJSON (default) or CSV
+    (Content-Type text/csv or ?format=csv). Fields: prescription_id, taken_at
+    (ISO-8601, UTC if no offset), was_taken (default true), notes.
+    """
+    from app.services.ingest import parse_records, ingest_dose_events
+
+    if not _ingest_client_authorized():
+        return {"error": "unauthorized"}, 401
+
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        return {"error": "format must be csv or ndjson"}, 400
+
+    results = list(ingest_dose_events(parse_records(request.stream, fmt)))
+    summary = {"received": len(results), "inserted": 0, "duplicate": 0, "invalid": 0}
+    for r in results:
+        summary[r["status"]] += 1
+    return {"summary": summary, "results": results}
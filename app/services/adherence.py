@@ -1,8 +1,9 @@
 # app/services/adherence.py
-from sqlalchemy import exists, and_, select
+from datetime import timedelta
+from sqlalchemy import exists, and_, or_, select, func, case, true
 from app import db
-from app.models import DoseLog  # adjust import to your model location
-from app.utils.timeutils import last_24h_window, local_day_bounds, utcnow
+from app.models import DoseLog, DoseDailyRollup, Prescription, Patient  # adjust import to your model location
+from app.utils.timeutils import last_24h_window, local_day_bounds, patient_today, utcnow
 
 def was_taken_in_last_24h(prescription_id: int, now_utc=None) -> bool:
     start_utc, end_utc = last_24h_window(now_utc)
@@ -28,3 +29,78 @@ def was_taken_on_calendar_day_local(prescription_id: int, now_utc=None) -> bool:
         )
     ))
     return db.session.execute(stmt).scalar()
+
+BATCH_CHUNK = 10000  # keeps IN (...) lists under driver parameter limits
+
+def adherence_for_prescriptions(prescription_ids=None, patient_id=None, today=None) -> dict[int, float]:
+    """
+    Batch form of DoseLog.adherence_for_prescription: {prescription_id: percent}.
+
+    Pass explicit prescription ids, a patient id, or neither for the whole
+    clinic. Taken doses come from one grouped query over the daily rollup;
+    the expected-dose math runs over the returned columns in one pass.
+    Without `today`, each prescription is scored up to its patient's local
+    today.
+    """
+    if prescription_ids is not None:
+        ids = list(prescription_ids)
+        scores = {}
+        for i in range(0, len(ids), BATCH_CHUNK):
+            scores.update(_adherence_batch(today, ids=ids[i:i + BATCH_CHUNK], patient_id=patient_id))
+        return scores
+    return _adherence_batch(today, patient_id=patient_id)
+
+def _adherence_batch(today, ids=None, patient_id=None) -> dict[int, float]:
+    # Without `today`, every patient's local today is within a day of UTC's:
+    # sum the days before that band in SQL and return the band's days as
+    # separate columns, kept below only up to each patient's own today
+    now = utcnow()
+    if today is None:
+        utc_today = now.date()
+        band = [utc_today + timedelta(days=n) for n in (-1, 0, 1)]
+        day_cap = band[-1]
+    else:
+        band, day_cap = [], today
+    before_band = DoseDailyRollup.day < band[0] if band else true()
+    in_band = [
+        func.coalesce(func.sum(case((DoseDailyRollup.day == d, DoseDailyRollup.taken_count), else_=0)), 0)
+        for d in band
+    ]
+    taken = func.coalesce(func.sum(case((before_band, DoseDailyRollup.taken_count), else_=0)), 0)
+    stmt = (
+        select(
+            Prescription.id,
+            Prescription.start_date,
+            Prescription.end_date,
+            Prescription.frequency_per_day,
+            Patient.timezone,
+            taken,
+            *in_band,
+        )
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .outerjoin(DoseDailyRollup, and_(
+            DoseDailyRollup.prescription_id == Prescription.id,
+            DoseDailyRollup.day >= Prescription.start_date,
+            DoseDailyRollup.day <= day_cap,
+            or_(Prescription.end_date.is_(None), DoseDailyRollup.day <= Prescription.end_date),
+        ))
+        .group_by(Prescription.id, Patient.timezone)
+    )
+    if ids is not None:
+        if not ids:
+            return {}
+        stmt = stmt.where(Prescription.id.in_(ids))
+    if patient_id is not None:
+        stmt = stmt.where(Prescription.patient_id == patient_id)
+
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return {}
+    todays = {} if today is not None else {name: patient_today(name, now) for name in {row[4] for row in rows}}
+    scores = {}
+    for rx_id, start, end, freq, zone_name, taken_count, *band_counts in rows:
+        local = today or todays[zone_name]
+        taken_count += sum(n for d, n in zip(band, band_counts) if d <= local)
+        expected = DoseLog.expected_doses(start, end, freq, local)[1]
+        scores[rx_id] = (taken_count / expected) * 100.0 if expected else 0.0
+    return scores
@@ -0,0 +1,254 @@
+# app/services/analytics.py
+"""
+Proportion of days covered (PDC), medication possession ratio (MPR) and
+their rolling 7/30/90-day series.
+
+Per prescription, over a window of days ending at `as_of`:
+  due days  days inside the prescription's start/end dates
+  PDC       due days on which the full daily dose was taken
+            (rollup taken_count >= frequency_per_day) / due days
+  MPR       doses taken / doses due (frequency_per_day x due days),
+            truncated at 100%
+Both are percentages, None when nothing was due. A patient's figure is the
+mean over their prescriptions that had something due.
+
+Everything reads the daily rollup (already bucketed on patient-local days)
+rather than raw dose logs. Series load the rollup rows for a set of
+prescriptions with one query, as columns, and turn them into rolling sums
+with prefix sums, so each window value is one subtraction. The nightly
+snapshot computes the latest values for the whole population with one
+grouped query per batch of prescriptions (and feeds app.services.cohorts).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from itertools import accumulate
+from operator import sub
+from statistics import fmean
+
+from sqlalchemy import select, delete, insert, and_, or_, func, case
+from app import db
+from app.models import DoseDailyRollup, Patient, Prescription, PrescriptionAdherenceMetric
+from app.utils.timeutils import local_today
+
+WINDOWS = (7, 30, 90)
+SNAPSHOT_BATCH = 2000
+
+
+def default_as_of() -> date:
+    """Last complete day in the clinic zone."""
+    return local_today() - timedelta(days=1)
+
+
+def _pct(num, den):
+    return round(min(100.0 * num / den, 100.0), 1) if den else None
+
+
+def _due_days(start: date | None, end: date | None, first: date, last: date) -> int:
+    lo = max(start, first) if start else first
+    hi = min(end, last) if end else last
+    return max((hi - lo).days + 1, 0)
+
+
+# ---------- series ----------
+
+def _rx_series(start, end, freq, ordinals, takens, base, n, pad, windows):
+    """PDC and MPR lists for one prescription; index 0 of the arrays is day `base`."""
+    due = bytearray(n)
+    lo = max(start.toordinal() - base, 0) if start else 0
+    hi = min(end.toordinal() - base, n - 1) if end else n - 1
+    if hi >= lo:
+        due[lo:hi + 1] = b"\x01" * (hi - lo + 1)
+    covered, taken = bytearray(n), [0] * n
+    for ordinal, t in zip(ordinals, takens):
+        i = ordinal - base
+        if due[i]:
+            taken[i] = t
+            covered[i] = t >= freq
+
+    covered_p = [0, *accumulate(covered)]
+    due_p = [0, *accumulate(due)]
+    taken_p = [0, *accumulate(taken)]
+    pdc, mpr = {}, {}
+    for w in windows:
+        # Window ending at index i sums prefix[i + 1] - prefix[i + 1 - w]
+        a, b = pad + 1, n + 1
+        due_w = list(map(sub, due_p[a:b], due_p[a - w:b - w]))
+        pdc[w] = [_pct(c, d) for c, d in zip(map(sub, covered_p[a:b], covered_p[a - w:b - w]), due_w)]
+        mpr[w] = [_pct(t, d * freq) for t, d in zip(map(sub, taken_p[a:b], taken_p[a - w:b - w]), due_w)]
+    return pdc, mpr
+
+
+def prescription_series(prescription_ids=None, patient_id=None, days: int = 90,
+                        as_of: date | None = None, windows=WINDOWS):
+    """
+    Rolling PDC/MPR for the `days` days ending at `as_of`.
+    Returns (day list, {prescription_id: {"patient_id", "pdc": {w: [...]}, "mpr": {w: [...]}}}).
+    """
+    as_of = as_of or default_as_of()
+    pad = max(windows) - 1
+    first = as_of - timedelta(days=days - 1)
+    base = first.toordinal() - pad  # lookback so the first day has full windows
+    n = as_of.toordinal() - base + 1
+
+    rx_stmt = select(Prescription.id, Prescription.patient_id, Prescription.start_date,
+                     Prescription.end_date, Prescription.frequency_per_day)
+    if prescription_ids is not None:
+        rx_stmt = rx_stmt.where(Prescription.id.in_(list(prescription_ids)))
+    if patient_id is not None:
+        rx_stmt = rx_stmt.where(Prescription.patient_id == patient_id)
+    prescriptions = db.session.execute(rx_stmt).all()
+    day_list = [first + timedelta(days=i) for i in range(days)]
+    if not prescriptions:
+        return day_list, {}
+
+    rows = db.session.execute(
+        select(DoseDailyRollup.prescription_id, DoseDailyRollup.day, DoseDailyRollup.taken_count)
+        .where(DoseDailyRollup.prescription_id.in_([p[0] for p in prescriptions]),
+               DoseDailyRollup.day >= date.fromordinal(base),
+               DoseDailyRollup.day <= as_of)
+        .order_by(DoseDailyRollup.prescription_id)
+    ).all()
+    # Columns, sliced per prescription (rows are ordered by prescription)
+    rx_col, day_col, taken_col = zip(*rows) if rows else ((), (), ())
+    ordinal_col = [d.toordinal() for d in day_col]
+
+    out = {}
+    for rx_id, pid, start, end, freq in prescriptions:
+        i, j = bisect_left(rx_col, rx_id), bisect_right(rx_col, rx_id)
+        pdc, mpr = _rx_series(start, end, max(freq or 1, 1), ordinal_col[i:j], taken_col[i:j],
+                              base, n, pad, windows)
+        out[rx_id] = {"patient_id": pid, "pdc": pdc, "mpr": mpr}
+    return day_list, out
+
+
+def _mean_series(series_list):
+    def mean(values):
+        present = [v for v in values if v is not None]
+        return round(fmean(present), 1) if present else None
+    return [mean(values) for values in zip(*series_list)]
+
+
+def patient_series(patient_id: int, days: int = 90, as_of: date | None = None, windows=WINDOWS) -> dict:
+    """Per-day mean of the patient's prescription series, plus the per-prescription series."""
+    day_list, per_rx = prescription_series(patient_id=patient_id, days=days, as_of=as_of, windows=windows)
+    return {
+        "days": [d.isoformat() for d in day_list],
+        "pdc": {w: _mean_series([s["pdc"][w] for s in per_rx.values()]) for w in windows},
+        "mpr": {w: _mean_series([s["mpr"][w] for s in per_rx.values()]) for w in windows},
+        "prescriptions": per_rx,
+    }
+
+
+# ---------- nightly snapshot ----------
+
+def _latest_batch(as_of: date, last_id: int, batch_size: int):
+    """Latest-window sums for the next batch of prescriptions still relevant at as_of."""
+    horizon = as_of - timedelta(days=max(WINDOWS))
+    freq = case((Prescription.frequency_per_day >= 1, Prescription.frequency_per_day), else_=1)
+    sums = []
+    for w in WINDOWS:
+        in_window = DoseDailyRollup.day > as_of - timedelta(days=w)
+        sums.append(func.sum(case((and_(in_window, DoseDailyRollup.taken_count >= freq), 1), else_=0)))
+        sums.append(func.sum(case((in_window, DoseDailyRollup.taken_count), else_=0)))
+    stmt = (
+        select(Prescription.id, Prescription.patient_id, Prescription.medication_id,
+               Prescription.start_date, Prescription.end_date, freq, *sums)
+        .outerjoin(DoseDailyRollup, and_(
+            DoseDailyRollup.prescription_id == Prescription.id,
+            DoseDailyRollup.day > horizon,
+            DoseDailyRollup.day <= as_of,
+            DoseDailyRollup.day >= Prescription.start_date,
+            or_(Prescription.end_date.is_(None), DoseDailyRollup.day <= Prescription.end_date),
+        ))
+        .where(Prescription.id > last_id,
+               or_(Prescription.start_date.is_(None), Prescription.start_date <= as_of),
+               or_(Prescription.end_date.is_(None), Prescription.end_date > horizon))
+        .group_by(Prescription.id)
+        .order_by(Prescription.id)
+        .limit(batch_size)
+    )
+    return db.session.execute(stmt).all()
+
+
+def latest_metrics(row, as_of: date) -> dict:
+    """Snapshot values from one _latest_batch row."""
+    rx_id, patient_id, _, start, end, freq, *sums = row
+    values = {"prescription_id": rx_id, "patient_id": patient_id, "as_of": as_of}
+    for k, w in enumerate(WINDOWS):
+        covered, taken = sums[2 * k] or 0, sums[2 * k + 1] or 0
+        due = _due_days(start, end, as_of - timedelta(days=w - 1), as_of)
+        values[f"pdc_{w}"] = _pct(covered, due)
+        if w != 7:
+            values[f"mpr_{w}"] = _pct(taken, due * freq)
+    return values
+
+
+def nightly_snapshot(as_of: date | None = None, batch_size: int = SNAPSHOT_BATCH) -> int:
+    """
+    Recompute prescription_adherence_metric for every prescription active in
+    the last 90 days, committing per batch, and fold the changes into the
+    cohort aggregates. Returns the number of rows written.
+    """
+    from app.services import cohorts
+
+    as_of = as_of or default_as_of()
+    table = PrescriptionAdherenceMetric.__table__
+    written, last_id = 0, 0
+    while True:
+        batch = _latest_batch(as_of, last_id, batch_size)
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        rows = [latest_metrics(r, as_of) for r in batch]
+        ids = [r["prescription_id"] for r in rows]
+        previous = dict(db.session.execute(
+            select(table.c.prescription_id, table.c.pdc_90).where(table.c.prescription_id.in_(ids))).all())
+        db.session.execute(delete(table).where(table.c.prescription_id.in_(ids)))
+        db.session.execute(insert(table), rows)
+        cohorts.apply_metric_changes(db.session.connection(), [
+            (r[2], r[3], previous.get(m["prescription_id"]), m["pdc_90"]) for r, m in zip(batch, rows)
+        ])
+        db.session.commit()
+        written += len(rows)
+    # Prescriptions that dropped out of the 90-day horizon
+    stale = db.session.execute(
+        select(Prescription.medication_id, Prescription.start_date, table.c.pdc_90)
+        .join(Prescription, Prescription.id == table.c.prescription_id)
+        .where(table.c.as_of != as_of)
+    ).all()
+    cohorts.apply_metric_changes(db.session.connection(), [(m, s, v, None) for m, s, v in stale])
+    cohorts.prune(db.session.connection())
+    db.session.execute(delete(table).where(table.c.as_of != as_of))
+    db.session.commit()
+    return written
+
+
+def patient_summary(start: int = 0, length: int = 25, search_value: str = ""):
+    """
+    Per-patient means over the snapshot, worst 90-day PDC first, for the
+    reports table. Returns (records_total, records_filtered, rows).
+    """
+    from app.services import search
+
+    m = PrescriptionAdherenceMetric
+    per_patient = (
+        select(m.patient_id, func.count(m.prescription_id).label("prescriptions"),
+               func.avg(m.pdc_30).label("pdc_30"), func.avg(m.pdc_90).label("pdc_90"),
+               func.avg(m.mpr_90).label("mpr_90"), func.max(m.as_of).label("as_of"))
+        .group_by(m.patient_id)
+        .subquery()
+    )
+    stmt = (
+        select(Patient.id, Patient.last_name, Patient.first_name, per_patient.c.prescriptions,
+               per_patient.c.pdc_30, per_patient.c.pdc_90, per_patient.c.mpr_90, per_patient.c.as_of)
+        .join(per_patient, per_patient.c.patient_id == Patient.id)
+    )
+    records_total = db.session.scalar(select(func.count()).select_from(per_patient))
+    if search_value:
+        stmt = stmt.where(search.patient_filter(search_value))
+    records_filtered = db.session.scalar(select(func.count()).select_from(stmt.subquery()))
+    rows = db.session.execute(
+        stmt.order_by(per_patient.c.pdc_90.asc().nulls_last(), Patient.last_name, Patient.first_name)
+        .offset(start).limit(length)
+    ).all()
+    return records_total, records_filtered, rows
@@ -0,0 +1,245 @@
+# app/services/archive.py
+"""
+Time-partitioned dose-log storage and cold archival.
+
+On Postgres dose_log is range-partitioned by month on taken_at (see the
+partition_dose_log migration); ensure_partitions() keeps partitions created
+ahead of time. SQLite has no partitioning, so there the hot table is simply
+kept small by archival.
+
+archive_closed_months() moves every month older than DOSE_LOG_HOT_MONTHS out
+of dose_log into one gzip NDJSON file per month under DOSE_LOG_ARCHIVE_DIR,
+then drops the Postgres partition (or deletes the rows on SQLite). The daily
+rollup is left untouched, so adherence and month summaries still cover the
+full history. Archived rows stay queryable through iter_archived().
+"""
+import gzip
+import heapq
+import json
+import os
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select, delete, func, table, column, true
+from app import db
+from app.models import DoseLog
+
+HOT_MONTHS = 3
+PARTITIONS_AHEAD = 2
+DELETE_BATCH = 500
+ARCHIVE_FIELDS = ("id", "prescription_id", "taken_at", "was_taken", "notes")
+
+
+# ---------- months ----------
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def _bounds(month: date):
+    return datetime.combine(month, datetime.min.time()), datetime.combine(add_months(month, 1), datetime.min.time())
+
+
+def hot_cutoff(today: date | None = None, hot_months: int | None = None) -> date:
+    """First day of the oldest month that stays in the hot table."""
+    if hot_months is None:
+        hot_months = current_app.config.get("DOSE_LOG_HOT_MONTHS", HOT_MONTHS)
+    return add_months(month_start(today or datetime.utcnow().date()), -hot_months)
+
+
+# ---------- Postgres partitions ----------
+def partition_name(month: date) -> str:
+    return f"dose_log_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.exec_driver_sql(
+        "SELECT relkind FROM pg_class WHERE relname = 'dose_log' AND relkind = 'p'"
+    ).first() is not None
+
+
+def create_partition(connection, month: date) -> str:
+    """Create the monthly partition if missing."""
+    name = partition_name(month)
+    lo, hi = month.isoformat(), add_months(month, 1).isoformat()
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF dose_log "
+        f"FOR VALUES FROM ('{lo}') TO ('{hi}')"
+    )
+    return name
+
+
+def ensure_partitions(connection=None, today: date | None = None, ahead: int = PARTITIONS_AHEAD) -> list[str]:
+    """Create partitions from the current month through `ahead` months out. No-op off Postgres."""
+    connection = connection or db.session.connection()
+    if not is_partitioned(connection):
+        return []
+    first = month_start(today or datetime.utcnow().date())
+    return [create_partition(connection, add_months(first, i)) for i in range(ahead + 1)]
+
+
+# ---------- archive files ----------
+def archive_dir() -> str:
+    return current_app.config.get("DOSE_LOG_ARCHIVE_DIR") or os.path.join(
+        current_app.instance_path, "archive", "dose_log"
+    )
+
+
+def archive_path(month: date) -> str:
+    return os.path.join(archive_dir(), f"{month.year:04d}-{month.month:02d}.ndjson.gz")
+
+
+def archived_months() -> list[date]:
+    out = []
+    if os.path.isdir(archive_dir()):
+        for fname in os.listdir(archive_dir()):
+            if fname.endswith(".ndjson.gz"):
+                y, m = fname[: -len(".ndjson.gz")].split("-")
+                out.append(date(int(y), int(m), 1))
+    return sorted(out)
+
+
+def archive_cutoff() -> date | None:
+    """First day after the newest archived month: older dose logs are only in the archive."""
+    months = archived_months()
+    return add_months(months[-1], 1) if months else None
+
+
+def _read(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            rec = json.loads(line)
+            rec["taken_at"] = datetime.fromisoformat(rec["taken_at"])
+            yield rec
+
+
+def iter_archived(start: date | None = None, end: date | None = None, prescription_ids=None):
+    """
+    Yield archived dose logs as dicts (ARCHIVE_FIELDS, taken_at as datetime)
+    in (taken_at, id) order, restricted to taken_at dates in [start, end] and
+    to `prescription_ids` when given. Only the month files in range are
+    opened, and each is streamed (files are written sorted).
+    """
+    wanted = set(prescription_ids) if prescription_ids is not None else None
+    for month in archived_months():
+        if (start and add_months(month, 1) <= start) or (end and month > end):
+            continue
+        for rec in _read(archive_path(month)):
+            day = rec["taken_at"].date()
+            if (start and day < start) or (end and day > end):
+                continue
+            if wanted is not None and rec["prescription_id"] not in wanted:
+                continue
+            yield rec
+
+
+def _sort_key(rec):
+    return rec["taken_at"], rec["id"]
+
+
+def _write_month(month: date, rows) -> tuple[int, list[int]]:
+    """
+    Merge rows (ordered by taken_at, id) into the month's file, which stays
+    sorted the same way so readers can stream it. The merge streams both
+    sides into a temporary file that replaces the old one, and rows already
+    archived (a run that crashed after writing but before deleting) are
+    skipped. Returns (rows written, ids of every row seen).
+    """
+    path = archive_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ids = []
+
+    def incoming():
+        for row in rows:
+            ids.append(row.id)
+            yield dict(zip(ARCHIVE_FIELDS, (row.id, row.prescription_id, row.taken_at,
+                                            bool(row.was_taken), row.notes)))
+
+    existing = _read(path) if os.path.exists(path) else iter(())
+    # On equal keys heapq.merge yields the existing record first
+    merged = heapq.merge(((rec, 0) for rec in existing), ((rec, 1) for rec in incoming()),
+                         key=lambda item: _sort_key(item[0]))
+    written, last = 0, None
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for rec, is_new in merged:
+                if _sort_key(rec) == last:
+                    continue
+                last = _sort_key(rec)
+                gz.write((json.dumps({**rec, "taken_at": rec["taken_at"].isoformat()}) + "\n").encode("utf-8"))
+                written += is_new
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return written, ids
+
+
+# ---------- archival job ----------
+def _oldest_month(connection) -> date | None:
+    oldest = connection.execute(select(func.min(DoseLog.taken_at))).scalar()
+    return month_start(oldest) if oldest else None
+
+
+def archive_month(month: date) -> int:
+    """
+    Move one closed month from dose_log to its archive file. Returns rows archived.
+
+    Only rows that made it into the file are removed: the Postgres partition
+    is detached before it is read (late backdated inserts then land in the
+    default partition for a later run), and elsewhere the delete is by the
+    archived ids rather than by date range.
+    """
+    from app.services import search
+
+    conn = db.session.connection()
+    partition = partition_name(month) if is_partitioned(conn) else None
+    if partition and not conn.exec_driver_sql(
+        "SELECT 1 FROM pg_class WHERE relname = %(name)s", {"name": partition}
+    ).first():
+        partition = None
+    if partition:
+        conn.exec_driver_sql(f"ALTER TABLE dose_log DETACH PARTITION {partition}")
+        source = table(partition, *(column(name) for name in ARCHIVE_FIELDS))
+        where = true()
+    else:
+        lo, hi = _bounds(month)
+        source = DoseLog.__table__
+        where = (source.c.taken_at >= lo) & (source.c.taken_at < hi)
+    rows = conn.execute(
+        select(*(source.c[name] for name in ARCHIVE_FIELDS))
+        .where(where)
+        .order_by(source.c.taken_at, source.c.id)
+        .execution_options(yield_per=5000)
+    )
+    written, ids = _write_month(month, rows)
+
+    search.remove_documents(conn, "dose_log", ids)
+    if partition:
+        conn.exec_driver_sql(f"DROP TABLE {partition}")
+    else:
+        # Core delete: the ORM listeners would subtract these rows from the rollup
+        for i in range(0, len(ids), DELETE_BATCH):
+            conn.execute(delete(source).where(source.c.id.in_(ids[i:i + DELETE_BATCH])))
+    db.session.commit()
+    return written
+
+
+def archive_closed_months(today: date | None = None, hot_months: int | None = None) -> dict:
+    """Archive every month before the hot cutoff. Returns {"YYYY-MM": rows archived}."""
+    cutoff = hot_cutoff(today, hot_months)
+    month = _oldest_month(db.session.connection())
+    done = {}
+    while month is not None and month < cutoff:
+        done[month.strftime("%Y-%m")] = archive_month(month)
+        month = add_months(month, 1)
+    if done:
+        from app.services.dashboard import invalidate
+        invalidate(DoseLog)
+    return done
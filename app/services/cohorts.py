@@ -0,0 +1,200 @@
+# app/services/cohorts.py
+"""
+Adherence by medication and start-date cohort.
+
+Each prescription's 90-day PDC (from the nightly prescription_adherence_metric
+snapshot) is folded into two small tables keyed by (medication, start
+quarter): running totals (count, sum, sum of squares) and a 20-bucket
+histogram. Both are maintained by deltas: when the nightly pass replaces a
+prescription's value, the old value is subtracted and the new one added, so
+refresh cost follows the batch size rather than the population.
+
+A question such as "Metformin 500 mg started in 2026Q1" reads one totals row
+and at most 20 bucket rows. The mean and standard deviation are exact.
+Percentiles are interpolated within 5-point buckets, so they are within 2.5
+points of the true value.
+"""
+from collections import defaultdict
+from datetime import date
+from math import sqrt
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import (CohortAdherence, CohortAdherenceBucket, Medication, Prescription,
+                        PrescriptionAdherenceMetric)
+
+BUCKETS = 20
+BUCKET_WIDTH = 100 / BUCKETS
+PERCENTILES = (10, 25, 50, 75, 90)
+ADHERENT_PDC = 80.0  # the usual payer threshold
+
+
+def cohort_of(start: date | None) -> str | None:
+    return f"{start.year}Q{(start.month - 1) // 3 + 1}" if start else None
+
+
+def bucket_of(pdc: float) -> int:
+    return min(int(pdc // BUCKET_WIDTH), BUCKETS - 1)
+
+
+def _tenths(pdc: float) -> int:
+    return int(round(pdc * 10))
+
+
+def _upsert_add(connection, table, keys, rows):
+    dialect_insert = sqlite.insert if connection.dialect.name == "sqlite" else postgresql.insert
+    stmt = dialect_insert(table).values(rows)
+    counters = [c.name for c in table.columns if c.name not in keys]
+    return connection.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in keys],
+        set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+    ))
+
+
+def apply_metric_changes(connection, changes) -> None:
+    """
+    Fold snapshot changes into the cohort tables. `changes` is an iterable
+    of (medication_id, start_date, old_pdc, new_pdc); either value may be
+    None (no row before / no row after / nothing due).
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    buckets = defaultdict(int)
+    for medication_id, start, old, new in changes:
+        if old == new:
+            continue
+        key = (medication_id, cohort_of(start))
+        if key[1] is None:
+            continue
+        for value, sign in ((old, -1), (new, 1)):
+            if value is None:
+                continue
+            t = _tenths(value)
+            slot = totals[key]
+            slot[0] += sign
+            slot[1] += sign * t
+            slot[2] += sign * t * t
+            buckets[key + (bucket_of(value),)] += sign
+
+    rows = [{"medication_id": m, "cohort": c, "prescriptions": n, "pdc_sum": s, "pdc_sum_sq": sq}
+            for (m, c), (n, s, sq) in totals.items() if n or s or sq]
+    if rows:
+        _upsert_add(connection, CohortAdherence.__table__, ("medication_id", "cohort"), rows)
+    rows = [{"medication_id": m, "cohort": c, "bucket": b, "count": n}
+            for (m, c, b), n in buckets.items() if n]
+    if rows:
+        _upsert_add(connection, CohortAdherenceBucket.__table__, ("medication_id", "cohort", "bucket"), rows)
+
+
+def prune(connection) -> None:
+    """Drop cohorts and buckets that have emptied out."""
+    connection.execute(delete(CohortAdherence.__table__).where(CohortAdherence.prescriptions <= 0))
+    connection.execute(delete(CohortAdherenceBucket.__table__).where(CohortAdherenceBucket.count <= 0))
+
+
+def rebuild_cohorts() -> int:
+    """Recompute both tables from the snapshot (after bulk edits). Returns cohorts written."""
+    connection = db.session.connection()
+    connection.execute(delete(CohortAdherence.__table__))
+    connection.execute(delete(CohortAdherenceBucket.__table__))
+    rows = db.session.execute(
+        select(Prescription.medication_id, Prescription.start_date, PrescriptionAdherenceMetric.pdc_90)
+        .join(Prescription, PrescriptionAdherenceMetric.prescription_id == Prescription.id)
+        .where(PrescriptionAdherenceMetric.pdc_90.is_not(None))
+        .execution_options(yield_per=10000)
+    )
+    for batch in rows.partitions():
+        apply_metric_changes(connection, [(m, s, None, v) for m, s, v in batch])
+    db.session.commit()
+    return db.session.scalar(select(func.count()).select_from(CohortAdherence))
+
+
+# ---------- queries ----------
+
+def _percentile(counts: list[int], n: int, pct: float) -> float | None:
+    """Linear interpolation inside the bucket holding the pct-th value."""
+    if not n:
+        return None
+    target = pct / 100 * n
+    seen = 0
+    for b, c in enumerate(counts):
+        if c and seen + c >= target:
+            return round(b * BUCKET_WIDTH + BUCKET_WIDTH * (target - seen) / c, 1)
+        seen += c
+    return 100.0
+
+
+def _summary(n, total, total_sq, counts) -> dict:
+    mean = total / n / 10 if n else None
+    variance = max(total_sq / n / 100 - mean * mean, 0.0) if n else None
+    return {
+        "prescriptions": n,
+        "mean": round(mean, 1) if mean is not None else None,
+        "stddev": round(sqrt(variance), 1) if variance is not None else None,
+        "percentiles": {f"p{p}": _percentile(counts, n, p) for p in PERCENTILES},
+        "adherent_share": round(100.0 * sum(counts[bucket_of(ADHERENT_PDC):]) / n, 1) if n else None,
+        "histogram": [{"from": b * BUCKET_WIDTH, "to": (b + 1) * BUCKET_WIDTH, "count": c}
+                      for b, c in enumerate(counts)],
+    }
+
+
+def _filtered(stmt, model, medication_id, name, strength, cohort):
+    if medication_id is not None:
+        stmt = stmt.where(model.medication_id == medication_id)
+    if name or strength:
+        stmt = stmt.join(Medication, Medication.id == model.medication_id)
+        if name:
+            stmt = stmt.where(func.lower(Medication.name) == name.lower())
+        if strength:
+            stmt = stmt.where(func.lower(Medication.strength) == strength.lower())
+    if cohort:
+        stmt = stmt.where(model.cohort == cohort)
+    return stmt
+
+
+def cohort_distribution(medication_id=None, name=None, strength=None, cohort=None) -> dict:
+    """
+    90-day PDC distribution for the matching medication(s) and cohort; any
+    filter may be omitted (name without strength spans all strengths).
+    """
+    n, total, total_sq = db.session.execute(_filtered(
+        select(func.coalesce(func.sum(CohortAdherence.prescriptions), 0),
+               func.coalesce(func.sum(CohortAdherence.pdc_sum), 0),
+               func.coalesce(func.sum(CohortAdherence.pdc_sum_sq), 0)),
+        CohortAdherence, medication_id, name, strength, cohort)).one()
+    counts = [0] * BUCKETS
+    for b, c in db.session.execute(_filtered(
+            select(CohortAdherenceBucket.bucket, func.sum(CohortAdherenceBucket.count))
+            .group_by(CohortAdherenceBucket.bucket),
+            CohortAdherenceBucket, medication_id, name, strength, cohort)):
+        counts[b] = int(c)
+    return _summary(int(n), int(total), int(total_sq), counts)
+
+
+def medication_cohorts(medication_id: int) -> list[dict]:
+    """Per-cohort summaries for one medication, oldest cohort first."""
+    totals = db.session.execute(
+        select(CohortAdherence.cohort, CohortAdherence.prescriptions,
+               CohortAdherence.pdc_sum, CohortAdherence.pdc_sum_sq)
+        .where(CohortAdherence.medication_id == medication_id)
+        .order_by(CohortAdherence.cohort)
+    ).all()
+    counts = defaultdict(lambda: [0] * BUCKETS)
+    for cohort, b, c in db.session.execute(
+            select(CohortAdherenceBucket.cohort, CohortAdherenceBucket.bucket, CohortAdherenceBucket.count)
+            .where(CohortAdherenceBucket.medication_id == medication_id)):
+        counts[cohort][b] = c
+    return [{"cohort": cohort, **_summary(n, s, sq, counts[cohort])} for cohort, n, s, sq in totals]
+
+
+def mean_pdc_by_medication(medication_ids) -> dict[int, float]:
+    """{medication_id: mean 90-day PDC} across all cohorts (for the medications table)."""
+    if not medication_ids:
+        return {}
+    rows = db.session.execute(
+        select(CohortAdherence.medication_id, func.sum(CohortAdherence.prescriptions),
+               func.sum(CohortAdherence.pdc_sum))
+        .where(CohortAdherence.medication_id.in_(list(medication_ids)))
+        .group_by(CohortAdherence.medication_id)
+    )
+    return {mid: round(s / n / 10, 1) for mid, n, s in rows if n}
@@ -0,0 +1,176 @@
+# app/services/dashboard.py
+"""
+Data blocks for clinic_dashboard.
+
+Each block is an independent query. Blocks missing from the cache run
+concurrently, each on its own pooled connection, and the results are cached
+briefly. Commits that touch a block's tables drop that block from the cache.
+The cache is per worker process, so the TTL bounds how stale another worker's
+copy can get.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from datetime import date
+import threading
+
+from flask import current_app
+from sqlalchemy import event, select, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from app import db
+from app.models import Patient, Medication, Prescription, DoseLog, PatientAdherenceWindow
+from app.utils.cache import TTLCache
+from app.utils.replica import read_engine
+from app.utils.timeutils import local_today
+
+_cache = TTLCache(ttl=15.0, maxsize=64)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _counts(s, today):
+    return {
+        "patient_count": s.scalar(select(func.count(Patient.id))),
+        "med_count": s.scalar(select(func.count(Medication.id))),
+        "rx_count": s.scalar(select(func.count(Prescription.id))),
+    }
+
+def _last_logs(s, today):
+    return s.execute(
+        select(DoseLog, Patient, Medication, Prescription)
+        .join(Prescription, DoseLog.prescription_id == Prescription.id)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .order_by(DoseLog.taken_at.desc())
+        .limit(10)
+    ).all()
+
+def _adherence_rows(s, today):
+    # Served from the 30-day projection maintained by app.services.projections
+    return s.execute(
+        select(Patient.id, Patient.first_name, Patient.last_name,
+               PatientAdherenceWindow.adherence.label("adherence"))
+        .join(Patient, PatientAdherenceWindow.patient_id == Patient.id)
+        .where(PatientAdherenceWindow.total_count > 0)
+        .order_by(PatientAdherenceWindow.adherence.asc())
+    ).all()
+
+def _recent_rx(s, today):
+    return s.execute(
+        select(Prescription, Patient, Medication)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .order_by(Prescription.id.desc())
+        .limit(10)
+    ).all()
+
+def _due_today(s, today):
+    return s.execute(
+        select(Prescription, Patient, Medication)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .where(Prescription.start_date <= today)
+        .where((Prescription.end_date == None) | (Prescription.end_date >= today))
+        .order_by(Patient.last_name.asc(), Medication.name.asc())
+    ).all()
+
+def _patient_choices(s, today):
+    return [
+        (pid, f"{last}, {first}")
+        for pid, first, last in s.execute(
+            select(Patient.id, Patient.first_name, Patient.last_name).order_by(Patient.last_name.asc())
+        )
+    ]
+
+def _medication_choices(s, today):
+    return [
+        (mid, f"{name} {strength or ''}".strip())
+        for mid, name, strength in s.execute(
+            select(Medication.id, Medication.name, Medication.strength).order_by(Medication.name.asc())
+        )
+    ]
+
+# block name -> (loader, models whose writes invalidate it)
+BLOCKS = {
+    "counts": (_counts, (Patient, Medication, Prescription)),
+    "last_logs": (_last_logs, (Patient, Medication, Prescription, DoseLog)),
+    "adherence_rows": (_adherence_rows, (Patient, Prescription, DoseLog)),
+    "recent_rx": (_recent_rx, (Patient, Medication, Prescription)),
+    "due_today": (_due_today, (Patient, Medication, Prescription)),
+    "patient_choices": (_patient_choices, (Patient,)),
+    "medication_choices": (_medication_choices, (Medication,)),
+}
+
+
+def _run_block(engine, name, today):
+    loader, _ = BLOCKS[name]
+    with Session(bind=engine, expire_on_commit=False) as s:
+        return loader(s, today)
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dashboard")
+        return _executor
+
+def _can_parallelize(engine) -> bool:
+    # In-memory/single-connection pools share one DBAPI connection across threads
+    return not isinstance(engine.pool, (StaticPool, SingletonThreadPool))
+
+def dashboard_data(today: date | None = None) -> dict:
+    """All dashboard blocks keyed by name (counts are flattened into the dict)."""
+    if today is None:
+        today = local_today()
+    ttl = current_app.config.get("DASHBOARD_CACHE_TTL", 15.0)
+    workers = current_app.config.get("DASHBOARD_MAX_WORKERS", 4)
+    engine = read_engine(db)
+
+    results, missing = {}, []
+    for name in BLOCKS:
+        value = _cache.get((name, today))
+        if value is None:
+            missing.append(name)
+        else:
+            results[name] = value
+
+    if len(missing) > 1 and workers > 1 and _can_parallelize(engine):
+        executor = _get_executor(workers)
+        # copy_context: block queries still count toward the request's SQL trace
+        futures = {name: executor.submit(contextvars.copy_context().run, _run_block, engine, name, today)
+                   for name in missing}
+        fresh = {name: f.result() for name, f in futures.items()}
+    else:
+        fresh = {name: _run_block(engine, name, today) for name in missing}
+
+    for name, value in fresh.items():
+        _cache.set((name, today), value, ttl)
+    results.update(fresh)
+
+    data = dict(results)
+    data.update(data.pop("counts"))
+    return data
+
+
+def invalidate(*models) -> None:
+    """Drop cached blocks that depend on any of `models` (all blocks when none given)."""
+    touched = set(models)
+    stale = [name for name, (_, deps) in BLOCKS.items() if not touched or touched.intersection(deps)]
+    _cache.evict(lambda key: key[0] in stale)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_writes(session, flush_context):
+    dirty = session.info.setdefault("dashboard_dirty", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        dirty.add(type(obj))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    dirty = session.info.pop("dashboard_dirty", None)
+    if dirty:
+        invalidate(*dirty)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("dashboard_dirty", None)
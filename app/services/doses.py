@@ -0,0 +1,117 @@
+# app/services/doses.py
+"""
+Patient-recorded doses ("taken" / "missed" taps).
+
+A tap claims one of the prescription's frequency_per_day dose slots for the
+patient's local day and inserts the DoseLog in the same statement. The claim
+is an INSERT ... ON CONFLICT DO NOTHING into dose_slot, conditional on the
+day having fewer logs than doses due. The slot is the dose number the page
+offered (or the lowest one still free), so double-clicks, retried requests
+and concurrent workers all resolve to a single row per dose without a
+read-then-write window. On Postgres the claim and the log are one statement (a data-modifying CTE). SQLite cannot put DML in a
+CTE, so it runs two statements in one transaction, which is still atomic
+because SQLite writes are serialized.
+
+The insert is Core, so like the bulk ingest path the rollup, projection and
+search index are updated here directly.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import select, exists, func, literal, union_all, Boolean, Date, DateTime, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import DoseLog, DoseSlot
+from app.utils.timeutils import local_day_range
+
+
+def _claim(rx_id: int, day: date, zone_name: str | None, per_day: int, dose: int | None):
+    """
+    SELECT producing the slot row only while the local day has fewer than
+    `per_day` dose logs. Without an explicit `dose` the slot is the lowest
+    dose number not yet claimed that day.
+    """
+    start, end = local_day_range(day, zone_name)
+    logged = (
+        select(func.count())
+        .where(DoseLog.prescription_id == rx_id, DoseLog.taken_at >= start, DoseLog.taken_at < end)
+        .scalar_subquery()
+    )
+    if dose is not None:
+        slot = literal(dose, Integer)
+    else:
+        doses = union_all(*(select(literal(n, Integer).label("dose")) for n in range(1, per_day + 1))).subquery()
+        claimed = exists().where(DoseSlot.prescription_id == rx_id, DoseSlot.day == day,
+                                 DoseSlot.dose == doses.c.dose)
+        slot = select(func.min(doses.c.dose)).where(~claimed).scalar_subquery()
+    return select(literal(rx_id, Integer), literal(day, Date), slot).where(logged < per_day, slot.is_not(None))
+
+
+def _insert_postgresql(connection, claim, rx_id, row):
+    claimed = (
+        postgresql.insert(DoseSlot)
+        .from_select(["prescription_id", "day", "dose"], claim)
+        .on_conflict_do_nothing()
+        .returning(DoseSlot.prescription_id)
+        .cte("claimed")
+    )
+    stmt = (
+        postgresql.insert(DoseLog)
+        .from_select(
+            ["prescription_id", "taken_at", "was_taken", "notes"],
+            select(claimed.c.prescription_id, literal(row["taken_at"], DateTime),
+                   literal(row["was_taken"], Boolean), literal(row["notes"], String)),
+        )
+        .returning(DoseLog.id)
+        .add_cte(claimed)
+    )
+    return connection.execute(stmt).scalar()
+
+
+def _insert_sqlite(connection, claim, rx_id, row):
+    claimed = connection.execute(
+        sqlite.insert(DoseSlot)
+        .from_select(["prescription_id", "day", "dose"], claim)
+        .on_conflict_do_nothing()
+        .returning(DoseSlot.prescription_id)
+    ).first()
+    if claimed is None:
+        return None
+    return connection.execute(
+        sqlite.insert(DoseLog).values(prescription_id=rx_id, **row)
+        .returning(DoseLog.id)
+    ).scalar()
+
+
+def log_dose(rx_id: int, day: date, zone_name: str | None, was_taken: bool,
+             notes: str | None = None, now: datetime | None = None,
+             per_day: int = 1, dose: int | None = None) -> int | None:
+    """
+    Record one of the patient's `per_day` doses for `day` (their local day in
+    `zone_name`). `dose` is the 1-based dose number the patient was shown;
+    without it the lowest unclaimed one is taken. Returns the new DoseLog id, or
+    None when that dose (or every dose of the day) was already logged.
+    Commits on success and rolls back otherwise.
+    """
+    from app.services import rollup, projections, search
+    from app.services.dashboard import invalidate
+
+    per_day = max(per_day or 1, 1)
+    if dose is not None and not 1 <= dose <= per_day:
+        return None
+    now = now or datetime.utcnow()
+    row = {"taken_at": now, "was_taken": was_taken, "notes": notes}
+    connection = db.session.connection()
+    insert_fn = _insert_sqlite if connection.dialect.name == "sqlite" else _insert_postgresql
+    log_id = insert_fn(connection, _claim(rx_id, day, zone_name, per_day, dose), rx_id, row)
+    if log_id is None:
+        db.session.rollback()
+        return None
+
+    event = (rx_id, now, was_taken, 1)
+    rollup.apply_dose_counts(connection, [event], zones={rx_id: zone_name or ""})
+    projections.apply_dose_events(connection, [event], now=now)
+    search.index_documents(connection, "dose_log", [(log_id, notes, "")])
+    db.session.info["wrote"] = True  # no flush happened; keep replica reads sticky to the primary
+    db.session.commit()
+    invalidate(DoseLog)
+    return log_id
@@ -0,0 +1,187 @@
+# app/services/export.py
+"""
+Streaming exports of dose logs and per-prescription adherence.
+
+Rows come off a server-side cursor (yield_per implies stream_results) and are
+encoded into CSV or NDJSON as they arrive. Output is buffered into ~64 KB
+chunks, optionally gzip-compressed incrementally, so memory stays flat
+however many rows match.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+from app import db
+from app.models import Patient, Medication, Prescription, DoseLog
+
+YIELD_PER = 2000
+FLUSH_BYTES = 64 * 1024
+ADHERENCE_BATCH = 1000
+
+DOSE_LOG_FIELDS = ["id", "taken_at", "prescription_id", "patient_id", "patient",
+                   "medication", "was_taken", "notes"]
+ADHERENCE_FIELDS = ["prescription_id", "patient_id", "patient", "medication",
+                    "start_date", "end_date", "frequency_per_day", "adherence_pct"]
+
+
+def _archived_dose_log_rows(patient_id, medication_id, start, end):
+    """Archived logs (app.services.archive) in the same shape as the live rows."""
+    from app.services.archive import iter_archived
+
+    stmt = (
+        select(Prescription.id, Patient.id, Patient.last_name, Patient.first_name,
+               Medication.name, Medication.strength)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+    )
+    if patient_id is not None:
+        stmt = stmt.where(Prescription.patient_id == patient_id)
+    if medication_id is not None:
+        stmt = stmt.where(Prescription.medication_id == medication_id)
+    # One row per prescription, far smaller than the logs themselves
+    owners = {rx_id: rest for rx_id, *rest in db.session.execute(stmt)}
+    for rec in iter_archived(start, end, prescription_ids=owners):
+        pid, last, first, med, strength = owners[rec["prescription_id"]]
+        yield {
+            "id": rec["id"],
+            "taken_at": rec["taken_at"].isoformat(),
+            "prescription_id": rec["prescription_id"],
+            "patient_id": pid,
+            "patient": f"{last}, {first}",
+            "medication": f"{med} {strength or ''}".strip(),
+            "was_taken": bool(rec["was_taken"]),
+            "notes": rec["notes"] or "",
+        }
+
+
+def dose_log_rows(patient_id=None, medication_id=None, start=None, end=None, include_archived=False):
+    """
+    Yield one dict per matching dose log, oldest first. `start`/`end` are
+    inclusive dates on taken_at (UTC). Archived months come first when
+    `include_archived` is set; they are all older than the live table.
+    """
+    if include_archived:
+        yield from _archived_dose_log_rows(patient_id, medication_id, start, end)
+
+    stmt = (
+        select(DoseLog.id, DoseLog.taken_at, DoseLog.prescription_id, Patient.id,
+               Patient.last_name, Patient.first_name, Medication.name, Medication.strength,
+               DoseLog.was_taken, DoseLog.notes)
+        .join(Prescription, DoseLog.prescription_id == Prescription.id)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .order_by(DoseLog.taken_at, DoseLog.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    if patient_id is not None:
+        stmt = stmt.where(Prescription.patient_id == patient_id)
+    if medication_id is not None:
+        stmt = stmt.where(Prescription.medication_id == medication_id)
+    if start is not None:
+        stmt = stmt.where(DoseLog.taken_at >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        stmt = stmt.where(DoseLog.taken_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    for log_id, taken_at, rx_id, pid, last, first, med, strength, was_taken, notes in db.session.execute(stmt):
+        yield {
+            "id": log_id,
+            "taken_at": taken_at.isoformat() if taken_at else None,
+            "prescription_id": rx_id,
+            "patient_id": pid,
+            "patient": f"{last}, {first}",
+            "medication": f"{med} {strength or ''}".strip(),
+            "was_taken": bool(was_taken),
+            "notes": notes or "",
+        }
+
+
+def adherence_rows(patient_id=None, medication_id=None, today=None):
+    """
+    Yield adherence per prescription, walking prescriptions in id batches and
+    scoring each batch with one grouped rollup query.
+    """
+    from app.services.adherence import adherence_for_prescriptions
+
+    last_id = 0
+    while True:
+        stmt = (
+            select(Prescription.id, Prescription.patient_id, Patient.last_name, Patient.first_name,
+                   Medication.name, Medication.strength, Prescription.start_date,
+                   Prescription.end_date, Prescription.frequency_per_day)
+            .join(Patient, Prescription.patient_id == Patient.id)
+            .join(Medication, Prescription.medication_id == Medication.id)
+            .where(Prescription.id > last_id)
+            .order_by(Prescription.id)
+            .limit(ADHERENCE_BATCH)
+        )
+        if patient_id is not None:
+            stmt = stmt.where(Prescription.patient_id == patient_id)
+        if medication_id is not None:
+            stmt = stmt.where(Prescription.medication_id == medication_id)
+        batch = db.session.execute(stmt).all()
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        scores = adherence_for_prescriptions([r[0] for r in batch], today=today)
+        for rx_id, pid, last, first, med, strength, start, end, freq in batch:
+            yield {
+                "prescription_id": rx_id,
+                "patient_id": pid,
+                "patient": f"{last}, {first}",
+                "medication": f"{med} {strength or ''}".strip(),
+                "start_date": start.isoformat() if start else None,
+                "end_date": end.isoformat() if end else None,
+                "frequency_per_day": freq,
+                "adherence_pct": round(scores.get(rx_id, 0.0), 2),
+            }
+
+
+def _encode(rows, fmt: str, fields):
+    """Yield text chunks of roughly FLUSH_BYTES each."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda row: buf.write(json.dumps(row, default=str) + "\n")
+    for row in rows:
+        write(row)
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def stream(rows, fmt: str, fields, compress: bool = False):
+    """Encode `rows` as CSV or NDJSON bytes, gzip-compressed incrementally when asked."""
+    chunks = (c.encode("utf-8") for c in _encode(rows, fmt, fields))
+    if not compress:
+        yield from chunks
+        return
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 -> gzip container
+    for chunk in chunks:
+        # Sync-flush so each chunk reaches the client instead of sitting in zlib
+        out = gz.compress(chunk) + gz.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield gz.flush()
+
+
+def parse_date(value):
+    """YYYY-MM-DD -> date, or None for empty input; raises ValueError otherwise."""
+    return date.fromisoformat(value) if value else None
+
+
+def parse_id(name: str, value):
+    """Decimal id -> int, or None for empty input; raises ValueError otherwise."""
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"{name} must be an integer")
+    return int(value)
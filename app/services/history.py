@@ -0,0 +1,98 @@
+# app/services/history.py
+"""
+Patient dose history, newest first, one keyset page at a time.
+
+Each page is a seek on (taken_at, id) below the previous page's last row, so
+the cost of a page does not grow with the length of the history. Month
+headers come from the daily rollup, aggregated in SQL, only for the months
+the page touches; rows are grouped by the patient's local month to match.
+"""
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import select, func, and_, or_
+from app import db
+from app.models import Medication, Prescription, DoseLog, DoseDailyRollup
+from app.utils.timeutils import local_days, to_local
+
+PAGE_SIZE = 100
+
+
+def _month_of(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def history_page(patient_id: int, cursor=None, limit: int | None = None):
+    """
+    Return (rows, has_more). rows are (id, taken_at, was_taken, notes,
+    medication, strength); cursor is (taken_at, id) of the last row seen.
+    """
+    limit = limit or PAGE_SIZE
+    stmt = (
+        select(DoseLog.id, DoseLog.taken_at, DoseLog.was_taken, DoseLog.notes,
+               Medication.name, Medication.strength)
+        .join(Prescription, DoseLog.prescription_id == Prescription.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .where(Prescription.patient_id == patient_id)
+        .order_by(DoseLog.taken_at.desc(), DoseLog.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        taken_at, log_id = cursor
+        stmt = stmt.where(or_(
+            DoseLog.taken_at < taken_at,
+            and_(DoseLog.taken_at == taken_at, DoseLog.id < log_id),
+        ))
+    rows = db.session.execute(stmt).all()
+    more = len(rows) > limit
+    return rows[:limit], more
+
+
+def month_summaries(patient_id: int, first_day: date, last_day: date) -> dict:
+    """{"YYYY-MM": {"taken", "missed", "total", "pct"}} for whole months overlapping the range."""
+    if last_day.month == 12:
+        after = date(last_day.year + 1, 1, 1)
+    else:
+        after = date(last_day.year, last_day.month + 1, 1)
+    month = _month_of(DoseDailyRollup.day, db.engine.dialect.name)
+    stmt = (
+        select(month, func.sum(DoseDailyRollup.taken_count), func.sum(DoseDailyRollup.missed_count))
+        .join(Prescription, DoseDailyRollup.prescription_id == Prescription.id)
+        .where(Prescription.patient_id == patient_id,
+               DoseDailyRollup.day >= first_day.replace(day=1),
+               DoseDailyRollup.day < after)
+        .group_by(month)
+    )
+    summaries = {}
+    for key, taken, missed in db.session.execute(stmt):
+        taken, missed = taken or 0, missed or 0
+        total = taken + missed
+        summaries[key] = {
+            "taken": taken,
+            "missed": missed,
+            "total": total,
+            "pct": round(100.0 * taken / total, 1) if total else None,
+        }
+    return summaries
+
+
+def group_by_month(patient_id: int, rows, zone_name: str | None = None) -> "OrderedDict[str, dict]":
+    """
+    Bucket a page of rows under the patient-local month, each with its
+    full-month summary. Rows become dicts with `local_at`, taken_at in the
+    patient's zone, for display.
+    """
+    days = local_days([row.taken_at for row in rows], zone_name)
+    months = OrderedDict()
+    for row, day in zip(rows, days):
+        key = day.strftime("%Y-%m")
+        entry = dict(row._mapping, local_at=to_local(row.taken_at, zone_name))
+        months.setdefault(key, {"label": day.strftime("%B %Y"), "rows": []})["rows"].append(entry)
+    if rows:
+        summaries = month_summaries(patient_id, days[-1], days[0])
+        empty = {"taken": 0, "missed": 0, "total": 0, "pct": None}
+        for key, bucket in months.items():
+            bucket["summary"] = summaries.get(key, empty)
+    return months
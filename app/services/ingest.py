@@ -0,0 +1,217 @@
+# app/services/ingest.py
+"""
+Bulk dose-event ingestion for device and pharmacy feeds.
+
+Records are parsed lazily from NDJSON or CSV and processed in chunks. Each
+chunk is validated against the prescription's active window, deduplicated
+against itself and existing logs on (prescription_id, taken_at), and inserted
+with one executemany in its own transaction. The bulk insert bypasses ORM
+events, so the rollup, projection and search index are updated here directly.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import DoseLog, Prescription
+
+CHUNK_SIZE = 5000
+FUTURE_SKEW = timedelta(minutes=5)
+
+_TRUE = {"1", "true", "t", "yes", "y", "taken"}
+_FALSE = {"0", "false", "f", "no", "n", "missed"}
+
+
+def parse_records(stream, fmt: str):
+    """Yield dicts from a binary stream of NDJSON ('ndjson') or CSV with a header row ('csv')."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {"__error__": "invalid JSON"}
+
+
+def _coerce(record: dict):
+    """Return (prescription_id, taken_at, was_taken, notes) or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("each record must be an object")
+    if "__error__" in record:
+        raise ValueError(record["__error__"])
+    raw_rx = record.get("prescription_id")
+    if isinstance(raw_rx, int) and not isinstance(raw_rx, bool):
+        rx_id = raw_rx
+    elif isinstance(raw_rx, str) and raw_rx.strip().isdigit():
+        rx_id = int(raw_rx)
+    else:
+        # int() would quietly turn 1.5 into 1
+        raise ValueError("prescription_id must be an integer")
+    raw_ts = record.get("taken_at")
+    if not raw_ts:
+        raise ValueError("taken_at is required")
+    try:
+        taken_at = datetime.fromisoformat(str(raw_ts).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError("taken_at must be ISO-8601")
+    if taken_at.tzinfo is not None:
+        # Stored as naive UTC, like DoseLog.taken_at's default
+        taken_at = (taken_at - taken_at.utcoffset()).replace(tzinfo=None)
+    raw_taken = record.get("was_taken", True)
+    if isinstance(raw_taken, bool):
+        was_taken = raw_taken
+    elif str(raw_taken).strip().lower() in _TRUE:
+        was_taken = True
+    elif str(raw_taken).strip().lower() in _FALSE:
+        was_taken = False
+    else:
+        raise ValueError("was_taken must be a boolean")
+    notes = record.get("notes") or None
+    if notes is not None and not isinstance(notes, str):
+        raise ValueError("notes must be a string")
+    if notes is not None and len(notes) > 255:
+        raise ValueError("notes longer than 255 characters")
+    return rx_id, taken_at, was_taken, notes
+
+
+class _Ingestor:
+    def __init__(self, now=None):
+        self.now = now or datetime.utcnow()
+        self.windows = {}  # rx_id -> (start_date, end_date) or None when unknown
+        self.seen = set()  # (rx_id, taken_at) accepted earlier in this stream
+
+    def _load_windows(self, rx_ids):
+        missing = [i for i in rx_ids if i not in self.windows]
+        if not missing:
+            return
+        for rx_id, start, end in db.session.execute(
+            select(Prescription.id, Prescription.start_date, Prescription.end_date)
+            .where(Prescription.id.in_(missing))
+        ):
+            self.windows[rx_id] = (start, end)
+        for rx_id in missing:
+            self.windows.setdefault(rx_id, None)
+
+    def _existing(self, candidates):
+        """(rx_id, taken_at) pairs from `candidates` that are already logged."""
+        if not candidates:
+            return set()
+        rx_ids = {c[0] for c in candidates}
+        stamps = [c[1] for c in candidates]
+        rows = db.session.execute(
+            select(DoseLog.prescription_id, DoseLog.taken_at)
+            .where(DoseLog.prescription_id.in_(rx_ids),
+                   DoseLog.taken_at >= min(stamps),
+                   DoseLog.taken_at <= max(stamps))
+        ).all()
+        return {(r[0], r[1]) for r in rows}
+
+    def process_chunk(self, chunk):
+        """chunk: list of (line_no, record). Returns per-row result dicts."""
+        results = {}
+        parsed = []
+        for line_no, record in chunk:
+            try:
+                parsed.append((line_no, _coerce(record)))
+            except ValueError as exc:
+                results[line_no] = {"line": line_no, "status": "invalid", "error": str(exc)}
+
+        self._load_windows({p[1][0] for p in parsed})
+        candidates = []
+        for line_no, (rx_id, taken_at, was_taken, notes) in parsed:
+            window = self.windows.get(rx_id)
+            error = None
+            if window is None:
+                error = "unknown prescription"
+            elif taken_at > self.now + FUTURE_SKEW:
+                error = "taken_at is in the future"
+            elif (window[0] and taken_at.date() < window[0]) or (window[1] and taken_at.date() > window[1]):
+                error = "outside the prescription's active window"
+            if error:
+                results[line_no] = {"line": line_no, "status": "invalid", "error": error}
+            elif (rx_id, taken_at) in self.seen:
+                results[line_no] = {"line": line_no, "status": "duplicate"}
+            else:
+                self.seen.add((rx_id, taken_at))
+                candidates.append((line_no, rx_id, taken_at, was_taken, notes))
+
+        existing = self._existing([(c[1], c[2]) for c in candidates])
+        rows = []
+        for line_no, rx_id, taken_at, was_taken, notes in candidates:
+            if (rx_id, taken_at) in existing:
+                results[line_no] = {"line": line_no, "status": "duplicate"}
+            else:
+                rows.append((line_no, {"prescription_id": rx_id, "taken_at": taken_at,
+                                       "was_taken": was_taken, "notes": notes}))
+
+        for line_no, log_id in self._insert(rows):
+            if log_id is None:
+                results[line_no] = {"line": line_no, "status": "duplicate"}
+            else:
+                results[line_no] = {"line": line_no, "status": "inserted", "id": log_id}
+        return [results[line_no] for line_no, _ in chunk]
+
+    def _insert(self, rows):
+        """Insert rows in one transaction; falls back to per-row savepoints on a constraint hit."""
+        if not rows:
+            return []
+        try:
+            ids = list(db.session.scalars(
+                insert(DoseLog).returning(DoseLog.id, sort_by_parameter_order=True),
+                [r for _, r in rows],
+            ))
+            inserted = [(line_no, log_id, row) for (line_no, row), log_id in zip(rows, ids)]
+        except IntegrityError:
+            # e.g. a prescription deleted while the batch was in flight
+            db.session.rollback()
+            inserted = []
+            for line_no, row in rows:
+                try:
+                    with db.session.begin_nested():
+                        log_id = db.session.scalar(insert(DoseLog).returning(DoseLog.id), row)
+                    inserted.append((line_no, log_id, row))
+                except IntegrityError:
+                    inserted.append((line_no, None, row))
+
+        fresh = [(log_id, row) for _, log_id, row in inserted if log_id is not None]
+        self._after_insert(fresh)
+        db.session.commit()
+        if fresh:
+            from app.services.dashboard import invalidate
+            invalidate(DoseLog)
+        return [(line_no, log_id) for line_no, log_id, _ in inserted]
+
+    def _after_insert(self, rows):
+        from app.services import rollup, projections, search
+
+        if not rows:
+            return
+        conn = db.session.connection()
+        events = [(r["prescription_id"], r["taken_at"], r["was_taken"], 1) for _, r in rows]
+        rollup.apply_dose_counts(conn, events)
+        projections.apply_dose_events(conn, events, now=self.now)
+        search.index_documents(conn, "dose_log", [(log_id, r["notes"], "") for log_id, r in rows])
+
+
+def ingest_dose_events(records, chunk_size: int = CHUNK_SIZE, now=None):
+    """
+    Consume an iterable of record dicts; yield one result dict per input row,
+    in input order: {"line", "status": inserted|duplicate|invalid, ["id"], ["error"]}.
+    """
+    ingestor = _Ingestor(now)
+    chunk = []
+    for line_no, record in enumerate(records, start=1):
+        chunk.append((line_no, record))
+        if len(chunk) >= chunk_size:
+            yield from ingestor.process_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from ingestor.process_chunk(chunk)
@@ -0,0 +1,134 @@
+# app/services/projections.py
+"""
+Read model for the dashboard's 30-day adherence ranking.
+
+DoseLog inserts, edits and deletes are folded into patient_adherence_window
+from a Session after_flush hook, so the ranking is an indexed ORDER BY over one small table.
+Increments never remove logs that have aged out of the window. A periodic
+refresh (`flask projection refresh`) recomputes the table from the last 30 days
+of logs to expire them.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, delete, insert, func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from app.models import DoseLog, Prescription, PatientAdherenceWindow
+from app.services.rollup import committed_dose_event, dose_log_change
+
+WINDOW = timedelta(days=30)
+
+
+def _window_start(now=None):
+    return (now or datetime.utcnow()) - WINDOW
+
+
+def _upsert(connection, rows):
+    table = PatientAdherenceWindow.__table__
+    dialect_insert = sqlite.insert if connection.dialect.name == "sqlite" else postgresql.insert
+    stmt = dialect_insert(table).values(rows)
+    taken = table.c.taken_count + stmt.excluded.taken_count
+    total = table.c.total_count + stmt.excluded.total_count
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.patient_id],
+        set_={
+            "taken_count": taken,
+            "total_count": total,
+            "adherence": case((total > 0, taken * 1.0 / total), else_=None),
+            "last_activity_at": case(
+                (table.c.last_activity_at.is_(None), stmt.excluded.last_activity_at),
+                (stmt.excluded.last_activity_at > table.c.last_activity_at, stmt.excluded.last_activity_at),
+                else_=table.c.last_activity_at,
+            ),
+        },
+    )
+    connection.execute(stmt)
+
+
+def apply_dose_events(connection, events, now=None) -> None:
+    """
+    Fold (prescription_id, taken_at, was_taken, sign) events into the projection;
+    sign is +1 for inserted logs and -1 for deleted ones. Events outside the
+    window are ignored.
+    """
+    cutoff = _window_start(now)
+    events = [e for e in events if e[1] is not None and e[1] >= cutoff]
+    if not events:
+        return
+    rx_ids = {e[0] for e in events}
+    owners = dict(connection.execute(
+        select(Prescription.id, Prescription.patient_id).where(Prescription.id.in_(rx_ids))
+    ).all())
+
+    deltas = defaultdict(lambda: [0, 0, None])
+    for rx_id, taken_at, was_taken, sign in events:
+        patient_id = owners.get(rx_id)
+        if patient_id is None:
+            continue
+        slot = deltas[patient_id]
+        slot[0] += sign if was_taken is True else 0
+        slot[1] += sign
+        if sign > 0 and (slot[2] is None or taken_at > slot[2]):
+            slot[2] = taken_at
+    rows = [
+        {
+            "patient_id": pid,
+            "taken_count": t,
+            "total_count": n,
+            "adherence": (t / n) if n > 0 else None,
+            "last_activity_at": last,
+        }
+        for pid, (t, n, last) in deltas.items()
+    ]
+    if rows:
+        _upsert(connection, rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _project_dose_logs(session, flush_context):
+    events = [(o.prescription_id, o.taken_at, o.was_taken, 1) for o in session.new if isinstance(o, DoseLog)]
+    # Deletes and edits subtract what was last flushed, not the current attributes
+    events += [(*committed_dose_event(o), -1) for o in session.deleted if isinstance(o, DoseLog)]
+    for o in session.dirty:
+        if isinstance(o, DoseLog) and o not in session.deleted:
+            change = dose_log_change(o)
+            if change is not None:
+                events += [(*change[0], -1), (*change[1], 1)]
+    if events:
+        apply_dose_events(session.connection(), events)
+
+
+def rebuild_projection(connection, now=None) -> int:
+    """Replace the projection with counts from the current 30-day window."""
+    cutoff = _window_start(now)
+    table = PatientAdherenceWindow.__table__
+    taken = func.sum(case((DoseLog.was_taken.is_(True), 1), else_=0))
+    total = func.count(DoseLog.id)
+    source = (
+        select(
+            Prescription.patient_id,
+            taken,
+            total,
+            taken * 1.0 / total,
+            func.max(DoseLog.taken_at),
+        )
+        .join(Prescription, DoseLog.prescription_id == Prescription.id)
+        .where(DoseLog.taken_at >= cutoff)
+        .group_by(Prescription.patient_id)
+    )
+    connection.execute(delete(table))
+    res = connection.execute(
+        insert(table).from_select(
+            ["patient_id", "taken_count", "total_count", "adherence", "last_activity_at"], source
+        )
+    )
+    return res.rowcount
+
+
+def refresh_adherence_projection(now=None) -> int:
+    """Periodic expiry pass. Returns the number of patients written."""
+    written = rebuild_projection(db.session.connection(), now)
+    db.session.commit()
+    return written
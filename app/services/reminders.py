@@ -0,0 +1,216 @@
+# app/services/reminders.py
+"""
+Reminder dispatch for prescriptions with reminder_enabled.
+
+The dispatcher walks due prescriptions one patient time zone at a time, in
+id order and in batches, so "today" is always the patient's local day. Each
+batch is claimed with one conditional UPDATE (reminder_last_sent_date =
+today, only where it is still older or NULL), so several nodes can run at once and each
+prescription is sent by exactly one of them. Claimed reminders go out through
+a pluggable transport on a bounded thread pool. Failed sends have their claim
+rolled back so the next run retries them.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import importlib
+import json
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import select, update, and_, or_, bindparam, true
+from app import db
+from app.models import Patient, Medication, Prescription
+from app.utils.timeutils import patient_today
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- transports ----------
+class LogTransport:
+    """
+    Logs that a reminder would go out (the default). Only ids at INFO; the
+    message, which names the patient and medication, is logged at DEBUG.
+    """
+
+    def send(self, reminder: dict) -> None:
+        logger.info("reminder rx=%s patient=%s date=%s", reminder["prescription_id"], reminder["patient_id"],
+                    reminder["send_date"])
+        logger.debug("reminder rx=%s: %s", reminder["prescription_id"], reminder["message"])
+
+
+class FileTransport:
+    """
+    Appends one JSON line per reminder; a local stand-in for a real gateway.
+    The lines hold patient names and medications in plain text, so it is
+    only used when REMINDER_TRANSPORT names a file explicitly.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, reminder: dict) -> None:
+        line = json.dumps(reminder, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+
+
+def transport_from_config(uri: str | None = None):
+    """
+    REMINDER_TRANSPORT:
+      log://                   -> LogTransport (default)
+      file:///path/to/out.jsonl -> FileTransport
+      package.module:factory   -> factory() returning an object with send(reminder)
+    """
+    if uri is None:
+        uri = current_app.config.get("REMINDER_TRANSPORT") or "log://"
+    if uri.startswith("log://"):
+        return LogTransport()
+    if uri.startswith("file://"):
+        return FileTransport(uri[len("file://"):])
+    module_name, _, attr = uri.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+# ---------- dispatch ----------
+def _due_filter(today: date):
+    return and_(
+        Prescription.reminder_enabled.is_(True),
+        Prescription.start_date <= today,
+        or_(Prescription.end_date.is_(None), Prescription.end_date >= today),
+        or_(Prescription.reminder_last_sent_date.is_(None), Prescription.reminder_last_sent_date < today),
+    )
+
+
+def _claim(ids: list[int], today: date) -> list[int]:
+    """Stamp today's date on rows nobody else has claimed yet; return the ids we won."""
+    stmt = (
+        update(Prescription)
+        .where(Prescription.id.in_(ids), _due_filter(today))
+        .values(reminder_last_sent_date=today)
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        claimed = list(db.session.execute(stmt.returning(Prescription.id)).scalars())
+    else:
+        claimed = [rx_id for rx_id in ids
+                   if db.session.execute(stmt.where(Prescription.id == rx_id)).rowcount == 1]
+    db.session.commit()
+    return claimed
+
+
+def _release(previous: list[dict], today: date) -> None:
+    """Undo claims for failed sends, restoring the prior sent date."""
+    if not previous:
+        return
+    table = Prescription.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam("rx_id"), table.c.reminder_last_sent_date == today)
+        .values(reminder_last_sent_date=bindparam("prev")),
+        previous,
+    )
+    db.session.commit()
+
+
+def _reminder(rx_id, patient_id, dosage, first, last, med, strength, today: date) -> dict:
+    return {
+        "prescription_id": rx_id,
+        "patient_id": patient_id,
+        "patient_name": f"{first} {last}",
+        "medication": f"{med} {strength or ''}".strip(),
+        "dosage": dosage,
+        "send_date": today.isoformat(),
+        "message": f"Reminder for {first} {last}: take {dosage} of {med} today.",
+    }
+
+
+def _build_reminders(ids: list[int], today: date) -> list[dict]:
+    rows = db.session.execute(
+        select(Prescription.id, Prescription.patient_id, Prescription.dosage,
+               Patient.first_name, Patient.last_name, Medication.name, Medication.strength)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .join(Medication, Prescription.medication_id == Medication.id)
+        .where(Prescription.id.in_(ids))
+    ).all()
+    return [_reminder(*row, today) for row in rows]
+
+
+def send_reminder(rx: Prescription, transport=None, today: date | None = None) -> None:
+    """
+    Send one reminder immediately (clinic 'send reminder' action) and stamp it.
+    Reads rx.patient and rx.medication, so load them with rx to avoid extra queries.
+    """
+    p, m = rx.patient, rx.medication
+    today = today or patient_today(p.timezone)
+    transport = transport or transport_from_config()
+    transport.send(_reminder(rx.id, rx.patient_id, rx.dosage, p.first_name, p.last_name,
+                             m.name, m.strength, today))
+    rx.reminder_last_sent_date = today
+    db.session.commit()
+
+
+def _zone_filter(name: str | None):
+    if name is None:
+        return or_(Patient.timezone.is_(None), Patient.timezone == "")
+    return Patient.timezone == name
+
+
+def dispatch_due_reminders(today: date | None = None, batch_size: int = 1000,
+                           max_workers: int = 16, transport=None, now_utc: datetime | None = None) -> dict:
+    """
+    Send every due reminder once. Returns counts:
+    {"claimed": n, "sent": n, "failed": n}.
+
+    "Today" is each patient's local day: prescriptions are dispatched one
+    patient time zone at a time. Passing `today` uses that date for everyone.
+    """
+    transport = transport or transport_from_config()
+    stats = {"claimed": 0, "sent": 0, "failed": 0}
+
+    def _send(reminder):
+        try:
+            transport.send(reminder)
+            return None
+        except Exception:
+            logger.exception("reminder send failed for rx=%s", reminder["prescription_id"])
+            return reminder["prescription_id"]
+
+    if today is not None:
+        groups = [(true(), today)]
+    else:
+        zones = db.session.scalars(
+            select(Patient.timezone).distinct()
+            .join(Prescription, Prescription.patient_id == Patient.id)
+            .where(Prescription.reminder_enabled.is_(True))
+        ).all()
+        groups = [(_zone_filter(name), patient_today(name, now_utc)) for name in {name or None for name in zones}]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reminders") as pool:
+        for in_zone, day in groups:
+            last_id = 0
+            while True:
+                batch = db.session.execute(
+                    select(Prescription.id, Prescription.reminder_last_sent_date)
+                    .join(Patient, Prescription.patient_id == Patient.id)
+                    .where(Prescription.id > last_id, in_zone, _due_filter(day))
+                    .order_by(Prescription.id)
+                    .limit(batch_size)
+                ).all()
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                previous = {rx_id: sent for rx_id, sent in batch}
+
+                claimed = _claim(list(previous), day)
+                stats["claimed"] += len(claimed)
+                if not claimed:
+                    continue
+
+                failed = [rx_id for rx_id in pool.map(_send, _build_reminders(claimed, day)) if rx_id is not None]
+                _release([{"rx_id": rx_id, "prev": previous[rx_id]} for rx_id in failed], day)
+                stats["failed"] += len(failed)
+                stats["sent"] += len(claimed) - len(failed)
+
+    return stats
@@ -0,0 +1,241 @@
+# app/services/rollup.py
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import event, delete, insert, inspect, select, update, func, case, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import DoseLog, DoseDailyRollup, Patient, Prescription
+from app.utils.timeutils import local_days, PATIENT_DEFAULT_TZ
+
+REBUILD_BATCH = 20000
+
+
+def _upsert_stmt(dialect_name: str, rows: list[dict]):
+    """
+    INSERT ... ON CONFLICT (prescription_id, day) DO UPDATE that adds the
+    incoming counts to the existing ones. SQLite (3.24+) and Postgres only.
+    """
+    table = DoseDailyRollup.__table__
+    dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    stmt = dialect_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.prescription_id, table.c.day],
+        set_={
+            "taken_count": table.c.taken_count + stmt.excluded.taken_count,
+            "missed_count": table.c.missed_count + stmt.excluded.missed_count,
+        },
+    )
+
+
+def _zones_for(connection, rx_ids) -> dict:
+    """{prescription_id: zone name or ""} for the patients owning these prescriptions."""
+    if not rx_ids:
+        return {}
+    rows = connection.execute(
+        select(Prescription.id, Patient.timezone)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .where(Prescription.id.in_(rx_ids))
+    )
+    return {rx_id: name or "" for rx_id, name in rows}
+
+
+def _loaded_zone(target) -> dict | None:
+    """
+    The log's zone from its already-loaded prescription and patient, without
+    lazy loading; None when they are not in the session, so the caller queries
+    on the flush's own connection instead.
+    """
+    rx = target.__dict__.get("prescription")
+    patient = rx.__dict__.get("patient") if rx is not None else None
+    if patient is None or "timezone" not in patient.__dict__ or rx.id != target.prescription_id:
+        return None
+    return {target.prescription_id: patient.timezone or ""}
+
+
+def _fold(events, zones, deltas) -> None:
+    """Add (prescription_id, taken_at, was_taken, sign) events to deltas[(rx, local day)]."""
+    by_zone = defaultdict(list)
+    for event_ in events:
+        if event_[1] is not None:
+            by_zone[zones.get(event_[0]) or None].append(event_)
+    for name, group in by_zone.items():
+        days = local_days([e[1] for e in group], name)
+        for (rx_id, _, was_taken, sign), day in zip(group, days):
+            deltas[(rx_id, day)][0 if was_taken is True else 1] += sign
+
+
+def apply_dose_counts(connection, events, zones: dict | None = None) -> None:
+    """
+    Fold dose events into the daily rollup.
+
+    `events` is an iterable of (prescription_id, taken_at, was_taken, sign)
+    where sign is +1 for an inserted log and -1 for a deleted one. Days are
+    the patient's local calendar days; `zones` ({prescription_id: zone
+    name}) is looked up when not given.
+    """
+    events = list(events)
+    if zones is None:
+        zones = _zones_for(connection, {e[0] for e in events if e[1] is not None})
+    deltas = defaultdict(lambda: [0, 0])
+    _fold(events, zones, deltas)
+    if not deltas:
+        return
+
+    rows = [
+        {"prescription_id": rx_id, "day": day, "taken_count": t, "missed_count": m}
+        for (rx_id, day), (t, m) in deltas.items()
+    ]
+    dialect_name = connection.dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        connection.execute(_upsert_stmt(dialect_name, rows))
+        return
+
+    # Portable fallback: update, insert when nothing matched
+    table = DoseDailyRollup.__table__
+    for row in rows:
+        res = connection.execute(
+            update(table)
+            .where(table.c.prescription_id == row["prescription_id"], table.c.day == row["day"])
+            .values(
+                taken_count=table.c.taken_count + row["taken_count"],
+                missed_count=table.c.missed_count + row["missed_count"],
+            )
+        )
+        if res.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+@event.listens_for(DoseLog, "after_insert")
+def _rollup_after_insert(mapper, connection, target):
+    apply_dose_counts(connection, [(target.prescription_id, target.taken_at, target.was_taken, 1)],
+                      zones=_loaded_zone(target))
+
+
+# Load the previous value when these are assigned, so edits and deletes can
+# subtract the committed event even if the attribute was expired
+_TRACKED = ("prescription_id", "taken_at", "was_taken")
+for _name in _TRACKED:
+    event.listen(getattr(DoseLog, _name), "set", lambda *args: None, active_history=True)
+
+
+def committed_dose_event(target) -> tuple:
+    """(prescription_id, taken_at, was_taken) of a DoseLog as last loaded or flushed."""
+    state = inspect(target)
+    out = []
+    for name in _TRACKED:
+        h = state.attrs[name].history
+        out.append(h.deleted[0] if h.deleted else (h.unchanged or h.added or [getattr(target, name)])[0])
+    return tuple(out)
+
+
+def dose_log_change(target) -> tuple | None:
+    """(old, new) event values of a pending DoseLog update, or None when no tracked attribute changed."""
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _TRACKED):
+        return None
+    return committed_dose_event(target), tuple(getattr(target, name) for name in _TRACKED)
+
+
+@event.listens_for(DoseLog, "after_delete")
+def _rollup_after_delete(mapper, connection, target):
+    old = committed_dose_event(target)
+    zones = _loaded_zone(target) if old[0] == target.prescription_id else None
+    apply_dose_counts(connection, [(*old, -1)], zones=zones)
+
+
+@event.listens_for(DoseLog, "after_update")
+def _rollup_after_update(mapper, connection, target):
+    change = dose_log_change(target)
+    if change is not None:
+        old, new = change
+        apply_dose_counts(connection, [(*old, -1), (*new, 1)])
+
+
+def rebuild_daily_rollup(prescription_ids=None) -> int:
+    """
+    Recompute the rollup from the raw dose logs (backfills, or after manual
+    edits or a patient time zone change). Returns the number of rollup rows
+    written.
+
+    Patients on the default zone are bucketed by SQL date(); the rest are
+    streamed and bucketed per zone with local_days().
+
+    Months already moved to the archive are not in dose_log any more, so
+    their rollup rows are kept as they are. Only days from the day before
+    the archive cutoff onward are recomputed; the first of those can straddle
+    the cutoff in a patient's zone, so the archived tail is folded back in.
+    """
+    from app.services.archive import archive_cutoff, iter_archived
+
+    table = DoseDailyRollup.__table__
+    cutoff = archive_cutoff()
+    boundary = cutoff - timedelta(days=1) if cutoff else None
+    default_zone = or_(Patient.timezone.is_(None), Patient.timezone.in_(["", PATIENT_DEFAULT_TZ]))
+    owner = select(Prescription.id).join(Patient, Prescription.patient_id == Patient.id)
+    day = func.date(DoseLog.taken_at)
+    source = (
+        select(
+            DoseLog.prescription_id,
+            day,
+            func.sum(case((DoseLog.was_taken.is_(True), 1), else_=0)),
+            func.sum(case((DoseLog.was_taken.is_(True), 0), else_=1)),
+        )
+        .where(DoseLog.taken_at.is_not(None),
+               DoseLog.prescription_id.in_(owner.where(default_zone)))
+        .group_by(DoseLog.prescription_id, day)
+    )
+    zoned = (
+        select(DoseLog.prescription_id, DoseLog.taken_at, DoseLog.was_taken, Patient.timezone)
+        .join(Prescription, DoseLog.prescription_id == Prescription.id)
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .where(DoseLog.taken_at.is_not(None), ~default_zone)
+    )
+    wipe = delete(table)
+    if prescription_ids:
+        source = source.where(DoseLog.prescription_id.in_(prescription_ids))
+        zoned = zoned.where(DoseLog.prescription_id.in_(prescription_ids))
+        wipe = wipe.where(table.c.prescription_id.in_(prescription_ids))
+    if boundary:
+        # A local day starts at most a day before the same UTC date
+        source = source.where(DoseLog.taken_at >= datetime.combine(boundary, time.min))
+        zoned = zoned.where(DoseLog.taken_at >= datetime.combine(boundary - timedelta(days=1), time.min))
+        wipe = wipe.where(table.c.day >= boundary)
+
+    db.session.execute(wipe)
+    res = db.session.execute(
+        insert(table).from_select(["prescription_id", "day", "taken_count", "missed_count"], source)
+    )
+    written = res.rowcount
+
+    deltas = defaultdict(lambda: [0, 0])
+    result = db.session.execute(zoned.execution_options(yield_per=REBUILD_BATCH))
+    for batch in result.partitions():
+        zones = {rx_id: name for rx_id, _, _, name in batch}
+        _fold([(rx_id, taken_at, was_taken, 1) for rx_id, taken_at, was_taken, _ in batch], zones, deltas)
+    rows = [
+        {"prescription_id": rx_id, "day": d, "taken_count": t, "missed_count": m}
+        for (rx_id, d), (t, m) in deltas.items()
+        if boundary is None or d >= boundary
+    ]
+    for i in range(0, len(rows), REBUILD_BATCH):
+        db.session.execute(insert(table), rows[i:i + REBUILD_BATCH])
+    written += len(rows)
+
+    if boundary:
+        tail = [(rec["prescription_id"], rec["taken_at"], rec["was_taken"], 1)
+                for rec in iter_archived(start=boundary - timedelta(days=1), prescription_ids=prescription_ids)]
+        zones = _zones_for(db.session.connection(), {e[0] for e in tail})
+        deltas = defaultdict(lambda: [0, 0])
+        _fold(tail, zones, deltas)
+        rows = [
+            {"prescription_id": rx_id, "day": d, "taken_count": t, "missed_count": m}
+            for (rx_id, d), (t, m) in deltas.items()
+            if d >= boundary
+        ]
+        if rows:
+            db.session.execute(_upsert_stmt(db.session.connection().dialect.name, rows))
+        written += len(rows)
+
+    db.session.commit()
+    return written
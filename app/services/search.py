@@ -0,0 +1,230 @@
+# app/services/search.py
+"""
+Substring search for the DataTables endpoints.
+
+SQLite: an FTS5 virtual table with the trigram tokenizer (SQLite 3.34+), which
+answers '%term%'-style matches from an index. It is kept in sync by mapper
+events on Patient, Medication and DoseLog.
+
+Postgres: pg_trgm GIN indexes on the searched columns, so the plain ILIKE
+filters are served by an index and no side table is needed.
+
+Terms shorter than three characters cannot use a trigram index on either
+backend and fall back to ILIKE.
+"""
+import weakref
+
+from sqlalchemy import event, select, or_, table, column, literal_column
+from app import db
+from app.models import Patient, Medication, DoseLog
+
+SEARCH_TABLE = "search_index"
+
+CREATE_FTS = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE}
+USING fts5(kind UNINDEXED, ref_id UNINDEXED, name, extra, tokenize='trigram')
+"""
+
+# (index name, table, column) served by pg_trgm on Postgres
+TRGM_INDEXES = [
+    ("ix_patient_first_name_trgm", "patient", "first_name"),
+    ("ix_patient_last_name_trgm", "patient", "last_name"),
+    ("ix_patient_ssn_last4_trgm", "patient", "ssn_last4"),
+    ("ix_medication_name_trgm", "medication", "name"),
+    ("ix_medication_strength_trgm", "medication", "strength"),
+    ("ix_dose_log_notes_trgm", "dose_log", "notes"),
+]
+
+MIN_TRIGRAM_TERM = 3
+
+# kind -> (model, row -> (name, extra)). Documents are keyed by a synthetic
+# rowid (ref_id * 4 + kind code) so re-indexing a row is a rowid lookup,
+# not a scan of the FTS table.
+_DOCUMENTS = {
+    "patient": (Patient, lambda p: (f"{p.first_name} {p.last_name}", p.ssn_last4 or "")),
+    "medication": (Medication, lambda m: (m.name, m.strength or "")),
+    "dose_log": (DoseLog, lambda l: (l.notes or "", "")),
+}
+_KIND_CODES = {"patient": 1, "medication": 2, "dose_log": 3}
+
+_search = table(SEARCH_TABLE, column("kind"), column("ref_id"))
+
+def _rowid(kind: str, ref_id: int) -> int:
+    return ref_id * 4 + _KIND_CODES[kind]
+
+_fts_ready = weakref.WeakKeyDictionary()  # engine -> bool
+
+
+def fts5_supported(connection) -> bool:
+    opts = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options").fetchall()}
+    return "ENABLE_FTS5" in opts
+
+
+def create_search_structures(connection) -> None:
+    """Create the FTS5 table (SQLite) or the pg_trgm indexes (Postgres)."""
+    if connection.dialect.name == "sqlite":
+        if fts5_supported(connection):
+            connection.exec_driver_sql(CREATE_FTS)
+    elif connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, tbl, col in TRGM_INDEXES:
+            connection.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {tbl} USING gin ({col} gin_trgm_ops)"
+            )
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    create_search_structures(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def _uses_fts(connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    engine = connection.engine
+    ready = _fts_ready.get(engine)
+    if ready is None:
+        ready = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+        ).first() is not None
+        _fts_ready[engine] = ready
+    return ready
+
+
+def index_documents(connection, kind: str, rows) -> None:
+    """(Re)index ORM rows or (id, name, extra) tuples of one kind."""
+    if not _uses_fts(connection):
+        return
+    _, to_doc = _DOCUMENTS[kind]
+    docs = []
+    for row in rows:
+        if isinstance(row, tuple):
+            ref_id, name, extra = row
+        else:
+            ref_id, (name, extra) = row.id, to_doc(row)
+        docs.append((_rowid(kind, ref_id), kind, ref_id, name or "", extra or ""))
+    if not docs:
+        return
+    connection.exec_driver_sql(
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = ?", [(d[0],) for d in docs]
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, name, extra) VALUES (?, ?, ?, ?, ?)", docs
+    )
+
+
+def remove_documents(connection, kind: str, ref_ids) -> None:
+    """Drop documents of one kind by id (bulk deletes that bypass the ORM)."""
+    if not _uses_fts(connection) or not ref_ids:
+        return
+    connection.exec_driver_sql(
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = ?", [(_rowid(kind, i),) for i in ref_ids]
+    )
+
+
+def _listen(kind, model):
+    def _upsert(mapper, connection, target):
+        index_documents(connection, kind, [target])
+
+    def _remove(mapper, connection, target):
+        remove_documents(connection, kind, [target.id])
+
+    event.listen(model, "after_insert", _upsert)
+    event.listen(model, "after_update", _upsert)
+    event.listen(model, "after_delete", _remove)
+
+for _kind, (_model, _) in _DOCUMENTS.items():
+    _listen(_kind, _model)
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def matching_ids(kind: str, term: str, columns=("name", "extra")):
+    """Subquery of ref ids whose indexed columns contain `term` (FTS path only)."""
+    query = f"{{{' '.join(columns)}}} : {_fts_phrase(term)}"
+    return (
+        select(_search.c.ref_id)
+        .where(_search.c.kind == kind, literal_column(SEARCH_TABLE).op("MATCH")(query))
+        .scalar_subquery()
+    )
+
+
+def _use_index(term: str) -> bool:
+    return len(term) >= MIN_TRIGRAM_TERM and _uses_fts(db.session.connection())
+
+
+def patient_filter(term: str):
+    if _use_index(term):
+        return Patient.id.in_(matching_ids("patient", term))
+    like = f"%{term}%"
+    return or_(
+        Patient.first_name.ilike(like),
+        Patient.last_name.ilike(like),
+        Patient.ssn_last4.ilike(like),
+    )
+
+
+def medication_filter(term: str):
+    if _use_index(term):
+        return Medication.id.in_(matching_ids("medication", term))
+    like = f"%{term}%"
+    return or_(
+        Medication.name.ilike(like),
+        Medication.strength.ilike(like),
+    )
+
+
+def dose_log_filter(term: str):
+    """Patient name, medication name or dose-log notes (for the joined dose-log query)."""
+    if _use_index(term):
+        return or_(
+            Patient.id.in_(matching_ids("patient", term, columns=("name",))),
+            Medication.id.in_(matching_ids("medication", term, columns=("name",))),
+            DoseLog.id.in_(matching_ids("dose_log", term, columns=("name",))),
+        )
+    like = f"%{term}%"
+    return or_(
+        Patient.first_name.ilike(like),
+        Patient.last_name.ilike(like),
+        Medication.name.ilike(like),
+        DoseLog.notes.ilike(like),
+    )
+
+
+def populate_search_index(connection) -> None:
+    """Replace the FTS contents with documents built from the base tables."""
+    connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+    connection.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, name, extra) "
+        "SELECT id * 4 + 1, 'patient', id, first_name || ' ' || last_name, COALESCE(ssn_last4, '') FROM patient"
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, name, extra) "
+        "SELECT id * 4 + 2, 'medication', id, name, COALESCE(strength, '') FROM medication"
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, name, extra) "
+        "SELECT id * 4 + 3, 'dose_log', id, COALESCE(notes, ''), '' FROM dose_log"
+    )
+
+
+def rebuild_search_index() -> int:
+    """Recreate and repopulate the FTS table from the base tables. Returns rows indexed."""
+    conn = db.session.connection()
+    create_search_structures(conn)
+    _fts_ready.pop(conn.engine, None)
+    if not _uses_fts(conn):
+        db.session.commit()
+        return 0
+    populate_search_index(conn)
+    total = conn.exec_driver_sql(f"SELECT COUNT(*) FROM {SEARCH_TABLE}").scalar()
+    db.session.commit()
+    return total
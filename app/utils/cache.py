@@ -0,0 +1,65 @@
+# app/utils/cache.py
+import threading
+import time
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Small in-process cache with per-entry expiry. Each gunicorn worker has its
+    own copy, so keep TTLs short enough that cross-worker staleness is harmless.
+    """
+
+    def __init__(self, ttl: float = 30.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        with self._lock:
+            if len(self._data) >= self.maxsize and key not in self._data:
+                self._prune()
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def get_or_set(self, key, factory, ttl: float | None = None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def evict(self, predicate):
+        """Delete every entry whose key satisfies predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _prune(self):
+        # Drop expired entries first; if still full, drop the oldest-expiring half
+        now = time.monotonic()
+        for k in [k for k, (exp, _) in self._data.items() if exp < now]:
+            del self._data[k]
+        if len(self._data) >= self.maxsize:
+            ordered = sorted(self._data.items(), key=lambda kv: kv[1][0])
+            for k, _ in ordered[: len(ordered) // 2 or 1]:
+                del self._data[k]
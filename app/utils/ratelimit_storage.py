@@ -0,0 +1,175 @@
+# app/utils/ratelimit_storage.py
+"""
+Rate-limit counters shared by every worker on the host, kept in a SQLite file.
+
+With memory:// each gunicorn worker counts on its own, so "200/hour" really
+allows 200 × workers, and the per-worker dicts keep every client IP ever
+seen. This backend keeps one row per window in a WAL-mode SQLite file that
+all workers open. A hit is a single UPSERT ... RETURNING in autocommit mode,
+which runs in tens of microseconds because WAL with synchronous=NORMAL does
+not fsync on commit. Expired windows are swept from time to time so the
+file stays small.
+
+Importing this module registers the scheme with `limits`:
+
+    RATE_LIMIT_STORAGE=sqlite:////var/data/ratelimit.db
+
+Supports the fixed-window (Flask-Limiter's default) and sliding-window-counter
+strategies. Needs SQLite 3.35+ for RETURNING.
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+SWEEP_INTERVAL = 60.0  # seconds between purges of expired windows, per process
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratelimit_counter (
+    key     TEXT PRIMARY KEY,
+    value   INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# A window that has expired restarts from `amount` with a fresh expiry
+_INCR = """
+INSERT INTO ratelimit_counter (key, value, expires) VALUES (:key, :amount, :expires)
+ON CONFLICT (key) DO UPDATE SET
+    value   = CASE WHEN expires <= :now THEN excluded.value ELSE value + excluded.value END,
+    expires = CASE WHEN expires <= :now THEN excluded.expires ELSE expires END
+RETURNING value
+"""
+
+
+def _path_from_uri(uri: str) -> str:
+    # Same layout as SQLAlchemy: sqlite:///relative.db, sqlite:////absolute.db
+    path = uri.split("://", 1)[1]
+    path = path[1:] if path.startswith("/") else path
+    if not path:
+        raise ValueError(f"rate-limit storage URI needs a file path: {uri!r}")
+    return path.split("?", 1)[0]
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """limits storage backed by a SQLite file that several processes share."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, timeout: float = 5.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = _path_from_uri(uri)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process: gunicorn may fork after
+        # the app (and this storage) was created
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _maybe_sweep(self, conn, now: float) -> None:
+        if now >= self._next_sweep:
+            self._next_sweep = now + SWEEP_INTERVAL
+            conn.execute("DELETE FROM ratelimit_counter WHERE expires <= ?", (now,))
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        conn = self._conn()
+        now = time.time()
+        self._maybe_sweep(conn, now)
+        return conn.execute(_INCR, {"key": key, "amount": amount, "expires": now + expiry, "now": now}).fetchone()[0]
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        row = self._conn().execute(
+            "UPDATE ratelimit_counter SET value = max(value - ?, 0) WHERE key = ? AND expires > ? RETURNING value",
+            (amount, key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, key: str) -> int:
+        row = self._conn().execute(
+            "SELECT value FROM ratelimit_counter WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expires FROM ratelimit_counter WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM ratelimit_counter WHERE key = ?", (key,))
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int | None:
+        return self._conn().execute("DELETE FROM ratelimit_counter").rowcount
+
+    # --- sliding window counter -------------------------------------------
+
+    def _window(self, conn, previous_key, current_key, expiry, now):
+        counts = dict(conn.execute(
+            "SELECT key, value FROM ratelimit_counter WHERE key IN (?, ?) AND expires > ?",
+            (previous_key, current_key, now),
+        ).fetchall())
+        previous_count = counts.get(previous_key, 0)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, counts.get(current_key, 0), current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        conn = self._conn()
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        # Read and increment under one write lock, so concurrent workers
+        # cannot both take the last slot
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous_count, previous_ttl, current_count, _ = self._window(
+                conn, previous_key, current_key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(_INCR, {"key": current_key, "amount": amount, "expires": now + 2 * expiry, "now": now})
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._window(self._conn(), previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
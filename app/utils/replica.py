@@ -0,0 +1,113 @@
+# app/utils/replica.py
+"""
+Optional read-replica routing.
+
+Set DATABASE_REPLICA_URL to register a "replica" bind. Reads are sent to it
+only where a route opts in with @read_replica (for the whole request,
+including streamed responses) or code wraps a block in use_replica(). Only
+plain SELECTs are routed; flushes, DML, text() statements and
+session.connection() stay on the primary.
+
+Read-after-write: once a session has flushed, it reads from the primary for
+the rest of its life, and a committed write pins the browser session to
+the primary for REPLICA_STICKY_SECONDS (default 5) so the redirect after a
+POST does not read a lagging replica.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import time
+
+from flask import g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session as _FlaskSession
+from sqlalchemy import event
+
+REPLICA_BIND = "replica"
+_STICKY_KEY = "_primary_until"
+
+_override = contextvars.ContextVar("db_route", default=None)
+
+
+def _requested_target():
+    target = _override.get()
+    if target is None and has_request_context():
+        target = g.get("db_route")
+    return target
+
+
+class RoutingSession(_FlaskSession):
+    """Flask-SQLAlchemy session that sends opted-in SELECTs to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None and getattr(clause, "is_select", False) \
+                and not self._flushing and self._reads_from_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self) -> bool:
+        if _requested_target() != REPLICA_BIND or self.info.get("wrote"):
+            return False
+        if has_request_context() and http_session.get(_STICKY_KEY, 0) > time.time():
+            return False
+        return True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_to_primary(session):
+    if session.info.get("wrote") and has_request_context() and session._db.engines.get(REPLICA_BIND):
+        from flask import current_app
+        http_session[_STICKY_KEY] = time.time() + current_app.config.get("REPLICA_STICKY_SECONDS", 5)
+
+
+@contextlib.contextmanager
+def use_replica():
+    """Route SELECTs inside the block to the replica (when one is configured)."""
+    token = _override.set(REPLICA_BIND)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Force the primary inside the block, e.g. for a read that must see a fresh write."""
+    token = _override.set("primary")
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+def read_replica(view):
+    """Route decorator: this endpoint's reads may be served by the replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # On g rather than the ContextVar so streamed bodies, which run after
+        # the view returns, still read from the replica
+        g.db_route = REPLICA_BIND
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def read_engine(db):
+    """Engine for code that opens its own sessions (dashboard blocks)."""
+    engine = db.engines.get(REPLICA_BIND)
+    if engine is not None and _requested_target() == REPLICA_BIND and not db.session.info.get("wrote") \
+            and not (has_request_context() and http_session.get(_STICKY_KEY, 0) > time.time()):
+        return engine
+    return db.engine
+
+
+def replica_binds() -> dict:
+    """SQLALCHEMY_BINDS entry for DATABASE_REPLICA_URL, or {}."""
+    url = os.getenv("DATABASE_REPLICA_URL")
+    return {REPLICA_BIND: url} if url else {}
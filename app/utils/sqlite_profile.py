@@ -0,0 +1,86 @@
+# app/utils/sqlite_profile.py
+"""
+Connection profile for file-backed SQLite under several gunicorn workers.
+
+The "performance" profile switches the database to WAL (readers no longer
+block the writer and vice versa), relaxes fsync to once per checkpoint
+(synchronous=NORMAL, still durable against application crashes), memory-maps
+the file, enlarges the page cache, keeps temp b-trees in memory and makes
+writers wait for the lock instead of failing with "database is locked".
+
+The profile is opt-in. WAL mode is stored in the database file itself, so
+enabling it changes the file for every later user, and synchronous=NORMAL
+can lose the last transactions on power loss or an OS crash. Nothing changes
+until SQLITE_PROFILE=performance is set in config or the environment.
+
+Config:
+  SQLITE_PROFILE  "off" (default) or "performance"
+  SQLITE_PRAGMAS  dict overriding individual pragma values
+  SQLITE_POOL_SIZE  pooled connections per worker (default 8)
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+PROFILES = {
+    "off": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,        # ms
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,         # negative = KiB, ~64 MB per connection
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,   # pages
+    },
+}
+
+
+def _is_file_sqlite(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:") \
+        and not url.database.startswith("file::memory:")
+
+
+def profile_pragmas(app) -> dict:
+    pragmas = dict(PROFILES[app.config.get("SQLITE_PROFILE", "off")])
+    pragmas.update(app.config.get("SQLITE_PRAGMAS") or {})
+    return pragmas
+
+
+def sqlite_engine_options(app) -> dict:
+    """Engine options for the profile (call before db.init_app); {} for other databases."""
+    if not _is_file_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]) or not profile_pragmas(app):
+        return {}
+    busy_ms = profile_pragmas(app).get("busy_timeout", 5000)
+    return {
+        # A connection per thread is cheap for SQLite; keep enough for the
+        # request thread plus the dashboard's block workers, and wait on the
+        # pool rather than opening unbounded overflow connections
+        "pool_size": app.config.get("SQLITE_POOL_SIZE", 8),
+        "max_overflow": 0,
+        "pool_timeout": 30,
+        "pool_pre_ping": False,  # local file: nothing to go stale
+        "connect_args": {"timeout": busy_ms / 1000, "check_same_thread": False},
+    }
+
+
+def _apply(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_sqlite_profile(app, db) -> None:
+    """Apply the profile's pragmas on every new connection of file-backed SQLite engines."""
+    pragmas = profile_pragmas(app)
+    if not pragmas:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite" and _is_file_sqlite(str(engine.url)):
+                event.listen(engine, "connect", _apply(pragmas))
@@ -0,0 +1,167 @@
+# app/utils/sqltrace.py
+"""
+Per-request SQL instrumentation.
+
+Engine cursor events feed a collector that lives for one request (held in a
+ContextVar, so work handed to a thread with copy_context() still counts).
+At the end of the request the totals go out as a Server-Timing header and a
+structured log line on the "app.sql" logger. Statements repeated with the
+same SQL text at least SQL_N_PLUS_ONE_THRESHOLD times are logged as N+1
+suspects. Running per-endpoint totals are kept in-process (endpoint_stats()).
+
+Config:
+  SQL_TRACE                 enable the hooks (default True)
+  SQL_SERVER_TIMING         emit the Server-Timing header (default: debug/testing only)
+  SQL_N_PLUS_ONE_THRESHOLD  repeats that flag a statement (default 5)
+  SQL_SLOW_STATEMENTS       slowest statements kept per request (default 3)
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+logger = logging.getLogger("app.sql")
+
+_current = contextvars.ContextVar("sql_trace", default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class RequestTrace:
+    """Statements executed while handling one request."""
+
+    def __init__(self, keep: int = 3):
+        self.keep = keep
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_ms = 0.0
+        self.statements = {}  # sql text -> [executions, total ms]
+        self.slowest = []     # (ms, sql text)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.db_ms += elapsed_ms
+            slot = self.statements.setdefault(statement, [0, 0.0])
+            slot[0] += 1
+            slot[1] += elapsed_ms
+            self.slowest.append((elapsed_ms, statement))
+            if len(self.slowest) > self.keep:
+                self.slowest.sort(reverse=True)
+                del self.slowest[self.keep:]
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return sorted(
+            ((sql, n) for sql, (n, _) in self.statements.items() if n >= threshold),
+            key=lambda item: -item[1],
+        )
+
+
+def current_trace() -> RequestTrace | None:
+    return _current.get()
+
+
+def endpoint_stats() -> dict:
+    """{endpoint: {"requests", "queries", "db_ms", "max_queries", "max_db_ms"}} since start-up."""
+    with _stats_lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def _short(sql: str, limit: int = 160) -> str:
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= limit else sql[: limit - 3] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sqltrace_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    starts = conn.info.get("sqltrace_start")
+    if trace is None or not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    trace.record(statement, elapsed_ms)
+
+
+def _server_timing(trace: RequestTrace, total_ms: float) -> str:
+    parts = [f'db;dur={trace.db_ms:.1f};desc="{trace.count} queries"']
+    if trace.slowest:
+        parts.append(f"db-slowest;dur={max(ms for ms, _ in trace.slowest):.1f}")
+    parts.append(f"app;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def init_sql_trace(app, db) -> None:
+    """Attach the engine listeners and request hooks to `app`."""
+    app.config.setdefault("SQL_TRACE", True)
+    app.config.setdefault("SQL_SERVER_TIMING", None)  # None -> only when debug/testing
+    app.config.setdefault("SQL_N_PLUS_ONE_THRESHOLD", 5)
+    app.config.setdefault("SQL_SLOW_STATEMENTS", 3)
+    if not app.config["SQL_TRACE"]:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def _start_trace():
+        g.sqltrace_token = _current.set(RequestTrace(app.config["SQL_SLOW_STATEMENTS"]))
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _current.get()
+        if trace is None:
+            return response
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        endpoint = request.endpoint or request.path
+        suspects = trace.repeated(app.config["SQL_N_PLUS_ONE_THRESHOLD"])
+
+        send_timing = app.config["SQL_SERVER_TIMING"]
+        if send_timing or (send_timing is None and (app.debug or app.testing)):
+            existing = response.headers.get("Server-Timing")
+            timing = _server_timing(trace, total_ms)
+            response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        logger.info(json.dumps({
+            "event": "request_sql",
+            "endpoint": endpoint,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": trace.count,
+            "db_ms": round(trace.db_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "slowest": [{"ms": round(ms, 2), "sql": _short(sql)} for ms, sql in sorted(trace.slowest, reverse=True)],
+        }))
+        for sql, n in suspects:
+            logger.warning(json.dumps({
+                "event": "n_plus_one_suspect",
+                "endpoint": endpoint,
+                "executions": n,
+                "sql": _short(sql),
+            }))
+
+        with _stats_lock:
+            s = _stats.setdefault(endpoint, {"requests": 0, "queries": 0, "db_ms": 0.0,
+                                             "max_queries": 0, "max_db_ms": 0.0})
+            s["requests"] += 1
+            s["queries"] += trace.count
+            s["db_ms"] = round(s["db_ms"] + trace.db_ms, 3)
+            s["max_queries"] = max(s["max_queries"], trace.count)
+            s["max_db_ms"] = round(max(s["max_db_ms"], trace.db_ms), 3)
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop("sqltrace_token", None)
+        if token is not None:
+            _current.reset(token)
@@ -1,8 +1,20 @@
 # app/utils/timeutils.py
-from datetime import datetime, timedelta, timezone
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone
+import functools
+import os
 import zoneinfo
 
-APP_TZ = zoneinfo.ZoneInfo("America/New_York")  # change if needed
+# Clinic-wide zone for dashboard/report "today"; patients carry their own
+APP_TZ = zoneinfo.ZoneInfo(os.getenv("APP_TIMEZONE", "America/New_York"))
+
+# Patients without a zone keep UTC days, which is what the daily rollup was
+# built with before zones existed
+PATIENT_DEFAULT_TZ = "UTC"
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_DAY = 86400
 
 def utcnow():
     # Always work in UTC internally
@@ -32,3 +44,115 @@ def local_day_bounds(now_utc: datetime | None = None, tz: zoneinfo.ZoneInfo | No
     end_local = start_local + timedelta(days=1)
     # Convert back to UTC for querying the DB
     return start_local.astimezone(timezone.utc), end_local.astimezone(timezone.utc)
+
+def is_valid_zone(name: str) -> bool:
+    try:
+        zoneinfo.ZoneInfo(name)
+        return True
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return False
+
+@functools.lru_cache(maxsize=None)
+def zone(name: str | None) -> zoneinfo.ZoneInfo:
+    """ZoneInfo for a patient's stored zone name (None -> PATIENT_DEFAULT_TZ)."""
+    return zoneinfo.ZoneInfo(name or PATIENT_DEFAULT_TZ)
+
+def local_today(tz: zoneinfo.ZoneInfo | str | None = None, now_utc: datetime | None = None) -> date:
+    """Today's date in `tz` (a ZoneInfo or patient zone name); the clinic zone when omitted."""
+    if tz is None:
+        tz = APP_TZ
+    elif isinstance(tz, str):
+        tz = zone(tz)
+    return (now_utc or utcnow()).astimezone(tz).date()
+
+def patient_today(zone_name: str | None, now_utc: datetime | None = None) -> date:
+    """Today's date for a patient with stored zone `zone_name` (None -> PATIENT_DEFAULT_TZ)."""
+    return local_today(zone(zone_name), now_utc)
+
+def to_local(ts: datetime | None, zone_name: str | None) -> datetime | None:
+    """Naive UTC timestamp as naive wall-clock time in a patient's zone."""
+    if ts is None:
+        return None
+    return ts.replace(tzinfo=timezone.utc).astimezone(zone(zone_name)).replace(tzinfo=None)
+
+def local_day_range(day: date, tz: zoneinfo.ZoneInfo | str | None = None) -> tuple[datetime, datetime]:
+    """
+    [start, end) of a local calendar day as naive UTC datetimes, ready to
+    compare against DoseLog.taken_at.
+    """
+    if tz is None or isinstance(tz, str):
+        tz = zone(tz)
+    start = datetime.combine(day, time(), tz)
+    end = datetime.combine(day + timedelta(days=1), time(), tz)
+    return (start.astimezone(timezone.utc).replace(tzinfo=None),
+            end.astimezone(timezone.utc).replace(tzinfo=None))
+
+@functools.lru_cache(maxsize=1024)
+def _year_transitions(name: str, year: int) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """
+    Offset changes of zone `name` during a UTC year: (starts, offsets), where
+    offsets[i] (seconds east of UTC) applies from epoch second starts[i].
+    Found by stepping a day at a time and bisecting each change to the second.
+    """
+    tz = zone(name)
+
+    def offset_at(t):
+        return int(datetime.fromtimestamp(t, tz).utcoffset().total_seconds())
+
+    t = int((datetime(year, 1, 1) - _EPOCH).total_seconds())
+    end = int((datetime(year + 1, 1, 1) - _EPOCH).total_seconds())
+    starts, offsets = [t], [offset_at(t)]
+    while t < end:
+        nxt = min(t + _DAY, end)
+        if offset_at(nxt) != offsets[-1]:
+            lo, hi = t, nxt  # offset changes in (lo, hi]
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if offset_at(mid) == offsets[-1]:
+                    lo = mid
+                else:
+                    hi = mid
+            starts.append(hi)
+            offsets.append(offset_at(hi))
+        t = nxt
+    return tuple(starts), tuple(offsets)
+
+def _transitions(name: str, first_year: int, last_year: int):
+    starts, offsets = [], []
+    for year in range(first_year, last_year + 1):
+        s, o = _year_transitions(name, year)
+        starts.extend(s)
+        offsets.extend(o)
+    return starts, offsets
+
+def local_days(timestamps, tz: str | None = None) -> list[date | None]:
+    """
+    Local calendar day, in zone `tz` (a patient zone name), of each naive UTC
+    timestamp; None stays None.
+
+    Meant for large batches: the zone's offset transitions for the years
+    involved are computed once (and cached), then each timestamp needs only
+    a bisect and integer arithmetic instead of an astimezone() call.
+    """
+    name = tz or PATIENT_DEFAULT_TZ
+    present = [ts for ts in timestamps if ts is not None]
+    if not present:
+        return [None] * len(timestamps)
+    starts, offsets = _transitions(name, min(present).year, max(present).year)
+    fixed = offsets[0] if len(set(offsets)) == 1 else None  # UTC and other fixed-offset zones
+    day_of = {}  # local ordinal -> date, so each distinct day is built once
+    days = []
+    for ts in timestamps:
+        if ts is None:
+            days.append(None)
+            continue
+        ordinal = ts.toordinal()
+        sod = ts.hour * 3600 + ts.minute * 60 + ts.second
+        off = fixed if fixed is not None else \
+            offsets[max(bisect_right(starts, (ordinal - _EPOCH_ORDINAL) * _DAY + sod) - 1, 0)]
+        local = ordinal + (sod + off) // _DAY
+        day = day_of.get(local)
+        if day is None:
+            day = day_of[local] = date.fromordinal(local)
+        days.append(day)
+    return days
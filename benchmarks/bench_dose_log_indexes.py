@@ -0,0 +1,142 @@
+# benchmarks/bench_dose_log_indexes.py
+"""
+Latency of the dose-log window queries with and without the composite
+indexes from migration add_dose_log_covering_indexes.
+
+Builds a throwaway SQLite file from the app models, bulk-loads a synthetic
+dose log (10M rows by default), then times each query shape first with the
+composite indexes dropped (only the old single-column taken_at index) and
+again with them in place.
+
+    python benchmarks/bench_dose_log_indexes.py                 # 10M rows
+    python benchmarks/bench_dose_log_indexes.py --rows 200000   # quick run
+"""
+import argparse
+import os
+import pathlib
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+COMPOSITE_INDEXES = {
+    "ix_dose_log_rx_taken_at_was_taken": "dose_log (prescription_id, taken_at, was_taken)",
+    "ix_prescription_patient_id": "prescription (patient_id)",
+    "ix_prescription_medication_id": "prescription (medication_id)",
+}
+
+def build_schema(path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+def load(conn, rows, prescriptions, patients):
+    now = datetime.utcnow()
+    conn.executemany("INSERT INTO patient (id, first_name, last_name) VALUES (?, 'Bench', ?)",
+                     ((i, f"P{i}") for i in range(1, patients + 1)))
+    conn.execute("INSERT INTO medication (id, name, strength) VALUES (1, 'Metformin', '500 mg')")
+    conn.executemany(
+        "INSERT INTO prescription (id, patient_id, medication_id, dosage, frequency_per_day, start_date) "
+        "VALUES (?, ?, 1, '1 tablet', 1, ?)",
+        ((i, random.randint(1, patients), (now - timedelta(days=3 * 365)).date().isoformat())
+         for i in range(1, prescriptions + 1)),
+    )
+    span = 3 * 365 * 86400
+
+    def logs():
+        for _ in range(rows):
+            ts = now - timedelta(seconds=random.randrange(span))
+            yield (random.randint(1, prescriptions), ts.isoformat(sep=" "), random.random() < 0.85)
+
+    batch = []
+    for row in logs():
+        batch.append(row)
+        if len(batch) == 100_000:
+            conn.executemany("INSERT INTO dose_log (prescription_id, taken_at, was_taken) VALUES (?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO dose_log (prescription_id, taken_at, was_taken) VALUES (?, ?, ?)", batch)
+    conn.commit()
+
+def queries(prescriptions, patients):
+    now = datetime.utcnow()
+    day_start = datetime(now.year, now.month, now.day)
+    three_years = now - timedelta(days=3 * 365)
+    fmt = lambda d: d.isoformat(sep=" ")
+    return {
+        "last_24h_exists": (
+            "SELECT EXISTS (SELECT 1 FROM dose_log WHERE prescription_id = ? AND taken_at >= ? AND taken_at < ?)",
+            lambda: (random.randint(1, prescriptions), fmt(now - timedelta(hours=24)), fmt(now)),
+        ),
+        "adherence_window_count": (
+            "SELECT COUNT(*) FROM dose_log WHERE prescription_id = ? AND was_taken = 1 AND taken_at >= ? AND taken_at < ?",
+            lambda: (random.randint(1, prescriptions), fmt(three_years), fmt(now)),
+        ),
+        "medications_today": (
+            "SELECT prescription_id, taken_at, was_taken FROM dose_log "
+            "WHERE prescription_id IN (?, ?, ?, ?, ?) AND taken_at >= ? AND taken_at < ?",
+            lambda: tuple(random.randint(1, prescriptions) for _ in range(5))
+                    + (fmt(day_start), fmt(day_start + timedelta(days=1))),
+        ),
+        "prescriptions_for_patient": (
+            "SELECT id FROM prescription WHERE patient_id = ?",
+            lambda: (random.randint(1, patients),),
+        ),
+    }
+
+def time_queries(conn, shapes, repeat):
+    results = {}
+    for name, (sql, params) in shapes.items():
+        samples = []
+        for _ in range(repeat):
+            args = params()
+            t0 = time.perf_counter()
+            conn.execute(sql, args).fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--prescriptions", type=int, default=30_000)
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", help="write the database here instead of a temp file")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    build_schema(path)
+    conn = sqlite3.connect(path)
+    t0 = time.perf_counter()
+    load(conn, args.rows, args.prescriptions, args.patients)
+    print(f"loaded {args.rows:,} dose logs in {time.perf_counter() - t0:.1f}s -> {path}")
+
+    shapes = queries(args.prescriptions, args.patients)
+    for name in COMPOSITE_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("ANALYZE")
+    before = time_queries(conn, shapes, args.repeat)
+
+    for name, target in COMPOSITE_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    conn.execute("ANALYZE")
+    after = time_queries(conn, shapes, args.repeat)
+
+    print(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in shapes:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<28}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# benchmarks/bench_endpoints.py
+"""
+Endpoint latency, query count and peak memory over a populated database.
+
+Drives each route through the Flask test client (clinician routes as the
+bench user from populate.py, patient routes with a rotating set of patients
+in the session) and writes a JSON report:
+
+    {"meta": {...commit, database, table sizes...},
+     "routes": {name: {"p50_ms", "p95_ms", "p99_ms", "mean_ms", "queries",
+                       "peak_kib", "status"}}}
+
+Compare two runs to spot regressions between commits:
+
+    python benchmarks/populate.py --scale medium --database /tmp/bench.db
+    python benchmarks/bench_endpoints.py --database /tmp/bench.db --output before.json
+    git checkout my-branch
+    python benchmarks/bench_endpoints.py --database /tmp/bench.db --output after.json --compare before.json
+
+--compare exits non-zero when a route's p95 grows by more than --threshold
+(default 20%) or it issues more queries than before.
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+BENCH_USER = "bench"
+
+
+def routes(rng, patient_ids, medication_ids):
+    """name -> (who, path factory). who is 'clinician' or 'patient'."""
+    dt = "draw=1&start={start}&length=25"
+    return {
+        "clinic_dashboard": ("clinician", lambda: "/clinic_dashboard"),
+        "medications": ("patient", lambda: "/medications"),
+        "dose_history": ("patient", lambda: "/dose-history"),
+        "api_patients": ("clinician", lambda: "/api/patients?" + dt.format(start=0)),
+        "api_patients_search": ("clinician", lambda: "/api/patients?" + dt.format(start=0)
+                                + "&search[value]=" + rng.choice(["smi", "garcia", "ada", "12"])),
+        "api_medications": ("clinician", lambda: "/api/medications?" + dt.format(start=0)),
+        "api_medications_search": ("clinician", lambda: "/api/medications?" + dt.format(start=0)
+                                   + "&search[value]=" + rng.choice(["metf", "statin", "500"])),
+        "api_dose_logs": ("clinician", lambda: "/api/dose_logs?" + dt.format(start=0)),
+        "api_dose_logs_deep": ("clinician", lambda: "/api/dose_logs?" + dt.format(start=rng.randint(5_000, 20_000))),
+        "api_dose_logs_search": ("clinician", lambda: "/api/dose_logs?" + dt.format(start=0)
+                                 + "&search[value]=" + rng.choice(["late", "food", "dizzy"])),
+        "export_patient_dose_logs": ("clinician", lambda: f"/api/dose_logs/export?patient_id={rng.choice(patient_ids)}"),
+    }
+
+
+class QueryCounter:
+    """Counts statements on the engine; dashboard blocks run on worker threads, hence the lock."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            n, self.count = self.count, 0
+        return n
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def git_meta():
+    def run(*cmd):
+        try:
+            return subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": run("git", "rev-parse", "--short", "HEAD"),
+            "dirty": bool(run("git", "status", "--porcelain", "--untracked-files=no"))}
+
+
+def bench(args):
+    url = args.database if "://" in args.database else f"sqlite:///{os.path.abspath(args.database)}"
+    os.environ["DATABASE_URL"] = url
+
+    from sqlalchemy import select, func
+    from app import create_app, db
+    from app.models import User, Patient, Medication, Prescription, DoseLog
+
+    app = create_app()
+    app.config.update(TESTING=True, SERVER_NAME="localhost")
+    if args.no_cache:
+        app.config["DASHBOARD_CACHE_TTL"] = 0
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        user = db.session.execute(select(User).where(User.username == BENCH_USER)).scalar_one_or_none()
+        if user is None:
+            sys.exit(f"no '{BENCH_USER}' user; load the database with benchmarks/populate.py first")
+        user_id = user.id
+        patient_ids = list(db.session.scalars(
+            select(Prescription.patient_id).distinct().order_by(Prescription.patient_id).limit(5000)))
+        patient_ids = rng.sample(patient_ids, min(args.patients, len(patient_ids)))
+        medication_ids = list(db.session.scalars(select(Medication.id)))
+        sizes = {m.__tablename__: db.session.scalar(select(func.count()).select_from(m))
+                 for m in (Patient, Medication, Prescription, DoseLog)}
+        counter = QueryCounter(db.engine)
+
+    selected = routes(rng, patient_ids, medication_ids)
+    if args.routes:
+        selected = {k: v for k, v in selected.items() if k in args.routes}
+
+    client = app.test_client()
+
+    def get(who, path):
+        with client.session_transaction() as s:
+            s.clear()
+            if who == "clinician":
+                s["_user_id"] = str(user_id)
+                s["_fresh"] = True
+            else:
+                s["active_patient_id"] = rng.choice(patient_ids)
+        r = client.get(path)
+        r.get_data()  # drain streamed bodies
+        return r.status_code
+
+    results = {}
+    for name, (who, path) in selected.items():
+        for _ in range(args.warmup):
+            get(who, path())
+        counter.take()
+        samples, queries, statuses = [], [], set()
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            statuses.add(get(who, path()))
+            samples.append((time.perf_counter() - t0) * 1000)
+            queries.append(counter.take())
+
+        # Separate pass: tracemalloc slows allocation-heavy code too much to time under it
+        peaks = []
+        tracemalloc.start()
+        for _ in range(args.memory_samples):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            get(who, path())
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        counter.take()
+
+        results[name] = {
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            "queries": max(queries),
+            "peak_kib": round(max(peaks) / 1024, 1) if peaks else None,
+            "status": sorted(statuses),
+        }
+        r = results[name]
+        print(f"{name:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['queries']:>9}{r['peak_kib'] or 0:>12.1f}  {r['status']}")
+
+    return {
+        "meta": {
+            **git_meta(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "database": url.split("://", 1)[0],
+            "tables": sizes,
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "dashboard_cache": not args.no_cache,
+        },
+        "routes": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print per-route deltas; return the names of regressed routes."""
+    regressed = []
+    print(f"\n{'route':<28}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'queries':>12}")
+    for name, now in current["routes"].items():
+        before = baseline["routes"].get(name)
+        if not before:
+            print(f"{name:<28}{'-':>12}{now['p95_ms']:>12.2f}{'new':>9}{now['queries']:>12}")
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        flag = ""
+        if change > threshold or now["queries"] > before["queries"]:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28}{before['p95_ms']:>12.2f}{now['p95_ms']:>12.2f}{change:>8.0%}"
+              f"{before['queries']:>6}->{now['queries']:<5}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="SQLAlchemy URL or SQLite file from populate.py")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--memory-samples", type=int, default=3)
+    parser.add_argument("--patients", type=int, default=200, help="patients rotated through patient routes")
+    parser.add_argument("--routes", nargs="*", help="only these route names")
+    parser.add_argument("--no-cache", action="store_true", help="disable the dashboard block cache")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed p95 growth (fraction)")
+    args = parser.parse_args()
+
+    print(f"{'route':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KiB':>12}  status")
+    report = bench(args)
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"report -> {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressed = compare(report, baseline, args.threshold)
+        if regressed:
+            print(f"\nregressed: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_ratelimit.py
+"""
+Rate-limiter storage: memory:// vs the shared SQLite backend.
+
+Part 1 times a single limiter hit (what Flask-Limiter does per request) in
+one process. Part 2 starts several worker processes that each hit one key
+as fast as they can for a limit of --limit per minute. It reports how many
+hits the workers let through in total. memory:// lets through limit × workers
+and the shared storage lets through exactly the limit.
+
+    python benchmarks/bench_ratelimit.py
+    python benchmarks/bench_ratelimit.py --hits 50000 --workers 8
+"""
+import argparse
+import multiprocessing as mp
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _limiter(uri):
+    from limits.storage import storage_from_string
+    from limits.strategies import FixedWindowRateLimiter
+    import app.utils.ratelimit_storage  # noqa: F401  (registers sqlite://)
+    return FixedWindowRateLimiter(storage_from_string(uri))
+
+
+def latency(uri, hits, keys):
+    from limits import parse
+    limiter = _limiter(uri)
+    limit = parse("1000000/hour")
+    samples = []
+    for i in range(hits):
+        key = f"10.0.{i % keys // 256}.{i % 256}"
+        t0 = time.perf_counter()
+        limiter.hit(limit, key)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples), statistics.quantiles(samples, n=100)[98]
+
+
+def worker(uri, limit, attempts, start, out):
+    from limits import parse
+    limiter = _limiter(uri)
+    item = parse(f"{limit}/minute")
+    start.wait()
+    out.put(sum(limiter.hit(item, "203.0.113.9") for _ in range(attempts)))
+
+
+def allowed(uri, args):
+    ctx = mp.get_context("spawn")
+    out, start = ctx.Queue(), ctx.Barrier(args.workers)
+    procs = [ctx.Process(target=worker, args=(uri, args.limit, args.limit * 2, start, out))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    total = sum(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hits", type=int, default=20000, help="timed hits per backend")
+    parser.add_argument("--keys", type=int, default=5000, help="distinct client IPs in the latency run")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=200, help="per-minute limit in the sharing run")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    backends = {"memory://": lambda run: "memory://",
+                "sqlite (shared)": lambda run: f"sqlite:///{tmp}/ratelimit_{run}.db"}
+
+    print(f"{'storage':<18}{'p50 us/hit':>12}{'p99 us/hit':>12}{'allowed':>10}{'expected':>10}")
+    for name, uri in backends.items():
+        p50, p99 = latency(uri("latency"), args.hits, args.keys)
+        total = allowed(uri("sharing"), args)
+        print(f"{name:<18}{p50:>12.1f}{p99:>12.1f}{total:>10}{args.limit:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/bench_sqlite_profile.py
+"""
+Dose-logging throughput on file SQLite with SQLITE_PROFILE=off vs performance.
+
+Each profile gets a fresh database file (journal_mode=WAL persists in the
+file, so the runs must not share one). Writer processes stand in for gunicorn
+workers handling "take dose" clicks: ORM insert of a DoseLog plus commit, so
+the rollup/projection/search listeners write too. Reader processes run the
+patient medication-page queries at the same time. Reports writes/s, reads/s,
+p95 write latency and "database is locked" failures per profile.
+
+    python benchmarks/bench_sqlite_profile.py
+    python benchmarks/bench_sqlite_profile.py --writers 8 --readers 4 --seconds 20
+"""
+import argparse
+import multiprocessing as mp
+import os
+import pathlib
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _app(path, profile):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["SQLITE_PROFILE"] = profile
+    from app import create_app
+    return create_app()
+
+
+def build(path, profile, patients, prescriptions):
+    from app import db
+    from app.models import Patient, Medication, Prescription
+    app = _app(path, profile)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Patient(first_name="Bench", last_name=f"P{i}") for i in range(patients)])
+        db.session.add(Medication(name="Metformin", strength="500 mg"))
+        db.session.flush()
+        start = date.today() - timedelta(days=90)
+        db.session.add_all([
+            Prescription(patient_id=random.randint(1, patients), medication_id=1, dosage="1 tablet",
+                         frequency_per_day=2, start_date=start)
+            for _ in range(prescriptions)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def writer(path, profile, prescriptions, start, seconds, out):
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from app.models import DoseLog
+    app = _app(path, profile)
+    latencies, locked = [], 0
+    with app.app_context():
+        start.wait()
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            t0 = time.perf_counter()
+            try:
+                db.session.add(DoseLog(prescription_id=random.randint(1, prescriptions),
+                                       taken_at=datetime.utcnow(), was_taken=random.random() < 0.9))
+                db.session.commit()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+    out.put(("w", latencies, locked))
+
+
+def reader(path, profile, patients, start, seconds, out):
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from app.models import DoseLog, Prescription
+    from app.services.adherence import adherence_for_prescriptions
+    app = _app(path, profile)
+    done, locked = 0, 0
+    now = datetime.utcnow()
+    with app.app_context():
+        start.wait()
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            pid = random.randint(1, patients)
+            try:
+                rx_ids = [r.id for r in Prescription.query.filter_by(patient_id=pid)]
+                DoseLog.query.filter(DoseLog.prescription_id.in_(rx_ids),
+                                     DoseLog.taken_at >= now - timedelta(days=1)).all()
+                adherence_for_prescriptions(patient_id=pid)
+                db.session.rollback()
+                done += 1
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+    out.put(("r", done, locked))
+
+
+def run(profile, args):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_{profile}.db")
+    ctx = mp.get_context("spawn")
+    # config.Config reads DATABASE_URL at import, so every database needs a fresh interpreter
+    builder = ctx.Process(target=build, args=(path, profile, args.patients, args.prescriptions))
+    builder.start()
+    builder.join()
+    out = ctx.Queue()
+    # Workers import the app first, then all start the clock together
+    start = ctx.Barrier(args.writers + args.readers)
+    procs = [ctx.Process(target=writer, args=(path, profile, args.prescriptions, start, args.seconds, out))
+             for _ in range(args.writers)]
+    procs += [ctx.Process(target=reader, args=(path, profile, args.patients, start, args.seconds, out))
+              for _ in range(args.readers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = [ms for kind, lat, _ in results if kind == "w" for ms in lat]
+    reads = sum(n for kind, n, _ in results if kind == "r")
+    return {
+        "writes_per_s": len(latencies) / args.seconds,
+        "reads_per_s": reads / args.seconds,
+        "p95_write_ms": statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else float("nan"),
+        "locked": sum(locked for _, _, locked in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--prescriptions", type=int, default=6000)
+    args = parser.parse_args()
+
+    rows = {profile: run(profile, args) for profile in ("off", "performance")}
+    print(f"{'profile':<14}{'writes/s':>10}{'reads/s':>10}{'p95 write ms':>14}{'locked':>8}")
+    for profile, r in rows.items():
+        print(f"{profile:<14}{r['writes_per_s']:>10.1f}{r['reads_per_s']:>10.1f}"
+              f"{r['p95_write_ms']:>14.2f}{r['locked']:>8}")
+
+
+if __name__ == "__main__":
+    main()
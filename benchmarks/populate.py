@@ -0,0 +1,238 @@
+# benchmarks/populate.py
+"""
+Bulk-load a synthetic clinic population for benchmarking.
+
+Creates the schema from the app models in the target database, then loads
+patients, medications, prescriptions and dose logs through the raw DBAPI
+connection (executemany on SQLite, COPY on Postgres), and finally rebuilds
+the derived tables (daily rollup, 30-day projection, search index) with the
+app's own services so the data looks like it was written through the app.
+
+Dose logs are sampled from each prescription's real schedule (start date to
+end date or today, frequency_per_day slots a day), and each patient gets a
+stable adherence rate, so per-patient histories and adherence scores are
+plausible rather than uniform noise.
+
+    python benchmarks/populate.py --scale small                    # temp SQLite file
+    python benchmarks/populate.py --scale large --database /data/bench.db
+    python benchmarks/populate.py --database postgresql://localhost/mats_bench --dose-logs 5000000
+
+Scales: small = 1k patients / 3k prescriptions / 500k dose logs,
+medium = 10k / 30k / 5M, large = 100k / 300k / 50M.
+"""
+import argparse
+import hashlib
+import hmac
+import io
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+SCALES = {
+    "small": (1_000, 3_000, 500_000),
+    "medium": (10_000, 30_000, 5_000_000),
+    "large": (100_000, 300_000, 50_000_000),
+}
+BATCH = 50_000
+HISTORY_DAYS = 3 * 365
+BENCH_USER = "bench"
+
+FIRST_NAMES = ["Ada", "Ben", "Carla", "Dev", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jamal",
+               "Kai", "Lena", "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tara",
+               "Uma", "Victor", "Wen", "Ximena", "Yusuf", "Zoe"]
+LAST_NAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Okafor", "Kowalski", "Haddad", "Silva",
+              "Tanaka", "Muller", "Rossi", "Dubois", "Kim", "Patel", "Ivanova", "Cohen", "Jensen",
+              "Moreno", "Singh", "Novak", "Reyes", "Fischer", "Costa", "Mensah", "Larsen"]
+DRUGS = ["Metformin", "Lisinopril", "Atorvastatin", "Levothyroxine", "Amlodipine", "Metoprolol",
+         "Omeprazole", "Losartan", "Gabapentin", "Sertraline", "Simvastatin", "Montelukast",
+         "Escitalopram", "Rosuvastatin", "Bupropion", "Furosemide", "Pantoprazole", "Trazodone",
+         "Tamsulosin", "Fluoxetine", "Carvedilol", "Meloxicam", "Clopidogrel", "Prednisone",
+         "Citalopram", "Warfarin", "Apixaban", "Insulin glargine", "Hydrochlorothiazide", "Allopurinol"]
+STRENGTHS = ["5 mg", "10 mg", "20 mg", "25 mg", "40 mg", "50 mg", "100 mg", "250 mg", "500 mg", "1000 mg"]
+DOSAGES = ["1 tablet", "2 tablets", "1 capsule", "5 ml", "1 injection"]
+NOTES = ["with food", "late", "felt dizzy", "skipped breakfast", "taken at work", "refill soon"]
+
+
+class Writer:
+    """Batched bulk inserts through the raw DBAPI connection."""
+
+    def __init__(self, engine):
+        self.dialect = engine.dialect.name
+        self.raw = engine.raw_connection()
+        if self.dialect == "sqlite":
+            cur = self.raw.cursor()
+            cur.execute("PRAGMA synchronous = OFF")
+            cur.execute("PRAGMA journal_mode = MEMORY")
+            cur.close()
+
+    def write(self, table, columns, rows):
+        batch, total = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH:
+                self._flush(table, columns, batch)
+                total += len(batch)
+                batch.clear()
+        if batch:
+            self._flush(table, columns, batch)
+            total += len(batch)
+        self.raw.commit()
+        return total
+
+    def _flush(self, table, columns, batch):
+        cur = self.raw.cursor()
+        if self.dialect == "postgresql":
+            buf = io.StringIO()
+            for row in batch:
+                buf.write("\t".join(r"\N" if v is None else str(v) for v in row) + "\n")
+            buf.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+        else:
+            marks = ", ".join("?" for _ in columns)
+            cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", batch)
+        cur.close()
+
+    def finish(self):
+        if self.dialect == "postgresql":
+            cur = self.raw.cursor()
+            for table in ("patient", "medication", "prescription", "dose_log", '"user"'):
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                            f"COALESCE((SELECT max(id) FROM {table}), 1))")
+            cur.close()
+            self.raw.commit()
+        self.raw.close()
+
+
+def patients(n, lookup_key, rng):
+    for pid in range(1, n + 1):
+        ssn = f"{rng.randint(100, 899):03d}{rng.randint(10, 99):02d}{rng.randint(1000, 9999):04d}"
+        lookup = hmac.new(lookup_key, ssn.encode(), hashlib.sha256).hexdigest()
+        dob = date(1940, 1, 1) + timedelta(days=rng.randrange(65 * 365))
+        yield (pid, rng.choice(FIRST_NAMES), f"{rng.choice(LAST_NAMES)}{pid}", ssn[-4:], lookup,
+               dob.isoformat(), datetime.utcnow().isoformat(sep=" "))
+
+
+def medications():
+    mid = 0
+    for name in DRUGS:
+        for strength in STRENGTHS:
+            mid += 1
+            yield (mid, name, strength)
+
+
+def prescriptions(n, n_patients, n_meds, today, rng):
+    for rx_id in range(1, n + 1):
+        start = today - timedelta(days=rng.randrange(HISTORY_DAYS))
+        # A third of prescriptions have ended; a few are scheduled to end later
+        roll = rng.random()
+        if roll < 0.33:
+            end = start + timedelta(days=rng.randint(14, 365))
+            end = min(end, today - timedelta(days=1))
+        elif roll < 0.4:
+            end = today + timedelta(days=rng.randint(1, 180))
+        else:
+            end = None
+        yield (rx_id, rng.randint(1, n_patients), rng.randint(1, n_meds), rng.choice(DOSAGES),
+               rng.choices((1, 2, 3), weights=(6, 3, 1))[0], start.isoformat(),
+               end.isoformat() if end else None, rng.random() < 0.3)
+
+
+def dose_logs(rx_rows, target, today, rng):
+    """Sample `target` logs overall from the prescriptions' dose schedules."""
+    schedules, total_slots = [], 0
+    for rx_id, patient_id, _, _, freq, start, end, _ in rx_rows:
+        first = date.fromisoformat(start)
+        last = min(date.fromisoformat(end), today) if end else today
+        slots = max(((last - first).days + 1) * freq, 0)
+        schedules.append((rx_id, patient_id, freq, first, slots))
+        total_slots += slots
+    ratio = min(target / total_slots, 1.0) if total_slots else 0.0
+    adherence = {}
+    now = datetime.utcnow()
+    for rx_id, patient_id, freq, first, slots in schedules:
+        rate = adherence.setdefault(patient_id, rng.betavariate(8, 2))
+        count = min(slots, int(slots * ratio + rng.random()))
+        for slot in sorted(rng.sample(range(slots), count)):
+            day, nth = divmod(slot, freq)
+            minutes = 8 * 60 + nth * (12 * 60 // freq) + rng.randint(-45, 90)
+            taken_at = datetime.combine(first + timedelta(days=day), datetime.min.time()) + timedelta(minutes=minutes)
+            if taken_at > now:
+                continue  # later today's doses haven't happened yet
+            note = rng.choice(NOTES) if rng.random() < 0.05 else None
+            yield (rx_id, taken_at.isoformat(sep=" "), rng.random() < rate, note)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="large")
+    parser.add_argument("--patients", type=int)
+    parser.add_argument("--prescriptions", type=int)
+    parser.add_argument("--dose-logs", type=int)
+    parser.add_argument("--database", help="SQLAlchemy URL or SQLite file path (default: temp file)")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    n_patients, n_rx, n_logs = SCALES[args.scale]
+    n_patients = args.patients or n_patients
+    n_rx = args.prescriptions or n_rx
+    n_logs = args.dose_logs if args.dose_logs is not None else n_logs
+
+    url = args.database or os.path.join(tempfile.mkdtemp(), "bench_population.db")
+    if "://" not in url:
+        url = f"sqlite:///{os.path.abspath(url)}"
+    os.environ["DATABASE_URL"] = url
+
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.services.rollup import rebuild_daily_rollup
+    from app.services.projections import refresh_adherence_projection
+    from app.services.search import rebuild_search_index
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    today = datetime.utcnow().date()
+    with app.app_context():
+        db.create_all()
+        key = app.config["SSN_LOOKUP_KEY"]
+        key = key.encode() if isinstance(key, str) else key
+        writer = Writer(db.engine)
+
+        def step(label, fn):
+            t0 = time.perf_counter()
+            n = fn()
+            print(f"{label:<28}{n:>12,} rows {time.perf_counter() - t0:>8.1f}s")
+
+        step("users", lambda: writer.write(
+            '"user"', ("username", "email", "password_hash"),
+            [(BENCH_USER, "bench@example.com", generate_password_hash("bench"))]))
+        step("patients", lambda: writer.write(
+            "patient", ("id", "first_name", "last_name", "ssn_last4", "ssn_lookup", "dob", "created_at"),
+            patients(n_patients, key, rng)))
+        meds = list(medications())
+        step("medications", lambda: writer.write("medication", ("id", "name", "strength"), meds))
+        rx_rows = list(prescriptions(n_rx, n_patients, len(meds), today, rng))
+        step("prescriptions", lambda: writer.write(
+            "prescription", ("id", "patient_id", "medication_id", "dosage", "frequency_per_day",
+                             "start_date", "end_date", "reminder_enabled"), rx_rows))
+        step("dose_logs", lambda: writer.write(
+            "dose_log", ("prescription_id", "taken_at", "was_taken", "notes"),
+            dose_logs(rx_rows, n_logs, today, rng)))
+        writer.finish()
+
+        step("dose_daily_rollup", rebuild_daily_rollup)
+        step("patient_adherence_window", refresh_adherence_projection)
+        step("search_index", rebuild_search_index)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    print(f"population ready -> {url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""add cohort_adherence totals and histogram per medication and start quarter
+
+Revision ID: add_cohort_adherence
+Revises: add_prescription_adherence_metric
+Create Date: 2026-10-18
+
+Maintained by `flask analytics nightly`; `flask cohorts rebuild` fills them
+from an existing snapshot.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_cohort_adherence'
+down_revision = 'add_prescription_adherence_metric'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('cohort_adherence'):
+        op.create_table(
+            'cohort_adherence',
+            sa.Column('medication_id', sa.Integer(), sa.ForeignKey('medication.id'), primary_key=True),
+            sa.Column('cohort', sa.String(length=7), primary_key=True),
+            sa.Column('prescriptions', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('pdc_sum', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('pdc_sum_sq', sa.BigInteger(), nullable=False, server_default='0'),
+        )
+    if not inspector.has_table('cohort_adherence_bucket'):
+        op.create_table(
+            'cohort_adherence_bucket',
+            sa.Column('medication_id', sa.Integer(), sa.ForeignKey('medication.id'), primary_key=True),
+            sa.Column('cohort', sa.String(length=7), primary_key=True),
+            sa.Column('bucket', sa.Integer(), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+def downgrade():
+    op.drop_table('cohort_adherence_bucket')
+    op.drop_table('cohort_adherence')
@@ -0,0 +1,45 @@
+"""add dose_daily_rollup and backfill it from dose_log
+
+Revision ID: add_dose_daily_rollup
+Revises: seed_and_hardening
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_dose_daily_rollup'
+down_revision = 'seed_and_hardening'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('dose_daily_rollup'):
+        op.create_table(
+            'dose_daily_rollup',
+            sa.Column('prescription_id', sa.Integer(), sa.ForeignKey('prescription.id'), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('taken_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('missed_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('prescription_id', 'day'),
+        )
+
+    # Backfill (re-runnable: start from an empty rollup)
+    conn.exec_driver_sql("DELETE FROM dose_daily_rollup")
+    conn.exec_driver_sql(
+        """
+        INSERT INTO dose_daily_rollup (prescription_id, day, taken_count, missed_count)
+        SELECT prescription_id,
+               date(taken_at),
+               SUM(CASE WHEN was_taken THEN 1 ELSE 0 END),
+               SUM(CASE WHEN was_taken THEN 0 ELSE 1 END)
+        FROM dose_log
+        WHERE taken_at IS NOT NULL
+        GROUP BY prescription_id, date(taken_at)
+        """
+    )
+
+def downgrade():
+    op.drop_table('dose_daily_rollup')
@@ -0,0 +1,31 @@
+"""composite covering indexes for dose_log window queries and prescription FKs
+
+Revision ID: add_dose_log_covering_indexes
+Revises: add_patient_ssn_lookup
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_dose_log_covering_indexes'
+down_revision = 'add_patient_ssn_lookup'
+branch_labels = None
+depends_on = None
+
+# Plain CREATE INDEX IF NOT EXISTS is understood by both SQLite and Postgres (9.5+)
+INDEXES = [
+    ("ix_dose_log_rx_taken_at_was_taken", "dose_log", "prescription_id, taken_at, was_taken"),
+    ("ix_prescription_patient_id", "prescription", "patient_id"),
+    ("ix_prescription_medication_id", "prescription", "medication_id"),
+]
+
+def upgrade():
+    conn = op.get_bind()
+    for name, table, cols in INDEXES:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+
+def downgrade():
+    conn = op.get_bind()
+    for name, _, _ in INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
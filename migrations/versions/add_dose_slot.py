@@ -0,0 +1,45 @@
+"""add dose_slot: one patient-recorded dose per prescription, local day and daily dose
+
+Revision ID: add_dose_slot
+Revises: add_cohort_adherence
+Create Date: 2026-10-18
+
+Starts empty: the taken/missed routes also count the day's dose_log rows
+against frequency_per_day, so logs recorded before this revision still count.
+
+Also drops the one-log-per-UTC-day index from seed_and_hardening (and its
+per-partition copies from partition_dose_log). It blocks a second local day
+that shares a UTC date with the first, and dose_slot now owns the rule.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_dose_slot'
+down_revision = 'add_cohort_adherence'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('dose_slot'):
+        op.create_table(
+            'dose_slot',
+            sa.Column('prescription_id', sa.Integer(), sa.ForeignKey('prescription.id'), primary_key=True),
+            sa.Column('day', sa.Date(), primary_key=True),
+            sa.Column('dose', sa.Integer(), primary_key=True, autoincrement=False),
+        )
+
+    conn = op.get_bind()
+    conn.exec_driver_sql("DROP INDEX IF EXISTS uq_dose_log_rx_day")
+    if conn.dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql(
+            "SELECT indexname FROM pg_indexes WHERE indexname LIKE %(pattern)s",
+            {"pattern": "uq_dose_log_p%_rx_day"},
+        )
+        for (name,) in rows.all():
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+def downgrade():
+    # The UTC-day index is not recreated: logs made since may no longer fit it
+    op.drop_table('dose_slot')
@@ -0,0 +1,37 @@
+"""add patient_adherence_window projection for the 30-day ranking
+
+Revision ID: add_patient_adherence_window
+Revises: add_search_index
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_patient_adherence_window'
+down_revision = 'add_search_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('patient_adherence_window'):
+        op.create_table(
+            'patient_adherence_window',
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id'), primary_key=True),
+            sa.Column('taken_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('adherence', sa.Float(), nullable=True),
+            sa.Column('last_activity_at', sa.DateTime(), nullable=True),
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_patient_adherence_window_adherence "
+        "ON patient_adherence_window (adherence)"
+    )
+    # Initial projection; `flask projection refresh` keeps it current afterwards
+    from app.services.projections import rebuild_projection
+    rebuild_projection(conn)
+
+def downgrade():
+    op.drop_table('patient_adherence_window')
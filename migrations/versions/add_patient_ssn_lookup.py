@@ -0,0 +1,33 @@
+"""add indexed keyed-HMAC ssn_lookup column to patient
+
+Revision ID: add_patient_ssn_lookup
+Revises: add_dose_daily_rollup
+Create Date: 2026-10-18
+
+Existing rows only hold a one-way scrypt hash, so the lookup value cannot be
+derived here. Rows are left NULL and backfilled by patient_login on the
+patient's next successful sign-in. When the indexed lookup misses, login
+falls back to a last4/DOB scan over rows whose lookup is NULL or differs
+from the current one (made under an earlier SSN_LOOKUP_KEY), and rewrites
+the lookup of the row that matches.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_patient_ssn_lookup'
+down_revision = 'add_dose_daily_rollup'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'ssn_lookup' not in [c['name'] for c in insp.get_columns('patient')]:
+        op.add_column('patient', sa.Column('ssn_lookup', sa.String(length=64), nullable=True))
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_patient_ssn_lookup ON patient (ssn_lookup)")
+
+def downgrade():
+    op.drop_index('ix_patient_ssn_lookup', table_name='patient')
+    # SQLite cannot drop columns easily without table rebuild; leave the column in place.
@@ -0,0 +1,29 @@
+"""add patient.timezone (IANA zone name) for patient-local days
+
+Revision ID: add_patient_timezone
+Revises: partition_dose_log
+Create Date: 2026-10-18
+
+NULL means UTC, the day boundary the daily rollup already uses, so existing
+rollup rows stay valid. After setting zones on existing patients, rebuild
+their rollup rows (flask rollup rebuild --patient-id ...).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_patient_timezone'
+down_revision = 'partition_dose_log'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'timezone' not in [c['name'] for c in insp.get_columns('patient')]:
+        op.add_column('patient', sa.Column('timezone', sa.String(length=64), nullable=True))
+
+def downgrade():
+    # SQLite cannot drop columns easily without table rebuild; leave the column in place.
+    pass
@@ -0,0 +1,43 @@
+"""add prescription_adherence_metric nightly PDC/MPR snapshot
+
+Revision ID: add_prescription_adherence_metric
+Revises: add_patient_timezone
+Create Date: 2026-10-18
+
+Filled by `flask analytics nightly`; empty until its first run.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_prescription_adherence_metric'
+down_revision = 'add_patient_timezone'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('prescription_adherence_metric'):
+        op.create_table(
+            'prescription_adherence_metric',
+            sa.Column('prescription_id', sa.Integer(), sa.ForeignKey('prescription.id'), primary_key=True),
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id'), nullable=False),
+            sa.Column('as_of', sa.Date(), nullable=False),
+            sa.Column('pdc_7', sa.Float(), nullable=True),
+            sa.Column('pdc_30', sa.Float(), nullable=True),
+            sa.Column('pdc_90', sa.Float(), nullable=True),
+            sa.Column('mpr_30', sa.Float(), nullable=True),
+            sa.Column('mpr_90', sa.Float(), nullable=True),
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_prescription_adherence_metric_patient_id "
+        "ON prescription_adherence_metric (patient_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_prescription_adherence_metric_pdc_90 "
+        "ON prescription_adherence_metric (pdc_90)"
+    )
+
+def downgrade():
+    op.drop_table('prescription_adherence_metric')
@@ -0,0 +1,25 @@
+"""index for the reminder dispatch scan
+
+Revision ID: add_reminder_dispatch_index
+Revises: add_patient_adherence_window
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_reminder_dispatch_index'
+down_revision = 'add_patient_adherence_window'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    conn = op.get_bind()
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_prescription_reminder_enabled_id "
+        "ON prescription (reminder_enabled, id)"
+    )
+
+def downgrade():
+    conn = op.get_bind()
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_prescription_reminder_enabled_id")
@@ -0,0 +1,33 @@
+"""search index: FTS5 trigram table on SQLite, pg_trgm GIN indexes on Postgres
+
+Revision ID: add_search_index
+Revises: add_dose_log_covering_indexes
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_index'
+down_revision = 'add_dose_log_covering_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    from app.services.search import create_search_structures, populate_search_index, SEARCH_TABLE
+    conn = op.get_bind()
+    create_search_structures(conn)
+    if conn.dialect.name == 'sqlite' and conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+    ).first():
+        # Backfill from the base tables (safe to re-run)
+        populate_search_index(conn)
+
+def downgrade():
+    from app.services.search import SEARCH_TABLE, TRGM_INDEXES
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    elif conn.dialect.name == 'postgresql':
+        for name, _, _ in TRGM_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,123 @@
+"""range-partition dose_log by month on Postgres
+
+Revision ID: partition_dose_log
+Revises: add_reminder_dispatch_index
+Create Date: 2026-10-18
+"""
+
+from datetime import date
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'partition_dose_log'
+down_revision = 'add_reminder_dispatch_index'
+branch_labels = None
+depends_on = None
+
+# SQLite has no table partitioning; there the hot table is kept small by the
+# archival job alone (app.services.archive), so this revision is Postgres-only.
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_dose_log_taken_at ON dose_log (taken_at)",
+    "CREATE INDEX IF NOT EXISTS ix_dose_log_rx_taken_at_was_taken ON dose_log (prescription_id, taken_at, was_taken)",
+]
+
+
+def _add_months(d, n):
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def _is_partitioned(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM pg_class WHERE relname = 'dose_log' AND relkind = 'p'"
+    ).first() is not None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or _is_partitioned(conn):
+        return
+
+    # Keep the id sequence alive when the old table is dropped
+    conn.exec_driver_sql("ALTER SEQUENCE dose_log_id_seq OWNED BY NONE")
+    conn.exec_driver_sql("ALTER TABLE dose_log RENAME TO dose_log_unpartitioned")
+    for name in ("ix_dose_log_taken_at", "ix_dose_log_rx_taken_at_was_taken", "uq_dose_log_rx_day"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    conn.exec_driver_sql("ALTER TABLE dose_log_unpartitioned RENAME CONSTRAINT dose_log_pkey TO dose_log_unpartitioned_pkey")
+
+    # The partition key must be part of the primary key, and so NOT NULL
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE dose_log (
+            id INTEGER NOT NULL DEFAULT nextval('dose_log_id_seq'),
+            prescription_id INTEGER NOT NULL REFERENCES prescription (id),
+            taken_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            was_taken BOOLEAN,
+            notes VARCHAR(255),
+            PRIMARY KEY (id, taken_at)
+        ) PARTITION BY RANGE (taken_at)
+        """
+    )
+    conn.exec_driver_sql("ALTER SEQUENCE dose_log_id_seq OWNED BY dose_log.id")
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS dose_log_default PARTITION OF dose_log DEFAULT")
+    for ddl in INDEXES:
+        conn.exec_driver_sql(ddl)
+
+    oldest = conn.exec_driver_sql("SELECT min(taken_at) FROM dose_log_unpartitioned").scalar()
+    today = date.today()
+    month = date(oldest.year, oldest.month, 1) if oldest else date(today.year, today.month, 1)
+    last = _add_months(date(today.year, today.month, 1), 2)
+    while month <= last:
+        name = f"dose_log_p{month.year:04d}_{month.month:02d}"
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF dose_log "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{name}_rx_day ON {name} (prescription_id, ((taken_at)::date))"
+        )
+        month = _add_months(month, 1)
+
+    conn.exec_driver_sql(
+        """
+        INSERT INTO dose_log (id, prescription_id, taken_at, was_taken, notes)
+        SELECT id, prescription_id, COALESCE(taken_at, now() AT TIME ZONE 'utc'), was_taken, notes
+        FROM dose_log_unpartitioned
+        """
+    )
+    conn.exec_driver_sql("DROP TABLE dose_log_unpartitioned")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not _is_partitioned(conn):
+        return
+
+    conn.exec_driver_sql("ALTER SEQUENCE dose_log_id_seq OWNED BY NONE")
+    conn.exec_driver_sql("ALTER TABLE dose_log RENAME TO dose_log_partitioned")
+    for name in ("ix_dose_log_taken_at", "ix_dose_log_rx_taken_at_was_taken"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE dose_log (
+            id INTEGER NOT NULL DEFAULT nextval('dose_log_id_seq') PRIMARY KEY,
+            prescription_id INTEGER NOT NULL REFERENCES prescription (id),
+            taken_at TIMESTAMP WITHOUT TIME ZONE,
+            was_taken BOOLEAN,
+            notes VARCHAR(255)
+        )
+        """
+    )
+    conn.exec_driver_sql("ALTER SEQUENCE dose_log_id_seq OWNED BY dose_log.id")
+    conn.exec_driver_sql(
+        "INSERT INTO dose_log (id, prescription_id, taken_at, was_taken, notes) "
+        "SELECT id, prescription_id, taken_at, was_taken, notes FROM dose_log_partitioned"
+    )
+    conn.exec_driver_sql("DROP TABLE dose_log_partitioned CASCADE")
+    for ddl in INDEXES:
+        conn.exec_driver_sql(ddl)
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_dose_log_rx_day ON dose_log (prescription_id, date(taken_at))"
+    )
@@ -6,6 +6,11 @@ ROOT = pathlib.Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+# Never point the suite at a real database file
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# ...nor keep rate-limit counters between runs
+os.environ.setdefault("RATE_LIMIT_STORAGE", "memory://")
+
 try:
     from app import create_app
     APP_FACTORY = True
@@ -28,3 +33,13 @@ def app():
 def client(app):
     """Standard Flask test client fixture."""
     return app.test_client()
+
+@pytest.fixture()
+def db_session(app):
+    """Fresh in-memory schema per test, for service-level checks."""
+    from app import db
+    with app.app_context():
+        db.create_all()
+        yield db.session
+        db.session.remove()
+        db.drop_all()
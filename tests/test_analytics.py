@@ -0,0 +1,57 @@
+# tests/test_analytics.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def test_pdc_mpr_snapshot_series_and_api(db_session, client):
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Patient, Medication, Prescription, DoseLog, PrescriptionAdherenceMetric
+    from app.services.analytics import nightly_snapshot, prescription_series
+
+    user = User(username="cm", email="cm@example.com", password_hash=generate_password_hash("pw"))
+    p = Patient(first_name="Pat", last_name="Daily")
+    med = Medication(name="Metformin")
+    db_session.add_all([user, p, med])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=2,
+                      start_date=date(2026, 1, 1))
+    old = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                       start_date=date(2025, 1, 1), end_date=date(2025, 10, 1))
+    db_session.add_all([rx, old])
+    db_session.flush()
+    # Full doses every March day except every 5th, when only one of two was taken
+    for day in range(1, 32):
+        for dose in range(1 if day % 5 == 0 else 2):
+            db_session.add(DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 3, day, 8 + dose * 10),
+                                   was_taken=True))
+    db_session.commit()
+
+    as_of = date(2026, 3, 31)
+    assert nightly_snapshot(as_of) == 1  # the long-ended prescription is out of the horizon
+    m = db_session.get(PrescriptionAdherenceMetric, rx.id)
+    # 7d: 25th-31st, 25th and 30th short. 30d: Mar 2-31, six short days. 90d: Jan 1 - Mar 31
+    assert (m.pdc_7, m.pdc_30, m.pdc_90) == (71.4, 80.0, 27.8)
+    assert (m.mpr_30, m.mpr_90) == (90.0, 31.1)
+
+    days, series = prescription_series([rx.id], days=31, as_of=as_of)
+    s = series[rx.id]
+    assert days[0] == date(2026, 3, 1) and days[-1] == as_of
+    # The series' last point is the snapshot; prefix sums and grouped SQL agree
+    assert (s["pdc"][7][-1], s["pdc"][30][-1], s["pdc"][90][-1]) == (m.pdc_7, m.pdc_30, m.pdc_90)
+    assert (s["mpr"][30][-1], s["mpr"][90][-1]) == (m.mpr_30, m.mpr_90)
+    assert s["pdc"][7][6] == 85.7  # Mar 1-7: only the 5th short
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    assert client.get("/reports").status_code == 200
+    r = client.get("/api/analytics/patients?draw=1&start=0&length=10")
+    body = r.get_json()
+    assert body["recordsTotal"] == 1 and body["asOf"] == "2026-03-31"
+    assert body["data"][0][:5] == ["Daily, Pat", 1, "80.0%", "27.8%", "31.1%"]
+
+    r = client.get(f"/api/analytics/patients/{p.id}?days=7&as_of=2026-03-31")
+    body = r.get_json()
+    assert body["days"][-1] == "2026-03-31" and body["pdc"]["30"][-1] == 80.0
+    assert str(old.id) in body["prescriptions"]  # series still cover ended prescriptions (all None)
+    assert client.get("/api/analytics/prescriptions/999").status_code == 404
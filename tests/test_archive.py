@@ -0,0 +1,159 @@
+# tests/test_archive.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _seed(session):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2026, 1, 1))
+    session.add(rx)
+    session.flush()
+    # One log every 3 days, January through June 2026
+    session.add_all([DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 1, 1, 9) + timedelta(days=3 * i),
+                             notes=f"n{i}") for i in range(60)])
+    session.commit()
+    return rx
+
+def test_archive_moves_closed_months_and_keeps_rollup(app, db_session, tmp_path):
+    from sqlalchemy import func
+    from app.models import DoseLog, DoseDailyRollup
+    from app.services.archive import archive_closed_months, archived_months, iter_archived
+    from app.services.export import dose_log_rows
+    rx = _seed(db_session)
+    rollup_before = db_session.query(func.sum(DoseDailyRollup.taken_count)).scalar()
+
+    app.config["DOSE_LOG_ARCHIVE_DIR"] = str(tmp_path)
+    try:
+        done = archive_closed_months(today=date(2026, 6, 15), hot_months=3)
+        logger.info("archived %s", done)
+        assert list(done) == ["2026-01", "2026-02"]
+        assert archived_months() == [date(2026, 1, 1), date(2026, 2, 1)]
+
+        # Hot table keeps March onwards; the rollup still covers everything
+        assert db_session.query(func.min(DoseLog.taken_at)).scalar() >= datetime(2026, 3, 1)
+        assert db_session.query(func.sum(DoseDailyRollup.taken_count)).scalar() == rollup_before
+
+        feb = list(iter_archived(date(2026, 2, 1), date(2026, 2, 28), prescription_ids=[rx.id]))
+        assert feb and all(r["taken_at"].month == 2 for r in feb)
+
+        # Re-running is a no-op, and exports can stitch cold + hot back together
+        assert archive_closed_months(today=date(2026, 6, 15), hot_months=3) == {}
+        exported = [r["notes"] for r in dose_log_rows(include_archived=True)]
+        assert exported == [f"n{i}" for i in range(60)]
+    finally:
+        app.config.pop("DOSE_LOG_ARCHIVE_DIR")
+
+def test_rebuild_keeps_archived_months(app, db_session, tmp_path):
+    from app.models import Patient, Prescription, DoseLog, DoseDailyRollup
+    from app.services.archive import archive_closed_months
+    from app.services.rollup import rebuild_daily_rollup
+    rx = _seed(db_session)
+    la = Patient(first_name="Lou", last_name="West", timezone="America/Los_Angeles")
+    db_session.add(la)
+    db_session.flush()
+    rx_la = Prescription(patient_id=la.id, medication_id=rx.medication_id, dosage="1",
+                         frequency_per_day=1, start_date=date(2026, 1, 1))
+    db_session.add(rx_la)
+    db_session.flush()
+    # Both are Feb 28 in Los Angeles, one on each side of the March cutoff
+    db_session.add_all([DoseLog(prescription_id=rx_la.id, taken_at=datetime(2026, 2, 28, 20)),
+                        DoseLog(prescription_id=rx_la.id, taken_at=datetime(2026, 3, 1, 3), was_taken=False),
+                        DoseLog(prescription_id=rx_la.id, taken_at=datetime(2026, 1, 10, 20))])
+    db_session.commit()
+    snapshot = lambda: sorted((r.prescription_id, r.day, r.taken_count, r.missed_count)
+                              for r in DoseDailyRollup.query.all())
+    before = snapshot()
+
+    app.config["DOSE_LOG_ARCHIVE_DIR"] = str(tmp_path)
+    try:
+        archive_closed_months(today=date(2026, 6, 15), hot_months=3)
+        rebuild_daily_rollup()
+        assert snapshot() == before
+        rebuild_daily_rollup([rx_la.id])
+        assert snapshot() == before
+        assert (rx_la.id, date(2026, 2, 28), 1, 1) in before
+    finally:
+        app.config.pop("DOSE_LOG_ARCHIVE_DIR")
+
+def test_archive_files_stay_sorted_across_runs(app, db_session, tmp_path):
+    from collections import namedtuple
+    from app.services.archive import _read, _write_month, archive_path, iter_archived
+    Row = namedtuple("Row", "id prescription_id taken_at was_taken notes")
+    month = date(2026, 1, 1)
+    first = [Row(1, 1, datetime(2026, 1, 5), True, None), Row(3, 1, datetime(2026, 1, 20), True, None)]
+    # A retried run re-sends row 3 next to rows that sort before and between
+    second = [Row(4, 1, datetime(2026, 1, 2), False, None), Row(2, 1, datetime(2026, 1, 10), True, None),
+              Row(3, 1, datetime(2026, 1, 20), True, None)]
+
+    app.config["DOSE_LOG_ARCHIVE_DIR"] = str(tmp_path)
+    try:
+        assert _write_month(month, iter(first)) == (2, [1, 3])
+        assert _write_month(month, iter(second)) == (2, [4, 2, 3])
+        assert [r["id"] for r in _read(archive_path(month))] == [4, 1, 2, 3]
+        assert [r["id"] for r in iter_archived(start=date(2026, 1, 6))] == [2, 3]
+    finally:
+        app.config.pop("DOSE_LOG_ARCHIVE_DIR")
+
+def test_dose_log_views_label_the_archive_cutoff(app, client, db_session, tmp_path):
+    from flask import g
+    from app.models import User
+    from app.services.archive import archive_closed_months
+    rx = _seed(db_session)
+    u = User(username="clin", email="clin@example.com", password_hash="x")
+    db_session.add(u)
+    db_session.commit()
+
+    app.config["DOSE_LOG_ARCHIVE_DIR"] = str(tmp_path)
+    try:
+        with client.session_transaction() as s:
+            s["_user_id"] = str(u.id)
+            s["_fresh"] = True
+        assert client.get("/api/dose_logs?draw=1&start=0&length=5").get_json()["archivedBefore"] is None
+
+        archive_closed_months(today=date(2026, 6, 15), hot_months=3)
+        g.pop("_login_user", None)
+        assert client.get("/api/dose_logs?draw=1&start=0&length=5").get_json()["archivedBefore"] == "2026-03-01"
+        g.pop("_login_user", None)
+        page = client.get("/dose_logs").get_data(as_text=True)
+        assert "before March 2026 are archived" in page and "archived=1" in page
+
+        with client.session_transaction() as s:
+            s["active_patient_id"] = rx.patient_id
+        for key in ("prescriptions", "active_patient", "_login_user"):
+            g.pop(key, None)
+        page = client.get("/dose-history").get_data(as_text=True)
+        assert "before March 2026 are archived" in page
+    finally:
+        app.config.pop("DOSE_LOG_ARCHIVE_DIR")
+
+def test_rows_landing_mid_archive_are_not_lost(app, db_session, tmp_path, monkeypatch):
+    from sqlalchemy import insert
+    from app.models import DoseLog
+    from app.services import archive
+    rx = _seed(db_session)
+    write_month = archive._write_month
+
+    def write_then_backfill(month, rows):
+        out = write_month(month, rows)
+        # A backdated ingest commits between the archive read and the delete
+        db_session.connection().execute(insert(DoseLog.__table__).values(
+            prescription_id=rx.id, taken_at=datetime(2026, 1, 2, 12), was_taken=True, notes="late"))
+        return out
+
+    app.config["DOSE_LOG_ARCHIVE_DIR"] = str(tmp_path)
+    try:
+        monkeypatch.setattr(archive, "_write_month", write_then_backfill)
+        archive.archive_month(date(2026, 1, 1))
+        assert [l.notes for l in DoseLog.query.filter(DoseLog.taken_at < datetime(2026, 2, 1))] == ["late"]
+
+        monkeypatch.setattr(archive, "_write_month", write_month)
+        assert archive.archive_month(date(2026, 1, 1)) == 1
+        notes = [r["notes"] for r in archive.iter_archived(end=date(2026, 1, 31))]
+        assert "late" in notes and len(notes) == 12
+    finally:
+        app.config.pop("DOSE_LOG_ARCHIVE_DIR")
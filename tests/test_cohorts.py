@@ -0,0 +1,86 @@
+# tests/test_cohorts.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def test_cohort_aggregates_follow_nightly_snapshot(db_session, client):
+    from statistics import fmean, pstdev
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import select
+    from app.models import (User, Patient, Medication, Prescription, DoseLog, CohortAdherence,
+                            CohortAdherenceBucket, PrescriptionAdherenceMetric)
+    from app.services.analytics import nightly_snapshot
+    from app.services.cohorts import cohort_distribution, rebuild_cohorts
+
+    user = User(username="co", email="co@example.com", password_hash=generate_password_hash("pw"))
+    p = Patient(first_name="Cora", last_name="Hort")
+    met = Medication(name="Metformin", strength="500 mg")
+    lis = Medication(name="Lisinopril", strength="10 mg")
+    db_session.add_all([user, p, met, lis])
+    db_session.flush()
+    # Eight prescriptions over two medications and two start quarters, each
+    # taking a different share of its days
+    rxs = []
+    for k in range(8):
+        rx = Prescription(patient_id=p.id, medication_id=(met, lis)[k % 2].id, dosage="1",
+                          frequency_per_day=1, start_date=date(2025, 11, 1) if k < 4 else date(2026, 1, 10))
+        db_session.add(rx)
+        db_session.flush()
+        rxs.append(rx)
+        for day in range(0, 90, k + 1):
+            db_session.add(DoseLog(prescription_id=rx.id, was_taken=True,
+                                   taken_at=datetime(2026, 1, 1, 9) + timedelta(days=day)))
+    db_session.commit()
+
+    as_of = date(2026, 3, 31)
+    nightly_snapshot(as_of, batch_size=3)
+
+    def snapshot_values(med=None, cohort_start=None):
+        stmt = (select(PrescriptionAdherenceMetric.pdc_90)
+                .join(Prescription, Prescription.id == PrescriptionAdherenceMetric.prescription_id))
+        if med:
+            stmt = stmt.where(Prescription.medication_id == med.id)
+        if cohort_start:
+            stmt = stmt.where(Prescription.start_date == cohort_start)
+        return list(db_session.scalars(stmt))
+
+    def check(dist, values):
+        assert dist["prescriptions"] == len(values)
+        assert dist["mean"] == round(fmean(values), 1)
+        assert abs(dist["stddev"] - pstdev(values)) < 0.1
+        assert dist["adherent_share"] == round(100.0 * sum(v >= 80 for v in values) / len(values), 1)
+        assert sum(b["count"] for b in dist["histogram"]) == len(values)
+
+    check(cohort_distribution(), snapshot_values())
+    check(cohort_distribution(medication_id=met.id), snapshot_values(met))
+    check(cohort_distribution(name="metformin", strength="500 MG", cohort="2026Q1"),
+          snapshot_values(met, date(2026, 1, 10)))
+    assert cohort_distribution(cohort="2024Q1")["prescriptions"] == 0
+
+    def tables():
+        return (sorted(tuple(r) for r in db_session.execute(select(CohortAdherence.__table__))),
+                sorted(tuple(r) for r in db_session.execute(select(CohortAdherenceBucket.__table__))))
+
+    # New doses, a prescription that ends and drops out, then a second pass:
+    # the incremental tables match a rebuild from scratch
+    for day in range(90, 110):
+        db_session.add(DoseLog(prescription_id=rxs[7].id, was_taken=True,
+                               taken_at=datetime(2026, 1, 1, 9) + timedelta(days=day)))
+    rxs[0].end_date = date(2026, 1, 1)
+    db_session.commit()
+    nightly_snapshot(date(2026, 4, 20), batch_size=3)
+    incremental = tables()
+    assert len(incremental[0]) == 4
+    rebuild_cohorts()
+    assert tables() == incremental
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    body = client.get(f"/api/cohorts/distribution?medication_id={lis.id}&cohort=2025q4").get_json()
+    assert body["cohort"] == "2025Q4" and body["prescriptions"] == 2
+    assert client.get("/api/cohorts/distribution?cohort=Q1").status_code == 400
+    body = client.get(f"/api/cohorts/medications/{met.id}").get_json()
+    assert [c["cohort"] for c in body["cohorts"]] == ["2025Q4", "2026Q1"]
+    row = client.get("/api/medications?draw=1&start=0&length=10&search[value]=metformin").get_json()["data"][0]
+    assert row[3] == f"{cohort_distribution(medication_id=met.id)['mean']:.1f}%"
@@ -0,0 +1,24 @@
+# tests/test_dashboard.py
+import logging
+from datetime import date
+logger = logging.getLogger(__name__)
+
+def test_dashboard_blocks_are_cached_and_invalidated_on_commit(app, db_session):
+    from app.models import Patient, Medication
+    from app.services import dashboard
+    dashboard.invalidate()
+
+    db_session.add_all([Patient(first_name="Ada", last_name="Test"), Medication(name="Metformin")])
+    db_session.commit()
+    first = dashboard.dashboard_data(date(2026, 1, 1))
+    logger.info("counts: %s/%s/%s", first["patient_count"], first["med_count"], first["rx_count"])
+    assert (first["patient_count"], first["med_count"]) == (1, 1)
+    assert first["patient_choices"] == [(1, "Test, Ada")]
+
+    # A Medication write leaves the patient blocks cached but refreshes counts
+    assert dashboard._cache.get(("patient_choices", date(2026, 1, 1))) is not None
+    db_session.add(Medication(name="Lisinopril"))
+    db_session.commit()
+    assert dashboard._cache.get(("patient_choices", date(2026, 1, 1))) is not None
+    assert dashboard._cache.get(("counts", date(2026, 1, 1))) is None
+    assert dashboard.dashboard_data(date(2026, 1, 1))["med_count"] == 2
@@ -0,0 +1,65 @@
+# tests/test_dose_history.py
+import logging
+import re
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _seed(session):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2025, 11, 1))
+    session.add(rx)
+    session.flush()
+    # 90 daily logs from Nov 2025 into Jan 2026, every 10th one missed
+    session.add_all([DoseLog(prescription_id=rx.id, taken_at=datetime(2025, 11, 1, 9) + timedelta(days=i),
+                             was_taken=(i % 10 != 0), notes=f"n{i}") for i in range(90)])
+    session.commit()
+    return p
+
+def test_history_pages_with_month_summaries(client, db_session, monkeypatch):
+    from app.services import history
+    monkeypatch.setattr(history, "PAGE_SIZE", 40)
+    p = _seed(db_session)
+    with client.session_transaction() as s:
+        s["active_patient_id"] = p.id
+
+    seen, cursor, pages = [], "", 0
+    while True:
+        pages += 1
+        r = client.get(f"/dose-history?partial=1&cursor={cursor}" if cursor else "/dose-history")
+        html = r.get_data(as_text=True)
+        seen += re.findall(r"<td>(n\d+)</td>", html)
+        cursor = re.search(r'data-cursor="([^"]*)"', html).group(1)
+        if pages == 1:
+            # Newest month first, summary covers the whole month from the rollup
+            assert "January 2026" in html
+            assert "27 taken, 2 missed" in html
+        if not cursor:
+            break
+    logger.info("pages=%d rows=%d", pages, len(seen))
+    assert pages == 3
+    assert seen == [f"n{i}" for i in range(89, -1, -1)]
+
+def test_history_shows_times_in_the_patients_zone(db_session):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    from app.services.history import history_page, group_by_month
+    p = Patient(first_name="Lou", last_name="West", timezone="America/Los_Angeles")
+    m = Medication(name="Metformin")
+    db_session.add_all([p, m])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2026, 1, 1))
+    db_session.add(rx)
+    db_session.flush()
+    db_session.add(DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 2, 1, 3), was_taken=True))
+    db_session.commit()
+
+    rows, _ = history_page(p.id)
+    months = group_by_month(p.id, rows, p.timezone)
+    # 03:00 UTC on Feb 1 is the evening of Jan 31 in Los Angeles
+    assert list(months) == ["2026-01"]
+    assert months["2026-01"]["rows"][0]["local_at"] == datetime(2026, 1, 31, 19)
@@ -0,0 +1,50 @@
+# tests/test_dose_logs_api.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _login_clinician(client, session):
+    from app.models import User
+    u = User(username="clin", email="clin@example.com", password_hash="x")
+    session.add(u)
+    session.commit()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(u.id)
+        s["_fresh"] = True
+
+def _seed_logs(session, n):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin", strength="500 mg")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1 tablet",
+                      frequency_per_day=1, start_date=date.today() - timedelta(days=n))
+    session.add(rx)
+    session.flush()
+    base = datetime(2026, 1, 1, 8, 0)
+    # pairs of identical timestamps exercise the id tie-breaker
+    session.add_all([DoseLog(prescription_id=rx.id, taken_at=base + timedelta(hours=i // 2),
+                             notes=f"log {i}") for i in range(n)])
+    session.commit()
+
+def test_keyset_pages_match_offset_pages(client, db_session):
+    from app.routes import _count_cache
+    _count_cache.clear()
+    _login_clinician(client, db_session)
+    _seed_logs(db_session, 23)
+
+    offset_rows, keyset_rows, cursor = [], [], None
+    for page in range(3):
+        r = client.get(f"/api/dose_logs?draw={page + 1}&start={page * 10}&length=10")
+        offset_rows += [row[4] for row in r.get_json()["data"]]
+        url = "/api/dose_logs?draw=1&start=0&length=10" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        keyset_rows += [row[4] for row in body["data"]]
+        cursor = body["nextCursor"]
+        logger.info("page=%s recordsTotal=%s nextCursor=%s", page, body["recordsTotal"], cursor)
+
+    assert len(offset_rows) == 23
+    assert keyset_rows == offset_rows
+    assert cursor is None
+    assert body["recordsTotal"] == 23
@@ -0,0 +1,148 @@
+# tests/test_doses.py
+import logging
+from datetime import date, datetime
+logger = logging.getLogger(__name__)
+
+def test_dose_slot_makes_taps_idempotent(db_session, client):
+    from app.models import Patient, Medication, Prescription, DoseLog, DoseSlot, DoseDailyRollup, \
+        PatientAdherenceWindow
+    from app.services.doses import log_dose
+    from app.utils.timeutils import patient_today
+
+    zone = "America/Los_Angeles"
+    p = Patient(first_name="Ida", last_name="Empotent", timezone=zone)
+    med = Medication(name="Metformin")
+    db_session.add_all([p, med])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2020, 1, 1), end_date=date(2099, 1, 1))
+    db_session.add(rx)
+    db_session.commit()
+
+    # 02:00 UTC on the 10th is the evening of the 9th in Los Angeles
+    now = datetime(2026, 3, 10, 2)
+    first = log_dose(rx.id, date(2026, 3, 9), zone, was_taken=True, now=now)
+    assert first is not None
+    # Double-click, retry, and a "missed" tap for the same local day are all no-ops
+    assert log_dose(rx.id, date(2026, 3, 9), zone, was_taken=True, now=now) is None
+    assert log_dose(rx.id, date(2026, 3, 9), zone, was_taken=False, now=datetime(2026, 3, 10, 6)) is None
+    assert [l.id for l in DoseLog.query.all()] == [first]
+    rollup = DoseDailyRollup.query.one()
+    assert (rollup.day, rollup.taken_count, rollup.missed_count) == (date(2026, 3, 9), 1, 0)
+    assert db_session.get(PatientAdherenceWindow, p.id).taken_count == 1
+
+    # A day that already has a log (device feed, or logged before slots existed) is taken too
+    db_session.add(DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 3, 10, 18), was_taken=True))
+    db_session.commit()
+    assert log_dose(rx.id, date(2026, 3, 10), zone, was_taken=False, now=datetime(2026, 3, 10, 20)) is None
+    assert log_dose(rx.id, date(2026, 3, 11), zone, was_taken=False, now=datetime(2026, 3, 11, 20)) is not None
+    assert DoseSlot.query.count() == 2
+
+    # Through the route: the second tap today is refused
+    with client.session_transaction() as sess:
+        sess["active_patient_id"] = p.id
+    for _ in range(2):
+        assert client.get(f"/medications/take/{rx.id}").status_code == 302
+    today = patient_today(zone)
+    assert db_session.get(DoseSlot, (rx.id, today, 1)) is not None
+    assert DoseLog.query.filter(DoseLog.notes == "Taken today").count() == 1
+
+def _upgrade_legacy_schema(session):
+    """Give the test schema the legacy one-log-per-UTC-day index, then run add_dose_slot over it."""
+    import importlib.util
+    import pathlib
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    # A database that went through seed_and_hardening still has the legacy index
+    session.connection().exec_driver_sql(
+        "CREATE UNIQUE INDEX uq_dose_log_rx_day ON dose_log (prescription_id, date(taken_at))"
+    )
+    session.commit()
+    path = pathlib.Path(__file__).resolve().parents[1] / "migrations" / "versions" / "add_dose_slot.py"
+    spec = importlib.util.spec_from_file_location("add_dose_slot", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with Operations.context(MigrationContext.configure(session.connection())):
+        migration.upgrade()
+    session.commit()
+
+def test_add_dose_slot_drops_the_utc_day_index(db_session):
+    from sqlalchemy import inspect
+    from app.models import Patient, Medication, Prescription, DoseLog
+    from app.services.doses import log_dose
+
+    _upgrade_legacy_schema(db_session)
+    assert "uq_dose_log_rx_day" not in {ix["name"] for ix in inspect(db_session.connection()).get_indexes("dose_log")}
+
+    zone = "America/Los_Angeles"
+    p = Patient(first_name="Lou", last_name="West", timezone=zone)
+    med = Medication(name="Metformin")
+    db_session.add_all([p, med])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2026, 3, 1))
+    db_session.add(rx)
+    db_session.commit()
+    # Two local days in Los Angeles, one UTC date (the 10th)
+    assert log_dose(rx.id, date(2026, 3, 9), zone, was_taken=True, now=datetime(2026, 3, 10, 2)) is not None
+    assert log_dose(rx.id, date(2026, 3, 10), zone, was_taken=True, now=datetime(2026, 3, 10, 18)) is not None
+    assert DoseLog.query.count() == 2
+
+def test_every_daily_dose_can_be_logged(db_session, client):
+    from flask import g
+    from app.models import Patient, Medication, Prescription, DoseLog, DoseSlot, PrescriptionAdherenceMetric
+    from app.services.analytics import nightly_snapshot
+    from app.utils.timeutils import patient_today
+
+    _upgrade_legacy_schema(db_session)
+    p = Patient(first_name="Tess", last_name="Twice")
+    med = Medication(name="Metformin")
+    db_session.add_all([p, med])
+    db_session.flush()
+    today = patient_today(None)
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=2,
+                      start_date=today, end_date=today)
+    db_session.add(rx)
+    db_session.commit()
+
+    def tap(url):
+        for key in ("prescriptions", "active_patient", "_login_user"):
+            g.pop(key, None)
+        return client.get(url)
+
+    with client.session_transaction() as sess:
+        sess["active_patient_id"] = p.id
+    assert "Taken Today (0/2)" in tap("/medications").get_data(as_text=True)
+    # The page offers dose 1; a double-click re-sends it and is a no-op
+    for _ in range(2):
+        assert tap(f"/medications/take/{rx.id}?dose=1").status_code == 302
+    assert DoseLog.query.count() == 1
+    assert tap(f"/medications/take/{rx.id}?dose=2").status_code == 302
+    assert tap(f"/medications/take/{rx.id}").status_code == 302  # nothing left for today
+    assert DoseLog.query.count() == 2 and DoseSlot.query.count() == 2
+    assert "Taken Today (2/2)" in tap("/medications").get_data(as_text=True)
+
+    nightly_snapshot(today)
+    m = db_session.get(PrescriptionAdherenceMetric, rx.id)
+    assert (m.pdc_7, m.mpr_30) == (100.0, 100.0)
+
+def test_tap_without_dose_number_takes_the_lowest_free_slot(db_session):
+    from app.models import Patient, Medication, Prescription, DoseSlot
+    from app.services.doses import log_dose
+    p = Patient(first_name="Tom", last_name="Thrice")
+    med = Medication(name="Metformin")
+    db_session.add_all([p, med])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=3,
+                      start_date=date(2026, 3, 1))
+    db_session.add(rx)
+    db_session.commit()
+
+    day = date(2026, 3, 10)
+    at = lambda hour: datetime(2026, 3, 10, hour)
+    assert log_dose(rx.id, day, None, was_taken=True, now=at(8), per_day=3, dose=2) is not None
+    assert log_dose(rx.id, day, None, was_taken=True, now=at(12), per_day=3) is not None
+    assert log_dose(rx.id, day, None, was_taken=True, now=at(18), per_day=3) is not None
+    assert log_dose(rx.id, day, None, was_taken=True, now=at(20), per_day=3) is None
+    assert [s.dose for s in DoseSlot.query.order_by(DoseSlot.dose)] == [1, 2, 3]
@@ -0,0 +1,71 @@
+# tests/test_identity_cache.py
+import contextlib
+import logging
+logger = logging.getLogger(__name__)
+
+# These tests keep no app context open between requests (unlike db_session),
+# so each request gets its own session and g, as it would in production.
+@contextlib.contextmanager
+def _schema(app):
+    from app import db
+    with app.app_context():
+        db.create_all()
+    try:
+        yield db
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+def _add(app, obj):
+    from app import db
+    with app.app_context():
+        db.session.add(obj)
+        db.session.commit()
+        return obj.id
+
+def test_user_loader_is_cached_and_evicted_on_change(app, client):
+    from sqlalchemy import event
+    from app.models import User
+    with _schema(app) as db:
+        uid = _add(app, User(username="clin", email="clin@example.com", password_hash="x"))
+        with client.session_transaction() as s:
+            s["_user_id"] = str(uid)
+            s["_fresh"] = True
+
+        seen = []
+        def _count(conn, cursor, statement, *args):
+            if statement.startswith("SELECT") and "FROM user" in statement:
+                seen.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", _count)
+        try:
+            for _ in range(3):
+                assert client.get("/patients").status_code == 200
+            logger.info("user SELECTs over 3 requests: %d", len(seen))
+            assert len(seen) == 1
+
+            with app.app_context():
+                db.session.get(User, uid).password_hash = "changed"
+                db.session.commit()
+            seen.clear()
+            assert client.get("/patients").status_code == 200
+            assert len(seen) == 1
+        finally:
+            event.remove(engine, "before_cursor_execute", _count)
+
+def test_deleted_patient_session_is_dropped(app, client):
+    from app.models import Patient
+    with _schema(app) as db:
+        pid = _add(app, Patient(first_name="Ada", last_name="Test"))
+        with client.session_transaction() as s:
+            s["active_patient_id"] = pid
+        assert client.get("/medications").status_code == 200
+
+        with app.app_context():
+            db.session.delete(db.session.get(Patient, pid))
+            db.session.commit()
+        r = client.get("/medications", follow_redirects=False)
+        assert r.status_code == 302
+        with client.session_transaction() as s:
+            assert "active_patient_id" not in s
@@ -0,0 +1,97 @@
+# tests/test_ingest.py
+import json
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _seed_rx(session):
+    from app.models import Patient, Medication, Prescription
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=2,
+                      start_date=date.today() - timedelta(days=10))
+    session.add(rx)
+    session.commit()
+    return rx
+
+def test_bulk_ndjson_requires_token(client, db_session):
+    r = client.post("/api/dose_logs/bulk", data=b"{}\n", content_type="application/x-ndjson")
+    logger.info("anonymous bulk POST -> %s", r.status_code)
+    assert r.status_code == 401
+
+def test_bulk_ndjson_validates_dedupes_and_updates_rollup(app, client, db_session):
+    from app.models import DoseLog, DoseDailyRollup
+    rx = _seed_rx(db_session)
+    app.config["INGEST_API_TOKENS"] = ["device-token"]
+    ts = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0)
+    lines = [
+        {"prescription_id": rx.id, "taken_at": ts.isoformat() + "Z", "was_taken": True},
+        {"prescription_id": rx.id, "taken_at": ts.isoformat() + "Z"},                       # duplicate in stream
+        {"prescription_id": rx.id, "taken_at": (ts + timedelta(hours=8)).isoformat(), "was_taken": "missed"},
+        {"prescription_id": rx.id, "taken_at": (ts - timedelta(days=30)).isoformat()},      # before start
+        {"prescription_id": 999, "taken_at": ts.isoformat()},                               # unknown rx
+    ]
+    body = "\n".join(json.dumps(l) for l in lines) + "\nnot json\n"
+    try:
+        r = client.post("/api/dose_logs/bulk", data=body, content_type="application/x-ndjson",
+                        headers={"Authorization": "Bearer device-token"})
+    finally:
+        app.config["INGEST_API_TOKENS"] = []
+    payload = r.get_json()
+    logger.info("summary=%s", payload["summary"])
+    assert r.status_code == 200
+    assert [x["status"] for x in payload["results"]] == [
+        "inserted", "duplicate", "inserted", "invalid", "invalid", "invalid"]
+    assert payload["summary"] == {"received": 6, "inserted": 2, "duplicate": 1, "invalid": 3}
+    assert DoseLog.query.count() == 2
+    day = DoseDailyRollup.query.filter_by(prescription_id=rx.id, day=ts.date()).one()
+    assert day.taken_count == 1
+
+def test_csv_replay_is_idempotent(db_session):
+    import io
+    from app.models import DoseLog
+    from app.services.ingest import parse_records, ingest_dose_events
+    rx = _seed_rx(db_session)
+    ts = (datetime.utcnow() - timedelta(days=2)).replace(microsecond=0).isoformat()
+    feed = f"prescription_id,taken_at,was_taken,notes\n{rx.id},{ts},yes,pharmacy fill\n".encode()
+
+    first = list(ingest_dose_events(parse_records(io.BytesIO(feed), "csv")))
+    second = list(ingest_dose_events(parse_records(io.BytesIO(feed), "csv")))
+    assert [r["status"] for r in first] == ["inserted"]
+    assert [r["status"] for r in second] == ["duplicate"]
+    assert DoseLog.query.count() == 1
+
+def test_bad_field_types_are_per_record_errors(app, client, db_session):
+    from app.models import DoseLog, User
+    from werkzeug.security import generate_password_hash
+    rx = _seed_rx(db_session)
+    ts = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0).isoformat()
+    lines = [
+        {"prescription_id": rx.id, "taken_at": ts, "notes": 42},
+        {"prescription_id": rx.id, "taken_at": ts, "notes": {"a": 1}},
+        {"prescription_id": rx.id + 0.5, "taken_at": ts},
+        {"prescription_id": True, "taken_at": ts},
+        {"prescription_id": str(rx.id), "taken_at": ts, "notes": "ok"},
+    ]
+    body = "\n".join(json.dumps(l) for l in lines) + "\n"
+    app.config["INGEST_API_TOKENS"] = ["device-token"]
+    try:
+        r = client.post("/api/dose_logs/bulk", data=body, content_type="application/x-ndjson",
+                        headers={"Authorization": "Bearer device-token"})
+    finally:
+        app.config["INGEST_API_TOKENS"] = []
+    assert r.status_code == 200
+    assert [x["status"] for x in r.get_json()["results"]] == ["invalid"] * 4 + ["inserted"]
+    assert DoseLog.query.count() == 1
+
+    # A clinician session is accepted only with the CSRF token (cross-site text/plain POSTs are refused)
+    user = User(username="doc", email="doc@example.com", password_hash=generate_password_hash("pw"))
+    db_session.add(user)
+    db_session.commit()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    r = client.post("/api/dose_logs/bulk", data=body, content_type="text/plain")
+    assert r.status_code == 400 and b"CSRF" in r.data and DoseLog.query.count() == 1
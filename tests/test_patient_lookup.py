@@ -0,0 +1,45 @@
+# tests/test_patient_lookup.py
+import logging
+from datetime import date
+logger = logging.getLogger(__name__)
+
+def test_ssn_lookup_ignores_formatting_and_is_keyed(app):
+    from app.models import Patient
+    with app.app_context():
+        dashed = Patient.ssn_lookup_for("123-45-6789")
+        plain = Patient.ssn_lookup_for("123456789")
+        logger.info("lookup=%s", dashed)
+        assert dashed == plain
+        assert "123456789" not in dashed
+        assert len(dashed) == 64
+
+def test_set_ssn_populates_indexed_lookup(db_session):
+    from app.models import Patient
+    p = Patient(first_name="John", last_name="Doe", dob=date(1990, 5, 15))
+    p.set_ssn("123-45-6789")
+    db_session.add(p)
+    db_session.commit()
+    found = Patient.query.filter(
+        Patient.ssn_lookup == Patient.ssn_lookup_for("123-45-6789"),
+        Patient.dob == date(1990, 5, 15),
+    ).all()
+    assert [x.id for x in found] == [p.id]
+    assert p.ssn_last4 == "6789"
+
+def test_login_survives_lookup_key_rotation(db_session, client, app):
+    from app.models import Patient
+    p = Patient(first_name="Rosa", last_name="Tate", dob=date(1985, 2, 3))
+    p.set_ssn("987-65-4321")
+    db_session.add(p)
+    db_session.commit()
+    stale = p.ssn_lookup
+
+    old_key = app.config["SSN_LOOKUP_KEY"]
+    app.config.update(SSN_LOOKUP_KEY="rotated", WTF_CSRF_ENABLED=False)
+    try:
+        r = client.post("/", data={"ssn_full": "987-65-4321", "dob": "1985-02-03"})
+        assert r.status_code == 302 and "/medications" in r.headers["Location"]
+        db_session.refresh(p)
+        assert p.ssn_lookup == Patient.ssn_lookup_for("987654321") != stale
+    finally:
+        app.config.update(SSN_LOOKUP_KEY=old_key, WTF_CSRF_ENABLED=True)
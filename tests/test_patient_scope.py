@@ -13,3 +13,115 @@ def test_static_is_accessible_without_auth(client):
     r = client.get("/static/styles.css")
     logger.info("Received status=%s", r.status_code)
     assert r.status_code in (200, 404), f"Expected 200/404; got {r.status_code}"
+
+def test_action_routes_load_prescription_in_one_scoped_query(db_session, client, app):
+    import re
+    from datetime import date
+    from flask import g
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Patient, Medication, Prescription, DoseLog
+
+    user = User(username="rx", email="rx@example.com", password_hash=generate_password_hash("pw"))
+    mine, other = Patient(first_name="Mia", last_name="Mine"), Patient(first_name="Oto", last_name="Other")
+    med = Medication(name="Metformin", strength="500 mg")
+    db_session.add_all([user, mine, other, med])
+    db_session.flush()
+    rx = Prescription(patient_id=mine.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2020, 1, 1), end_date=date(2099, 1, 1))
+    theirs = Prescription(patient_id=other.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                          start_date=date(2020, 1, 1), end_date=date(2099, 1, 1))
+    db_session.add_all([rx, theirs])
+    db_session.commit()
+
+    def send(method, url):
+        # Requests reuse the fixture's app context, so drop what g memoized last time
+        for key in ("prescriptions", "active_patient", "_login_user"):
+            g.pop(key, None)
+        db_session.expire_all()
+        r = client.open(url, method=method)
+        logger.info("%s %s -> %s %s", method, url, r.status_code, r.headers.get("Server-Timing"))
+        return r.status_code, int(re.search(r'"(\d+) queries"', r.headers["Server-Timing"]).group(1))
+
+    with client.session_transaction() as sess:
+        sess["active_patient_id"] = mine.id
+    send("GET", "/medications")  # warm the patient identity cache
+    # Someone else's prescription looks exactly like a missing one: one query either way
+    assert send("GET", f"/medications/take/{theirs.id}") == (404, 1)
+    assert send("GET", "/medications/take/999") == (404, 1)
+    # Joined load; the rest is log_dose: slot claim, log, rollup, projection
+    # (owner lookup + upsert) and the search index (delete + insert)
+    status, take_queries = send("GET", f"/medications/take/{rx.id}")
+    assert status == 302 and DoseLog.query.count() == 1 and take_queries <= 8
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    try:
+        # Joined load, then the UPDATE
+        assert send("POST", f"/medications/reminder/{rx.id}") == (302, 2)
+        assert send("POST", f"/medications/reminder/{theirs.id}") == (404, 1)
+        with client.session_transaction() as sess:
+            sess.pop("active_patient_id")
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        send("GET", "/clinic_dashboard")  # warm the user identity cache
+        assert send("POST", f"/clinic/reminder/{theirs.id}") == (302, 2)
+    finally:
+        app.config["WTF_CSRF_ENABLED"] = True
+    assert db_session.get(Prescription, rx.id).reminder_enabled
+    assert db_session.get(Prescription, theirs.id).reminder_last_sent_date is not None
+
+def test_medications_page_is_one_query(db_session, client):
+    import re
+    from datetime import date, timedelta
+    from flask import g, template_rendered
+    from app.models import Patient, Medication, Prescription, DoseLog
+
+    p = Patient(first_name="Pia", last_name="Page")
+    db_session.add(p)
+    db_session.flush()
+    rxs = []
+    for i in range(7):
+        med = Medication(name=f"Med{i}")
+        db_session.add(med)
+        db_session.flush()
+        rxs.append(Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                                start_date=date(2020, 1, 1), end_date=date(2099, 1, 1)))
+    db_session.add_all(rxs)
+    db_session.flush()
+    from app.utils.timeutils import local_day_range, patient_today
+    now = local_day_range(patient_today(None), None)[0] + timedelta(minutes=5)  # early today, UTC
+    # Med0: taken then later marked missed (latest wins); Med1: taken; yesterday doesn't count for Med2
+    db_session.add_all([
+        DoseLog(prescription_id=rxs[0].id, taken_at=now - timedelta(seconds=2), was_taken=True),
+        DoseLog(prescription_id=rxs[0].id, taken_at=now - timedelta(seconds=1), was_taken=False),
+        DoseLog(prescription_id=rxs[1].id, taken_at=now, was_taken=True),
+        DoseLog(prescription_id=rxs[2].id, taken_at=now - timedelta(days=2), was_taken=True),
+    ])
+    db_session.commit()
+
+    with client.session_transaction() as sess:
+        sess["active_patient_id"] = p.id
+    rendered = []
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+
+    def page(n):
+        for key in ("active_patient", "_login_user"):  # the fixture's app context outlives requests
+            g.pop(key, None)
+        r = client.get(f"/medications?page={n}")
+        assert r.status_code == 200
+        return rendered[-1], int(re.search(r'"(\d+) queries"', r.headers["Server-Timing"]).group(1))
+
+    template_rendered.connect(record)
+    try:
+        page(1)  # warm the patient identity cache
+        ctx, queries = page(1)
+        assert queries == 1 and ctx["total"] == 7 and ctx["pages"] == 2
+        assert [med.name for _, med in ctx["items"]] == [f"Med{i}" for i in range(5)]
+        assert ctx["clicked_today"] == {rxs[0].id: "missed", rxs[1].id: "taken"}
+        assert [ctx["has_logged_today"][rx.id] for rx in rxs[:5]] == [True, True, False, False, False]
+        ctx, _ = page(2)
+        assert [med.name for _, med in ctx["items"]] == ["Med5", "Med6"] and ctx["total"] == 7
+        ctx, _ = page(9)
+        assert ctx["items"] == [] and ctx["total"] == 7
+    finally:
+        template_rendered.disconnect(record)
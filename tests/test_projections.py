@@ -0,0 +1,89 @@
+# tests/test_projections.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _seed(session):
+    from app.models import Patient, Medication, Prescription
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=1,
+                      start_date=date.today() - timedelta(days=60))
+    session.add(rx)
+    session.commit()
+    return p, rx
+
+def test_projection_follows_dose_log_writes(db_session):
+    from app.models import DoseLog, PatientAdherenceWindow
+    p, rx = _seed(db_session)
+    now = datetime.utcnow()
+    db_session.add_all([
+        DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=1), was_taken=True),
+        DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=2), was_taken=False),
+        DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=45), was_taken=True),  # outside window
+    ])
+    db_session.commit()
+    db_session.add(DoseLog(prescription_id=rx.id, taken_at=now, was_taken=True))
+    db_session.commit()
+
+    row = db_session.get(PatientAdherenceWindow, p.id)
+    logger.info("projection: taken=%s total=%s adherence=%s", row.taken_count, row.total_count, row.adherence)
+    assert (row.taken_count, row.total_count) == (2, 3)
+    assert abs(row.adherence - 2 / 3) < 1e-9
+    assert row.last_activity_at == now
+
+def test_refresh_expires_logs_leaving_the_window(db_session):
+    from app.models import DoseLog, PatientAdherenceWindow
+    from app.services.projections import refresh_adherence_projection
+    p, rx = _seed(db_session)
+    now = datetime.utcnow()
+    db_session.add_all([
+        DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=29, hours=12), was_taken=False),
+        DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=3), was_taken=True),
+    ])
+    db_session.commit()
+    assert db_session.get(PatientAdherenceWindow, p.id).total_count == 2
+
+    refresh_adherence_projection(now=now + timedelta(days=1))
+    db_session.expire_all()
+    row = db_session.get(PatientAdherenceWindow, p.id)
+    assert (row.taken_count, row.total_count, row.adherence) == (1, 1, 1.0)
+
+def test_projection_follows_edited_and_deleted_logs(db_session):
+    from app.models import Patient, Prescription, DoseLog, PatientAdherenceWindow
+    p, rx = _seed(db_session)
+    other = Patient(first_name="Bo", last_name="Other")
+    db_session.add(other)
+    db_session.flush()
+    rx_other = Prescription(patient_id=other.id, medication_id=rx.medication_id, dosage="1",
+                            frequency_per_day=1, start_date=rx.start_date)
+    db_session.add(rx_other)
+    now = datetime.utcnow()
+    log = DoseLog(prescription_id=rx.id, taken_at=now - timedelta(days=1), was_taken=True)
+    db_session.add(log)
+    db_session.commit()
+
+    def counts(pid):
+        db_session.expire_all()
+        row = db_session.get(PatientAdherenceWindow, pid)
+        return (row.taken_count, row.total_count, row.adherence) if row else None
+
+    log.was_taken = False
+    db_session.commit()
+    assert counts(p.id) == (0, 1, 0.0)
+
+    # Moving the log out of the window, then to another patient
+    log.taken_at = now - timedelta(days=45)
+    db_session.commit()
+    assert counts(p.id) == (0, 0, None)
+    log.taken_at, log.prescription_id, log.was_taken = now, rx_other.id, True
+    db_session.commit()
+    assert counts(p.id) == (0, 0, None) and counts(other.id) == (1, 1, 1.0)
+
+    # A delete subtracts the flushed values even after an unflushed edit
+    log.was_taken = False
+    db_session.delete(log)
+    db_session.commit()
+    assert counts(other.id) == (0, 0, None)
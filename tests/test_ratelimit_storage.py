@@ -0,0 +1,37 @@
+# tests/test_ratelimit_storage.py
+import logging
+import time
+logger = logging.getLogger(__name__)
+
+def test_counters_are_shared_between_storage_instances(tmp_path):
+    from limits import parse
+    from limits.storage import storage_from_string
+    from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+    from app.utils.ratelimit_storage import SQLiteStorage
+
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    # Two instances on one file stand in for two gunicorn workers
+    a, b = storage_from_string(uri), storage_from_string(uri)
+    assert isinstance(a, SQLiteStorage) and a.check()
+
+    limit = parse("3/minute")
+    fixed_a, fixed_b = FixedWindowRateLimiter(a), FixedWindowRateLimiter(b)
+    assert [fixed_a.hit(limit, "1.2.3.4"), fixed_b.hit(limit, "1.2.3.4"), fixed_a.hit(limit, "1.2.3.4")] == [True] * 3
+    assert not fixed_b.hit(limit, "1.2.3.4")
+    assert fixed_a.hit(limit, "5.6.7.8")
+    stats = fixed_b.get_window_stats(limit, "1.2.3.4")
+    assert stats.remaining == 0 and stats.reset_time > time.time()
+
+    sliding_a, sliding_b = SlidingWindowCounterRateLimiter(a), SlidingWindowCounterRateLimiter(b)
+    assert sliding_a.hit(limit, "k") and sliding_b.hit(limit, "k") and sliding_a.hit(limit, "k")
+    assert not sliding_b.hit(limit, "k")
+    sliding_a.clear(limit, "k")
+    assert sliding_b.hit(limit, "k")
+
+    # An expired window starts over instead of accumulating
+    a.incr("short", expiry=0.05)
+    a.incr("short", expiry=0.05)
+    assert b.get("short") == 2
+    time.sleep(0.06)
+    assert b.get("short") == 0 and a.incr("short", expiry=60) == 1
+    assert a.reset() >= 1 and b.get("short") == 0
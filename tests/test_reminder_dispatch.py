@@ -0,0 +1,96 @@
+# tests/test_reminder_dispatch.py
+import json
+import logging
+from datetime import date, timedelta
+logger = logging.getLogger(__name__)
+
+TODAY = date(2026, 3, 10)
+
+def _seed(session):
+    from app.models import Patient, Medication, Prescription
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin", strength="500 mg")
+    session.add_all([p, m])
+    session.flush()
+    def rx(**kw):
+        base = dict(patient_id=p.id, medication_id=m.id, dosage="1 tablet", frequency_per_day=1,
+                    start_date=TODAY - timedelta(days=10), reminder_enabled=True)
+        base.update(kw)
+        return Prescription(**base)
+    rows = [
+        rx(),                                                        # due
+        rx(reminder_last_sent_date=TODAY - timedelta(days=1)),       # due
+        rx(reminder_last_sent_date=TODAY),                           # already sent today
+        rx(reminder_enabled=False),                                  # not enabled
+        rx(end_date=TODAY - timedelta(days=1)),                      # inactive
+    ]
+    session.add_all(rows)
+    session.commit()
+    return rows
+
+def test_dispatch_sends_each_due_reminder_once(app, db_session, tmp_path):
+    from app.services.reminders import dispatch_due_reminders, FileTransport
+    rows = _seed(db_session)
+    sink = tmp_path / "reminders.jsonl"
+
+    stats = dispatch_due_reminders(today=TODAY, batch_size=1, max_workers=2, transport=FileTransport(str(sink)))
+    logger.info("first run: %s", stats)
+    assert stats == {"claimed": 2, "sent": 2, "failed": 0}
+    sent = sorted(json.loads(line)["prescription_id"] for line in sink.read_text().splitlines())
+    assert sent == [rows[0].id, rows[1].id]
+
+    again = dispatch_due_reminders(today=TODAY, transport=FileTransport(str(sink)))
+    assert again["claimed"] == 0
+
+def test_failed_sends_release_their_claim(app, db_session):
+    from app.models import Prescription
+    from app.services.reminders import dispatch_due_reminders
+
+    class Broken:
+        def send(self, reminder):
+            raise ConnectionError("gateway down")
+
+    rows = _seed(db_session)
+    stats = dispatch_due_reminders(today=TODAY, transport=Broken())
+    assert stats == {"claimed": 2, "sent": 0, "failed": 2}
+    db_session.expire_all()
+    assert db_session.get(Prescription, rows[0].id).reminder_last_sent_date is None
+    assert db_session.get(Prescription, rows[1].id).reminder_last_sent_date == TODAY - timedelta(days=1)
+
+def test_default_transport_keeps_reminders_out_of_files(app, db_session, caplog):
+    from app.services.reminders import LogTransport, dispatch_due_reminders, transport_from_config
+    assert app.config["REMINDER_TRANSPORT"] == "log://"
+    assert isinstance(transport_from_config(), LogTransport)
+    _seed(db_session)
+    with caplog.at_level(logging.INFO, logger="app.services.reminders"):
+        assert dispatch_due_reminders(today=TODAY)["sent"] > 0
+    # Ids only at INFO: no patient name or medication
+    assert all("Ada" not in r.getMessage() and "Metformin" not in r.getMessage()
+               for r in caplog.records if r.levelno >= logging.INFO)
+
+def test_dispatch_uses_each_patients_local_day(app, db_session):
+    from datetime import datetime, timezone
+    from app.models import Patient, Medication, Prescription
+    from app.services.reminders import LogTransport, dispatch_due_reminders
+    utc = Patient(first_name="Uma", last_name="Zero")
+    la = Patient(first_name="Lou", last_name="West", timezone="America/Los_Angeles")
+    m = Medication(name="Metformin")
+    db_session.add_all([utc, la, m])
+    db_session.flush()
+    rx = lambda p: Prescription(patient_id=p.id, medication_id=m.id, dosage="1", frequency_per_day=1,
+                                start_date=TODAY - timedelta(days=10), reminder_enabled=True,
+                                reminder_last_sent_date=TODAY - timedelta(days=1))
+    rx_utc, rx_la = rx(utc), rx(la)
+    db_session.add_all([rx_utc, rx_la])
+    db_session.commit()
+
+    # 05:00 UTC on the 10th: already sent for the 9th in Los Angeles, where it still is
+    now = datetime(2026, 3, 10, 5, tzinfo=timezone.utc)
+    assert dispatch_due_reminders(transport=LogTransport(), now_utc=now)["sent"] == 1
+    db_session.expire_all()
+    assert (rx_utc.reminder_last_sent_date, rx_la.reminder_last_sent_date) == (TODAY, TODAY - timedelta(days=1))
+
+    later = datetime(2026, 3, 10, 9, tzinfo=timezone.utc)
+    assert dispatch_due_reminders(transport=LogTransport(), now_utc=later)["sent"] == 1
+    db_session.expire_all()
+    assert rx_la.reminder_last_sent_date == TODAY
@@ -0,0 +1,71 @@
+# tests/test_replica.py
+import logging
+logger = logging.getLogger(__name__)
+
+def test_reads_use_replica_and_writes_stick_to_primary(tmp_path, monkeypatch):
+    from sqlalchemy.orm import Session
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Patient
+    from app.utils.replica import use_replica, use_primary
+
+    # A second local SQLite file stands in for the replica; nothing replicates
+    # into it, so whichever database answered is visible in the results
+    monkeypatch.setenv("DATABASE_REPLICA_URL", f"sqlite:///{tmp_path / 'replica.db'}")
+    app = create_app()
+    app.config.update(TESTING=True, SERVER_NAME="localhost", WTF_CSRF_ENABLED=False)
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+
+    with app.app_context():
+        db.create_all()
+        replica = db.engines["replica"]
+        db.metadata.create_all(replica)
+        db.session.add(User(username="clin", email="clin@example.com", password_hash=generate_password_hash("pw")))
+        db.session.add(Patient(first_name="Primary", last_name="Only"))
+        db.session.commit()
+        user_id = db.session.scalar(db.select(User.id))
+        with Session(replica) as s:
+            s.add(Patient(first_name="Replica", last_name="Only"))
+            s.commit()
+
+        # This session has written, so it keeps reading its own writes
+        with use_replica():
+            assert [p.first_name for p in Patient.query.all()] == ["Primary"]
+        db.session.remove()
+
+        with use_replica():
+            assert [p.first_name for p in Patient.query.all()] == ["Replica"]
+            with use_primary():
+                assert [p.first_name for p in Patient.query.all()] == ["Primary"]
+        assert [p.first_name for p in Patient.query.all()] == ["Primary"]
+        db.session.remove()
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(user_id)
+        s["_fresh"] = True
+
+    names = lambda r: [row[0] for row in r.get_json()["data"]]
+    r = client.get("/api/patients?draw=1&start=0&length=10")
+    assert names(r) == ["Only, Replica"]
+
+    # The write lands on the primary and pins this browser to it for a while
+    r = client.post("/patients/new", data={"first_name": "New", "last_name": "Patient",
+                                           "dob": "1970-01-01", "ssn_full": "123456789"})
+    assert r.status_code == 302
+    r = client.get("/api/patients?draw=1&start=0&length=10")
+    assert names(r) == ["Only, Primary", "Patient, New"]
+
+    with client.session_transaction() as s:
+        s["_primary_until"] = 0
+    r = client.get("/api/patients?draw=1&start=0&length=10")
+    assert names(r) == ["Only, Replica"]
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engines["replica"].dispose()
+    # init_app registered an (empty) metadata for the bind on the shared
+    # extension; drop it so create_all() on the suite's app doesn't look for it
+    db.metadatas.pop("replica", None)
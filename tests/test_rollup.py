@@ -0,0 +1,95 @@
+# tests/test_rollup.py
+import logging
+from datetime import date, datetime, timedelta
+logger = logging.getLogger(__name__)
+
+def _seed_rx(session, start):
+    from app.models import Patient, Medication, Prescription
+    p = Patient(first_name="Ada", last_name="Test")
+    m = Medication(name="Metformin", strength="500 mg")
+    session.add_all([p, m])
+    session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=m.id, dosage="1 tablet",
+                      frequency_per_day=1, start_date=start)
+    session.add(rx)
+    session.commit()
+    return rx
+
+def test_rollup_tracks_inserted_dose_logs(db_session):
+    from app.models import DoseLog, DoseDailyRollup
+    today = datetime.utcnow().date()
+    rx = _seed_rx(db_session, today - timedelta(days=3))
+    for days_ago, taken in ((3, True), (2, True), (2, False), (1, True)):
+        db_session.add(DoseLog(prescription_id=rx.id, was_taken=taken,
+                               taken_at=datetime.combine(today - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=9)))
+    db_session.commit()
+
+    rows = {r.day: (r.taken_count, r.missed_count) for r in DoseDailyRollup.query.all()}
+    logger.info("Rollup rows: %s", rows)
+    assert rows[today - timedelta(days=2)] == (1, 1)
+    assert sum(t for t, _ in rows.values()) == 3
+    assert DoseLog.adherence_for_prescription(rx) == 3 / 4 * 100.0
+
+def test_rollup_follows_edited_dose_logs(db_session):
+    from app.models import DoseLog, DoseDailyRollup
+    from app.services.rollup import rebuild_daily_rollup
+    today = datetime.utcnow().date()
+    rx = _seed_rx(db_session, today - timedelta(days=3))
+    log = DoseLog(prescription_id=rx.id, was_taken=True,
+                  taken_at=datetime.combine(today - timedelta(days=2), datetime.min.time()) + timedelta(hours=9))
+    db_session.add(log)
+    db_session.commit()
+
+    # Edit after the commit expired the row: the old values are still subtracted
+    log.was_taken = False
+    log.taken_at += timedelta(days=1)
+    db_session.commit()
+
+    def counts():
+        return {r.day: (r.taken_count, r.missed_count) for r in DoseDailyRollup.query.all()
+                if r.taken_count or r.missed_count}
+    assert counts() == {today - timedelta(days=1): (0, 1)}
+    rebuild_daily_rollup()
+    assert counts() == {today - timedelta(days=1): (0, 1)}
+
+def test_rebuild_matches_incremental_rollup(db_session):
+    from app.models import DoseLog, DoseDailyRollup
+    from app.services.rollup import rebuild_daily_rollup
+    today = datetime.utcnow().date()
+    rx = _seed_rx(db_session, today - timedelta(days=5))
+    for days_ago in range(5):
+        db_session.add(DoseLog(prescription_id=rx.id, was_taken=days_ago % 2 == 0,
+                               taken_at=datetime.utcnow() - timedelta(days=days_ago)))
+    db_session.commit()
+    before = sorted((r.day, r.taken_count, r.missed_count) for r in DoseDailyRollup.query.all())
+
+    written = rebuild_daily_rollup()
+    after = sorted((r.day, r.taken_count, r.missed_count) for r in DoseDailyRollup.query.all())
+    logger.info("Rebuilt %s rows", written)
+    assert before == after
+
+def test_batch_adherence_matches_per_prescription(db_session):
+    from app.models import DoseLog, Prescription
+    from app.services.adherence import adherence_for_prescriptions
+    today = datetime.utcnow().date()
+    rx = _seed_rx(db_session, today - timedelta(days=9))
+    others = [
+        Prescription(patient_id=rx.patient_id, medication_id=rx.medication_id, dosage="1 tablet",
+                     frequency_per_day=2, start_date=today - timedelta(days=20), end_date=today - timedelta(days=5)),
+        Prescription(patient_id=rx.patient_id, medication_id=rx.medication_id, dosage="1 tablet",
+                     frequency_per_day=1, start_date=today + timedelta(days=3)),
+    ]
+    db_session.add_all(others)
+    db_session.commit()
+    for target in [rx] + others:
+        for days_ago in range(0, 25, 2):
+            db_session.add(DoseLog(prescription_id=target.id, was_taken=True,
+                                   taken_at=datetime.utcnow() - timedelta(days=days_ago)))
+    db_session.commit()
+
+    everything = [rx] + others
+    batch = adherence_for_prescriptions([p.id for p in everything])
+    single = {p.id: DoseLog.adherence_for_prescription(p) for p in everything}
+    logger.info("batch=%s single=%s", batch, single)
+    assert batch == single
+    assert adherence_for_prescriptions(patient_id=rx.patient_id) == single
@@ -0,0 +1,53 @@
+# tests/test_search.py
+import logging
+from datetime import date, datetime
+logger = logging.getLogger(__name__)
+
+def _seed(session):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    ada = Patient(first_name="Ada", last_name="Lovelace", ssn_last4="1234")
+    alan = Patient(first_name="Alan", last_name="Turing", ssn_last4="9876")
+    met = Medication(name="Metformin", strength="500 mg")
+    lis = Medication(name="Lisinopril", strength="10 mg")
+    session.add_all([ada, alan, met, lis])
+    session.flush()
+    rx1 = Prescription(patient_id=ada.id, medication_id=met.id, dosage="1", frequency_per_day=1, start_date=date(2026, 1, 1))
+    rx2 = Prescription(patient_id=alan.id, medication_id=lis.id, dosage="1", frequency_per_day=1, start_date=date(2026, 1, 1))
+    session.add_all([rx1, rx2])
+    session.flush()
+    session.add_all([
+        DoseLog(prescription_id=rx1.id, taken_at=datetime(2026, 1, 2, 8), notes="Taken with breakfast"),
+        DoseLog(prescription_id=rx2.id, taken_at=datetime(2026, 1, 2, 9), notes="Dizzy afterwards"),
+    ])
+    session.commit()
+    return ada, alan, met, lis
+
+def test_filters_match_substrings_through_the_index(db_session):
+    from app.models import Patient, Medication, Prescription, DoseLog
+    from app.services import search
+    ada, alan, met, lis = _seed(db_session)
+    assert search._uses_fts(db_session.connection()), "FTS5 trigram table should exist on SQLite"
+
+    # Renames flow through the update listener
+    alan.last_name = "Turingson"
+    db_session.commit()
+
+    assert [p.id for p in Patient.query.filter(search.patient_filter("ngso"))] == [alan.id]
+    assert [m.id for m in Medication.query.filter(search.medication_filter("FORM"))] == [met.id]
+
+    logs = (db_session.query(DoseLog)
+            .join(Prescription, DoseLog.prescription_id == Prescription.id)
+            .join(Patient, Prescription.patient_id == Patient.id)
+            .join(Medication, Prescription.medication_id == Medication.id))
+    by_note = logs.filter(search.dose_log_filter("breakfast")).all()
+    by_med = logs.filter(search.dose_log_filter("isinop")).all()
+    logger.info("by_note=%s by_med=%s", by_note, by_med)
+    assert [l.notes for l in by_note] == ["Taken with breakfast"]
+    assert [l.notes for l in by_med] == ["Dizzy afterwards"]
+
+def test_short_terms_fall_back_to_ilike(db_session):
+    from app.models import Patient
+    from app.services import search
+    ada, alan, _, _ = _seed(db_session)
+    assert {p.id for p in Patient.query.filter(search.patient_filter("al"))} == {alan.id}
+    assert search.rebuild_search_index() == 6
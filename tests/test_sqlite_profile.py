@@ -0,0 +1,42 @@
+# tests/test_sqlite_profile.py
+import logging
+logger = logging.getLogger(__name__)
+
+def _engine_app(uri, **config):
+    from flask import Flask
+    from flask_sqlalchemy import SQLAlchemy
+    from app.utils.sqlite_profile import sqlite_engine_options, init_sqlite_profile
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=uri, **config)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options(app)
+    db = SQLAlchemy()
+    db.init_app(app)
+    init_sqlite_profile(app, db)
+    return app, db
+
+def test_performance_profile_applies_pragmas_per_connection(tmp_path):
+    app, db = _engine_app(f"sqlite:///{tmp_path / 'p.db'}", SQLITE_PROFILE="performance",
+                          SQLITE_PRAGMAS={"busy_timeout": 2500})
+    with app.app_context():
+        assert db.engine.pool.size() == 8
+        with db.engine.connect() as conn:
+            got = {p: conn.exec_driver_sql(f"PRAGMA {p}").scalar()
+                   for p in ("journal_mode", "synchronous", "busy_timeout", "temp_store")}
+        logger.info("pragmas: %s", got)
+        assert got == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 2500, "temp_store": 2}
+        db.engine.dispose()
+
+def test_profile_skips_memory_and_off(tmp_path):
+    app, _ = _engine_app("sqlite://")
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}
+    app, db = _engine_app(f"sqlite:///{tmp_path / 'o.db'}", SQLITE_PROFILE="off")
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}
+    with app.app_context(), db.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+        db.engine.dispose()
+    # Unset means off: upgrading the app leaves existing files in rollback-journal mode
+    app, db = _engine_app(f"sqlite:///{tmp_path / 'd.db'}")
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}
+    with app.app_context(), db.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+        db.engine.dispose()
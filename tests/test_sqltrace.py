@@ -0,0 +1,51 @@
+# tests/test_sqltrace.py
+import json
+import logging
+from datetime import date
+logger = logging.getLogger(__name__)
+
+def test_server_timing_and_n_plus_one_log(caplog):
+    from app import create_app, db
+    from app.models import Patient, Medication, Prescription
+    from app.utils.sqltrace import endpoint_stats
+
+    # A private app so the probe route can be registered before its first request
+    app = create_app()
+    app.config.update(TESTING=True, SERVER_NAME="localhost")
+
+    @app.get("/_test/lazy_loads")
+    def _lazy_loads():
+        # Touching rx.medication per row is the classic lazy-load N+1
+        return {"names": [rx.medication.name for rx in Prescription.query.all()]}
+
+    with app.app_context():
+        db.create_all()
+        p = Patient(first_name="Ada", last_name="Test")
+        db.session.add(p)
+        db.session.flush()
+        for i in range(6):
+            m = Medication(name=f"Med{i}")
+            db.session.add(m)
+            db.session.flush()
+            db.session.add(Prescription(patient_id=p.id, medication_id=m.id, dosage="1",
+                                        frequency_per_day=1, start_date=date.today()))
+        db.session.commit()
+        pid = p.id
+
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s["active_patient_id"] = pid
+        with caplog.at_level(logging.INFO, logger="app.sql"):
+            r = client.get("/_test/lazy_loads")
+        db.session.remove()
+        db.drop_all()
+
+    timing = r.headers["Server-Timing"]
+    logger.info("Server-Timing: %s", timing)
+    assert timing.startswith("db;dur=") and "app;dur=" in timing
+    events = [json.loads(rec.getMessage()) for rec in caplog.records if rec.name == "app.sql"]
+    summary = next(e for e in events if e["event"] == "request_sql")
+    assert summary["endpoint"] == "_lazy_loads" and summary["queries"] >= 7
+    suspects = [e for e in events if e["event"] == "n_plus_one_suspect"]
+    assert suspects and suspects[0]["executions"] == 6 and "medication" in suspects[0]["sql"]
+    assert endpoint_stats()["_lazy_loads"]["max_queries"] == summary["queries"]
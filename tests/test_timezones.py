@@ -0,0 +1,113 @@
+# tests/test_timezones.py
+import logging
+from datetime import date, datetime, timedelta, timezone
+logger = logging.getLogger(__name__)
+
+def test_local_days_match_astimezone_across_dst():
+    from app.utils.timeutils import local_days, local_day_range, patient_today, zone
+
+    # Hourly around the 2026 US spring-forward and fall-back changes, plus a +13/+14 zone
+    stamps = [datetime(2026, 3, 7) + timedelta(hours=h) for h in range(96)]
+    stamps += [datetime(2026, 10, 31) + timedelta(hours=h, minutes=30) for h in range(96)]
+    stamps.append(None)
+    for name in ("America/New_York", "Pacific/Kiritimati", "Asia/Kolkata", None):
+        expected = [ts and ts.replace(tzinfo=timezone.utc).astimezone(zone(name)).date() for ts in stamps]
+        assert local_days(stamps, name) == expected, name
+
+    now = datetime(2026, 3, 9, 3, 30, tzinfo=timezone.utc)
+    assert patient_today("America/Los_Angeles", now) == date(2026, 3, 8)
+    assert patient_today(None, now) == date(2026, 3, 9)
+    # DST started on the 8th in LA: that local day is 23 hours long
+    start, end = local_day_range(date(2026, 3, 8), "America/Los_Angeles")
+    assert (start, end) == (datetime(2026, 3, 8, 8), datetime(2026, 3, 9, 7))
+
+def test_rollup_uses_patient_local_days(db_session):
+    from app.models import Patient, Medication, Prescription, DoseLog, DoseDailyRollup
+    from app.services.adherence import adherence_for_prescriptions
+    from app.services.rollup import rebuild_daily_rollup
+
+    la = Patient(first_name="Lou", last_name="West", timezone="America/Los_Angeles")
+    utc = Patient(first_name="Uma", last_name="Zero")
+    med = Medication(name="Metformin")
+    db_session.add_all([la, utc, med])
+    db_session.flush()
+    rx_la = Prescription(patient_id=la.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                         start_date=date(2026, 3, 1), end_date=date(2026, 3, 9))
+    rx_utc = Prescription(patient_id=utc.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                          start_date=date(2026, 3, 1), end_date=date(2026, 3, 9))
+    db_session.add_all([rx_la, rx_utc])
+    db_session.flush()
+    # 03:00 UTC on the 10th is still the evening of the 9th in Los Angeles
+    for rx in (rx_la, rx_utc):
+        db_session.add(DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 3, 10, 3), was_taken=True))
+    db_session.commit()
+
+    def days():
+        return {(r.prescription_id, r.day) for r in DoseDailyRollup.query.all()}
+
+    assert days() == {(rx_la.id, date(2026, 3, 9)), (rx_utc.id, date(2026, 3, 10))}
+    assert rebuild_daily_rollup() == 2
+    assert days() == {(rx_la.id, date(2026, 3, 9)), (rx_utc.id, date(2026, 3, 10))}
+
+    # The LA dose counts toward its prescription; the UTC one lands after end_date
+    scores = adherence_for_prescriptions(today=date(2026, 3, 10))
+    assert scores[rx_la.id] > 0 and scores[rx_utc.id] == 0
+
+    # Moving a patient to another zone re-buckets after a rebuild
+    utc.timezone = "Pacific/Honolulu"
+    db_session.commit()
+    rebuild_daily_rollup([rx_utc.id])
+    assert days() == {(rx_la.id, date(2026, 3, 9)), (rx_utc.id, date(2026, 3, 9))}
+
+def test_rollup_sees_zone_changes_made_elsewhere(db_session):
+    from sqlalchemy import update
+    from app.models import Patient, Medication, Prescription, DoseLog, DoseDailyRollup
+    p = Patient(first_name="Wen", last_name="Mover")
+    med = Medication(name="Metformin")
+    db_session.add_all([p, med])
+    db_session.flush()
+    rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                      start_date=date(2026, 3, 1))
+    db_session.add(rx)
+    db_session.flush()
+    db_session.add(DoseLog(prescription_id=rx.id, taken_at=datetime(2026, 3, 10, 3)))
+    db_session.commit()
+    rx_id = rx.id
+
+    # Another worker moves the patient; nothing in this process hears about it
+    db_session.execute(update(Patient).where(Patient.id == p.id).values(timezone="America/Los_Angeles"))
+    db_session.commit()
+    db_session.expunge_all()
+    db_session.add(DoseLog(prescription_id=rx_id, taken_at=datetime(2026, 3, 11, 3)))
+    db_session.commit()
+    # 03:00 UTC on the 11th is the 10th in Los Angeles
+    rows = [(r.day, r.taken_count) for r in DoseDailyRollup.query.filter_by(prescription_id=rx_id)]
+    assert rows == [(date(2026, 3, 10), 2)]
+
+def test_batch_adherence_caps_each_patient_at_their_today(db_session):
+    from datetime import timedelta
+    from app.models import Patient, Medication, Prescription, DoseLog, DoseDailyRollup
+    from app.services.adherence import adherence_for_prescriptions
+    from app.utils.timeutils import patient_today
+
+    med = Medication(name="Metformin")
+    db_session.add(med)
+    rxs = []
+    for name in ("Pacific/Pago_Pago", "Pacific/Kiritimati", None):
+        p = Patient(first_name="Zed", last_name=name or "UTC", timezone=name)
+        db_session.add(p)
+        db_session.flush()
+        today = patient_today(name)
+        rx = Prescription(patient_id=p.id, medication_id=med.id, dosage="1", frequency_per_day=1,
+                          start_date=today - timedelta(days=3))
+        db_session.add(rx)
+        db_session.flush()
+        # Taken every day up to today, plus a future-dated day the per-row score ignores
+        db_session.add_all([DoseDailyRollup(prescription_id=rx.id, day=today - timedelta(days=n),
+                                            taken_count=1, missed_count=0) for n in range(-1, 4)])
+        rxs.append(rx)
+    db_session.commit()
+
+    scores = adherence_for_prescriptions([rx.id for rx in rxs])
+    for rx in rxs:
+        assert scores[rx.id] == DoseLog.adherence_for_prescription(rx) == 100.0